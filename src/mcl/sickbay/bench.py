@@ -0,0 +1,228 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Benchmarks. These fill a scratch database with synthetic participants and time how the data model
+behaves as the tables grow. ``relationshipLoads`` times lazy loads of a participant's organs,
+biospecimens, and prior lesions with and without the model's indexes (see
+``mcl.sickbay.model.base.declareIndexes``): with them, each load stays about as quick however many rows
+there are; without them, each is a scan of the whole child table and slows down as it grows.
+``polymorphicLoads`` counts the queries and time it takes to load and encode participants whose organs
+and genomics are a mix of subclasses with each way of loading them (see ``mcl.sickbay.trees``).
+
+Every benchmark drops and re-creates the Sickbay tables of the database it's given, so never point one at
+a database you care about.
+'''
+
+from . import VERSION
+from .json import SERIALIZERS
+from .model import Base, Biospecimen, ClinicalCore, createMetadata, Genomics, Organ
+from .model.clinicalcore import PriorLesion
+from .trees import POLYMORPHIC_LOADING, loadParticipants, subclassesOf
+from sqlalchemy import Boolean, Date, Float, Integer, create_engine, event
+from sqlalchemy.orm import sessionmaker
+import argparse, datetime, random, time
+
+
+_description = '''Benchmark the Sickbay data model on synthetic data in a scratch database, whose Sickbay
+tables get dropped.
+'''
+
+__version__ = VERSION
+
+DEFAULT_SIZES = (1000, 10000, 100000)  # Numbers of participants to benchmark with
+DEFAULT_SAMPLE = 200                   # How many participants to time loads of
+DEFAULT_URL = 'sqlite://'              # Scratch database, in memory
+
+_relationships = ('organs', 'biospecimens', 'prior_lesions')  # What ``relationshipLoads`` times loading
+
+BENCHMARKS = ('relationships', 'polymorphic')
+
+
+def _filler(column):
+    '''Return a value that will do for ``column``: the first member of an enumeration, zero, and so on'''
+    enumClass = getattr(column.type, 'enum_class', None)
+    if enumClass is not None:
+        return next(iter(enumClass))
+    elif isinstance(column.type, Boolean):
+        return False
+    elif isinstance(column.type, (Integer, Float)):
+        return 0
+    elif isinstance(column.type, Date):
+        return datetime.date(2020, 1, 1)
+    return 'x'
+
+
+def _template(table):
+    '''Make a row for ``table`` with filler in every column that needs a value and isn't a key'''
+    return {
+        column.key: _filler(column) for column in table.c
+        if not (column.nullable or column.primary_key or column.default is not None)
+    }
+
+
+def _insert(connection, cls, numbers, make):
+    '''Insert an instance of ``cls`` for each of the ``numbers``, with the values ``make`` gives for each
+    number plus filler, into every table ``cls`` is mapped to.
+    '''
+    mapper = cls.__mapper__
+    rows = [make(number) for number in numbers]
+    if mapper.polymorphic_on is not None:
+        for row in rows:
+            row[mapper.polymorphic_on.key] = mapper.polymorphic_identity
+    for table in mapper.tables:
+        template = _template(table)
+        connection.execute(table.insert(), [
+            dict(template, **{key: value for key, value in row.items() if key in table.c}) for row in rows
+        ])
+
+
+def _mixed(connection, base, count, make):
+    '''Insert ``count`` instances of ``base`` and its subclasses, each kind in turn'''
+    kinds = [base] + subclassesOf(base)
+    for index, cls in enumerate(kinds):
+        _insert(connection, cls, range(index, count, len(kinds)), make)
+
+
+def populate(engine, participants, perParticipant=3):
+    '''Put ``participants`` synthetic participants in the database of ``engine``, each with
+    ``perParticipant`` organs (of every kind), biospecimens, genomics (plain and Smart-3Seq), and prior
+    lesions.
+    '''
+    def owner(number):
+        return f'P{number // perParticipant:08d}'
+    children = participants * perParticipant
+    with engine.begin() as connection:
+        _insert(connection, ClinicalCore, range(participants), lambda number: {
+            'participant_ID': f'P{number:08d}', 'labcasID': 'bench'
+        })
+        _mixed(connection, Organ, children, lambda number: {
+            'identifier': number + 1, 'labcasID': 'bench', 'clinicalCore_participant_ID': owner(number)
+        })
+        _insert(connection, Biospecimen, range(children), lambda number: {
+            'specimen_ID': f'S{number:08d}', 'labcasID': 'bench', 'clinicalCore_participant_ID': owner(number)
+        })
+        _mixed(connection, Genomics, children, lambda number: {
+            'specimen_ID': f'G{number:08d}', 'labcasID': 'bench', 'clinicalCore_participant_ID': owner(number),
+            'biospecimen_specimen_ID': f'S{number:08d}'
+        })
+        _insert(connection, PriorLesion, range(children), lambda number: {
+            'identifier': number + 1, 'clinicalCore_participant_ID': owner(number)
+        })
+
+
+def reset(engine, indexes=True):
+    '''Drop and re-create the Sickbay tables in the database of ``engine``, without any indexes unless
+    ``indexes`` is set.
+    '''
+    Base.metadata.drop_all(engine)
+    createMetadata(engine)
+    if not indexes:
+        with engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.drop(connection)
+
+
+def timeLoads(engine, participantIDs, relationships=_relationships):
+    '''Return the average seconds it takes to lazily load one of the ``relationships`` of the participants
+    with the given ``participantIDs``, which are themselves loaded beforehand and not timed.
+    '''
+    session = sessionmaker(bind=engine)()
+    try:
+        participants = session.query(ClinicalCore).filter(ClinicalCore.participant_ID.in_(participantIDs)).all()
+        start = time.perf_counter()
+        for participant in participants:
+            for name in relationships:
+                getattr(participant, name)
+        elapsed = time.perf_counter() - start
+        return elapsed / (len(participants) * len(relationships))
+    finally:
+        session.close()
+
+
+def relationshipLoads(url=DEFAULT_URL, sizes=DEFAULT_SIZES, sample=DEFAULT_SAMPLE, perParticipant=3):
+    '''For each number of participants in ``sizes``, fill the scratch database at ``url`` with that many
+    (see ``populate``) and time lazily loading the relationships of a random ``sample`` of them, once with
+    the model's indexes and once without. Yield (participants, seconds per load with indexes, seconds per
+    load without).
+    '''
+    engine, chooser = create_engine(url), random.Random(0)
+    try:
+        for size in sizes:
+            participantIDs = [f'P{number:08d}' for number in chooser.sample(range(size), min(sample, size))]
+            timings = []
+            for indexes in (True, False):
+                reset(engine, indexes)
+                populate(engine, size, perParticipant)
+                timings.append(timeLoads(engine, participantIDs))
+            yield size, timings[0], timings[1]
+        Base.metadata.drop_all(engine)
+    finally:
+        engine.dispose()
+
+
+def polymorphicLoads(url=DEFAULT_URL, sizes=DEFAULT_SIZES, sample=DEFAULT_SAMPLE, perParticipant=3):
+    '''For each number of participants in ``sizes``, fill the scratch database at ``url`` with that many
+    (see ``populate``), whose organs and genomics are a mix of every subclass, and load and encode the
+    trees of a random ``sample`` of them with each of ``mcl.sickbay.trees.POLYMORPHIC_LOADING``. Yield
+    (participants, polymorphic loading, queries, seconds) for each.
+    '''
+    engine, chooser, queries = create_engine(url), random.Random(0), [0]
+    event.listen(engine, 'before_cursor_execute', lambda *args: queries.__setitem__(0, queries[0] + 1))
+    serialize = SERIALIZERS[ClinicalCore]
+    try:
+        for size in sizes:
+            participantIDs = [f'P{number:08d}' for number in chooser.sample(range(size), min(sample, size))]
+            reset(engine)
+            populate(engine, size, perParticipant)
+            for warming in (True, False):  # The first time through pays for compiling mappers and queries
+                for polymorphic in POLYMORPHIC_LOADING:
+                    session = sessionmaker(bind=engine)()
+                    try:
+                        queries[0], start = 0, time.perf_counter()
+                        for participant in loadParticipants(session, participantIDs, polymorphic):
+                            serialize(participant)
+                        elapsed = time.perf_counter() - start
+                    finally:
+                        session.close()
+                    if not warming:
+                        yield size, polymorphic, queries[0], elapsed
+        Base.metadata.drop_all(engine)
+    finally:
+        engine.dispose()
+
+
+def main():
+    '''Command-line entrypoint: runs benchmarks'''
+    parser = argparse.ArgumentParser(description=_description)
+    parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+    parser.add_argument(
+        '-u', '--url', default=DEFAULT_URL, help='URL of the scratch database; its tables get dropped! (%(default)s)'
+    )
+    parser.add_argument(
+        '-s', '--sizes', type=int, nargs='+', default=DEFAULT_SIZES, metavar='N',
+        help='Numbers of participants to benchmark with (%(default)s)'
+    )
+    parser.add_argument(
+        '-n', '--sample', type=int, default=DEFAULT_SAMPLE, help='Participants to time loads of (%(default)s)'
+    )
+    parser.add_argument(
+        '-b', '--benchmark', choices=BENCHMARKS, default=BENCHMARKS[0], help='Which benchmark to run (%(default)s)'
+    )
+    args = parser.parse_args()
+
+    if args.benchmark == 'polymorphic':
+        print(f'{"Participants":>12}  {"Loading":>8}  {"Queries":>7}  {"ms":>8}')
+        for size, polymorphic, queries, elapsed in polymorphicLoads(args.url, args.sizes, args.sample):
+            print(f'{size:>12}  {polymorphic:>8}  {queries:>7}  {elapsed * 1e3:>8.1f}', flush=True)
+    else:
+        print(f'{"Participants":>12}  {"Indexed µs/load":>15}  {"Unindexed µs/load":>17}')
+        for size, indexed, unindexed in relationshipLoads(args.url, args.sizes, args.sample):
+            print(f'{size:>12}  {indexed * 1e6:>15.1f}  {unindexed * 1e6:>17.1f}', flush=True)
+
+
+if __name__ == '__main__':
+    main()
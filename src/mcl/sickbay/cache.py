@@ -0,0 +1,205 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Caching. Participant trees change only when new data get ingested, yet a read API encodes the same
+ones again and again. ``DocumentCache`` keeps the encoded JSON of the most recently used participants,
+keyed by ``participant_ID``, and listens to session events so that flushing a change to anything in a
+participant's tree—the participant, its biospecimens, organs, genomics, images, or any of the child
+lists—evicts that participant's document. Bulk loads that bypass the ORM aren't heard; see
+``DocumentCache``.
+'''
+
+from .json import ClinicalCoreEncoder
+from .model import ClinicalCore
+from .trees import loadParticipants
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
+from sqlalchemy.orm.interfaces import MANYTOONE
+import threading
+
+
+DEFAULT_MAX_SIZE = 1000  # How many documents to keep before evicting the least recently used
+
+_parents = {}  # Cache of many-to-one (relationship, foreign key attribute, target mapper), keyed by mapper
+
+
+def _parentsOf(mapper):
+    '''Return the many-to-one relationships of ``mapper`` as (relationship name, foreign key attribute
+    name, target mapper) triples; following these leads up a participant's tree to its ``ClinicalCore``.
+    '''
+    parents = _parents.get(mapper)
+    if parents is None:
+        parents = _parents[mapper] = tuple(
+            (prop.key, mapper.get_property_by_column(prop.local_remote_pairs[0][0]).key, prop.mapper)
+            for prop in mapper.relationships if prop.direction is MANYTOONE
+        )
+    return parents
+
+
+def _values(state, key):
+    '''Return the current and previous values of the attribute ``key`` of the instance ``state`` without
+    loading anything from the database.
+    '''
+    history = state.get_history(key, attributes.PASSIVE_NO_INITIALIZE)
+    values = set(history.added or ()) | set(history.unchanged or ()) | set(history.deleted or ())
+    values.add(state.dict.get(key))
+    values.discard(None)
+    values.discard(attributes.NO_VALUE)
+    return values
+
+
+def _loaded(obj):
+    '''Tell if the foreign keys leading up from ``obj`` are loaded, so we can follow them without a query'''
+    state = attributes.instance_state(obj)
+    return all(foreignKey in state.dict for relationship, foreignKey, target in _parentsOf(state.mapper))
+
+
+def participantsOf(session, objects, found=None):
+    '''Return the set of ``participant_ID``\\ s whose trees include any of ``objects``, either now or before
+    changes that haven't been committed yet (for example, a biospecimen moving from one participant to another
+    belongs to both). Parents already loaded in ``session`` come from its identity map; the rest (including
+    expired ones) are fetched with one query per kind of parent for each level up the trees, without
+    autoflushing, so this is safe to call while ``session`` is flushing.
+    '''
+    found = set() if found is None else found
+    objects, seen = list(objects), set()
+    while objects:
+        parents, missing = [], {}  # Parents we have, and keys of those we don't, keyed by target mapper
+        for obj in objects:
+            state = attributes.instance_state(obj)  # States hold objects only weakly, so we iterate over objects
+            if state in seen:
+                continue
+            seen.add(state)
+            mapper = state.mapper
+            if mapper.isa(ClinicalCore.__mapper__):
+                found |= _values(state, 'participant_ID')
+                continue
+            for relationship, foreignKey, target in _parentsOf(mapper):
+                history = state.get_history(relationship, attributes.PASSIVE_NO_INITIALIZE)
+                related = [p for p in list(history.added or ()) + list(history.deleted or ()) if p is not None]
+                if target.isa(ClinicalCore.__mapper__):
+                    found |= _values(state, foreignKey)
+                    found.update(p.participant_ID for p in related)
+                    continue
+                parents.extend(related)
+                for key in _values(state, foreignKey):
+                    parent = session.identity_map.get(target.identity_key_from_primary_key([key]))
+                    if parent is None or not _loaded(parent):
+                        missing.setdefault(target, set()).add(key)
+                    else:
+                        parents.append(parent)
+        with session.no_autoflush:
+            for target, keys in missing.items():
+                parents.extend(session.query(target).filter(target.primary_key[0].in_(keys)))
+        objects = parents
+    return found
+
+
+class DocumentCache(object):
+    '''A size-bounded, least-recently-used cache of ``ClinicalCore`` trees encoded as JSON text, keyed by
+    ``participant_ID``. Call ``listen`` so changes flushed through the ORM invalidate the right documents.
+    It's safe to share between threads.
+
+    Only ORM flushes are heard. The bulk loaders write with Core statements and ``COPY`` instead, and the
+    cache never learns of those changes: ``mcl.sickbay.load.loadRows``, ``mcl.sickbay.labcas`` (including
+    upserts and replaced files), and ``mcl.sickbay.resolve`` all leave cached documents stale. After
+    running any of them against the database, call ``clear``, or ``invalidate`` the participants you know
+    they touched.
+    '''
+    def __init__(self, maxSize=DEFAULT_MAX_SIZE, **kw):
+        '''Make a cache of up to ``maxSize`` documents; any ``kw`` go to the ``ClinicalCoreEncoder``'''
+        self.maxSize = maxSize
+        self.hits = self.misses = 0
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+        self._encode = ClinicalCoreEncoder(**kw).encode
+        self._targets = []
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __contains__(self, participantID):
+        return participantID in self._documents
+
+    def get(self, participantID):
+        '''Return the cached document for ``participantID``, or ``None`` if we don't have it'''
+        with self._lock:
+            document = self._documents.get(participantID)
+            if document is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._documents.move_to_end(participantID)
+            return document
+
+    def put(self, participantID, document):
+        '''Cache the encoded ``document`` for ``participantID``, evicting the least recently used if full'''
+        with self._lock:
+            self._documents[participantID] = document
+            self._documents.move_to_end(participantID)
+            while len(self._documents) > self.maxSize:
+                self._documents.popitem(last=False)
+
+    def invalidate(self, participantIDs):
+        '''Forget the documents of each of the ``participantIDs``'''
+        with self._lock:
+            for participantID in participantIDs:
+                self._documents.pop(participantID, None)
+
+    def clear(self):
+        '''Forget every document'''
+        with self._lock:
+            self._documents.clear()
+
+    def document(self, session, participantID):
+        '''Return the JSON text of the participant tree for ``participantID``, from the cache if we can or
+        else by loading it from ``session`` and encoding it. Return ``None`` if there's no such participant.
+        '''
+        document = self.get(participantID)
+        if document is None:
+            participants = loadParticipants(session, [participantID])
+            if not participants:
+                return None
+            document = self._encode(participants[0])
+            self.put(participantID, document)
+        return document
+
+    def listen(self, target=Session):
+        '''Invalidate documents whenever a flush through ``target`` changes any object in their trees.
+        The ``target`` may be a ``Session``, a ``sessionmaker``, or (the default) the ``Session`` class to
+        hear from every session. Documents are invalidated again once the change is committed so that a
+        concurrent read of the old data in the meantime can't leave a stale document behind.
+        '''
+        event.listen(target, 'after_flush', self._afterFlush)
+        event.listen(target, 'after_commit', self._afterCommit)
+        event.listen(target, 'after_soft_rollback', self._afterSoftRollback)
+        self._targets.append(target)
+
+    def unlisten(self):
+        '''Stop listening to every target we've been listening to'''
+        for target in self._targets:
+            event.remove(target, 'after_flush', self._afterFlush)
+            event.remove(target, 'after_commit', self._afterCommit)
+            event.remove(target, 'after_soft_rollback', self._afterSoftRollback)
+        self._targets.clear()
+
+    def _pending(self, session):
+        return session.info.setdefault(('mcl.sickbay.cache', id(self)), set())
+
+    def _afterFlush(self, session, flushContext):
+        found = participantsOf(session, session.new | session.dirty | session.deleted)
+        if found:
+            self.invalidate(found)
+            self._pending(session).update(found)
+
+    def _afterCommit(self, session):
+        pending = session.info.pop(('mcl.sickbay.cache', id(self)), None)
+        if pending:
+            self.invalidate(pending)
+
+    def _afterSoftRollback(self, session, previousTransaction):
+        session.info.pop(('mcl.sickbay.cache', id(self)), None)
@@ -0,0 +1,201 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Columnar export. These functions write each Sickbay table, just as it is in the database, to an
+Apache Arrow IPC file or a Parquet file, one record batch at a time, for analysts who'd rather load
+dataframes than parse JSON. Enumerated columns are dictionary-encoded with a fixed dictionary made
+from their ``mcl.sickbay.model.enums`` class, so every file of the same column uses the same codes.
+
+You'll need the optional ``pyarrow`` package; try installing ``mcl.sickbay[arrow]``.
+'''
+
+from . import VERSION
+from .connection import addConnectionArguments, engineFromArguments
+from .model import Base
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import BigInteger, Boolean, Date, DateTime, Float, Integer, String, select
+import argparse, os.path
+
+
+_description = '''Export Sickbay tables as Apache Arrow or Parquet files, one file per table, into an
+output directory. Name the tables to export, or leave them out to export them all.
+'''
+
+__version__ = VERSION
+
+DEFAULT_BATCH_SIZE = 10000  # How many rows go into each record batch
+
+# File name suffixes for each format
+FORMAT_SUFFIXES = {'arrow': '.arrow', 'parquet': '.parquet'}
+
+_schemas = {}  # Cache of (schema, converters) pairs, keyed by table
+
+
+def _pyarrow():
+    '''Import and return ``pyarrow``, complaining helpfully if it's not installed'''
+    try:
+        import pyarrow
+    except ImportError:
+        raise ValueError('Columnar export needs the pyarrow package; try installing mcl.sickbay[arrow]')
+    return pyarrow
+
+
+def tables():
+    '''Return a dict of every table in the Sickbay model keyed by name, ordered so that tables come before
+    any that refer to them.
+    '''
+    return {table.name: table for table in Base.metadata.sorted_tables}
+
+
+def _dictionary(pa, enumClass):
+    '''Make a function that dictionary-encodes a list of ``enumClass`` members (or ``None``) into an
+    Arrow array whose dictionary is the members' names (their tokens), in declaration order. Return the
+    Arrow type and the function.
+    '''
+    members = list(enumClass)
+    codes = {member: index for index, member in enumerate(members)}
+    indexType = pa.int8() if len(members) < 128 else pa.int16()
+    dictionary = pa.array([member.name for member in members], type=pa.string())
+    def convert(values):
+        indices = pa.array([None if v is None else codes[v] for v in values], type=indexType)
+        return pa.DictionaryArray.from_arrays(indices, dictionary)
+    return pa.dictionary(indexType, pa.string()), convert
+
+
+def _plain(pa, arrowType):
+    '''Make a function that turns a list of values into an Arrow array of ``arrowType``'''
+    def convert(values):
+        return pa.array(values, type=arrowType)
+    return convert
+
+
+def _schema(table):
+    '''Work out the Arrow schema for the ``table`` from its column types, and a converter for each column
+    that turns a list of its values into an Arrow array. Return the schema and the converters.
+    '''
+    schema = _schemas.get(table)
+    if schema is None:
+        pa = _pyarrow()
+        fields, converters = [], []
+        for column in table.c:
+            columnType, enumClass = column.type, getattr(column.type, 'enum_class', None)
+            if enumClass is not None:
+                arrowType, convert = _dictionary(pa, enumClass)
+            else:
+                if isinstance(columnType, Boolean):
+                    arrowType = pa.bool_()
+                elif isinstance(columnType, BigInteger):
+                    arrowType = pa.int64()
+                elif isinstance(columnType, Integer):
+                    arrowType = pa.int32()
+                elif isinstance(columnType, Float):
+                    arrowType = pa.float64()
+                elif isinstance(columnType, Date):
+                    arrowType = pa.date32()
+                elif isinstance(columnType, DateTime):
+                    arrowType = pa.timestamp('us')
+                elif isinstance(columnType, String):
+                    arrowType = pa.string()
+                else:
+                    raise ValueError(f'No Arrow type for {column.table.name}.{column.key} of type {columnType}')
+                convert = _plain(pa, arrowType)
+            fields.append(pa.field(column.key, arrowType, nullable=column.nullable))
+            converters.append(convert)
+        schema = _schemas[table] = (pa.schema(fields), tuple(converters))
+    return schema
+
+
+def iterBatches(connection, table, batchSize=DEFAULT_BATCH_SIZE):
+    '''Yield Arrow record batches of up to ``batchSize`` rows each of every row in ``table``, ordered by
+    primary key. Rows are streamed from the database with a server-side cursor where the database
+    supports it, so only one batch is ever in memory.
+    '''
+    pa = _pyarrow()
+    schema, converters = _schema(table)
+    query = select(table.c).order_by(*table.primary_key)
+    result = connection.execution_options(stream_results=True).execute(query)
+    try:
+        while True:
+            rows = result.fetchmany(batchSize)
+            if not rows:
+                return
+            columns = list(zip(*rows))
+            yield pa.RecordBatch.from_arrays([c(v) for c, v in zip(converters, columns)], schema=schema)
+            del rows, columns
+    finally:
+        result.close()
+
+
+def writeTable(connection, table, path, format='parquet', batchSize=DEFAULT_BATCH_SIZE):
+    '''Write every row of ``table`` to a new file at ``path`` in ``format``, one of the keys of
+    ``FORMAT_SUFFIXES``, a record batch of ``batchSize`` rows at a time. For Parquet, each batch becomes
+    a row group. Return how many rows we wrote.
+    '''
+    pa = _pyarrow()
+    schema = _schema(table)[0]
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(path, schema)
+        write = lambda batch: writer.write_table(pa.Table.from_batches([batch], schema=schema))
+    elif format == 'arrow':
+        writer = pa.ipc.new_file(path, schema)
+        write = writer.write_batch
+    else:
+        raise ValueError(f'Unknown format {format}')
+    count = 0
+    try:
+        for batch in iterBatches(connection, table, batchSize):
+            write(batch)
+            count += batch.num_rows
+    finally:
+        writer.close()
+    return count
+
+
+def exportTables(engine, names, output, format='parquet', jobs=1, batchSize=DEFAULT_BATCH_SIZE):
+    '''Export each table in ``names`` (keys of ``tables()``) from ``engine`` into its own file in the
+    ``output`` directory, writing up to ``jobs`` tables at once, each on its own connection. Return a
+    dict of how many rows went into each table's file.
+    '''
+    os.makedirs(output, exist_ok=True)
+    available = tables()
+
+    def export(name):
+        with engine.connect() as connection:
+            path = os.path.join(output, name + FORMAT_SUFFIXES[format])
+            return writeTable(connection, available[name], path, format, batchSize)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        return dict(zip(names, executor.map(export, names)))
+
+
+def main():
+    '''Command-line entrypoint: exports tables as Arrow or Parquet files'''
+    parser = argparse.ArgumentParser(description=_description)
+    parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+    addConnectionArguments(parser)
+    parser.add_argument('-o', '--output', default='.', help='Directory to write into (%(default)s)')
+    parser.add_argument(
+        '-f', '--format', default='parquet', choices=sorted(FORMAT_SUFFIXES), help='File format (%(default)s)'
+    )
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='How many tables to write at once (%(default)s)')
+    parser.add_argument(
+        '-n', '--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows per record batch (%(default)s)'
+    )
+    parser.add_argument('tables', nargs='*', metavar='TABLE', help=f'Tables to export: {", ".join(tables())}')
+    args = parser.parse_args()
+    available = tables()
+    names = args.tables if args.tables else list(available)
+    for name in names:
+        if name not in available:
+            parser.error(f'Unknown table {name}; choose from {", ".join(available)}')
+
+    engine = engineFromArguments(args)
+    exportTables(engine, names, args.output, args.format, args.jobs, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Connections. ``makeEngine`` makes an engine tuned for Sickbay: a sized pool whose connections are
+checked before use, an ``application_name`` so they're easy to spot in ``pg_stat_activity``, an optional
+statement timeout, and psycopg2's fast ``executemany`` modes. Behind PgBouncer in transaction mode it
+leaves the pooling to PgBouncer and sets the timeout per transaction rather than per connection, since
+consecutive transactions may land on different server connections.
+
+``sharedEngine`` hands out one engine per URL and settings so everything in a process shares a pool,
+``sessionFactory`` makes a thread-safe ``scoped_session``, and ``addConnectionArguments`` and
+``engineFromArguments`` give every command-line tool the same options.
+'''
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import NullPool
+import getpass, os, threading, weakref
+
+
+DEFAULT_POOL_SIZE = 5               # Connections each engine keeps open
+DEFAULT_MAX_OVERFLOW = 10           # Connections beyond those it may open when busy
+DEFAULT_POOL_RECYCLE = 1800         # Seconds after which a pooled connection is replaced
+DEFAULT_APPLICATION_NAME = 'sickbay'
+DEFAULT_EXECUTEMANY_MODE = 'values'
+DEFAULT_PAGE_SIZE = 1000            # Rows per statement when psycopg2 batches an executemany
+
+# psycopg2's ways to run an ``executemany``: one statement per row (``default``), many statements per
+# round trip (``batch``, with ``execute_batch``), or for ``INSERT``s, many rows per statement (``values``,
+# with ``execute_values``, and ``execute_batch`` for everything else)
+EXECUTEMANY_MODES = ('default', 'batch', 'values')
+
+_engines = {}                       # Engines from ``sharedEngine``, keyed by URL and settings
+_lock = threading.Lock()
+_settings = weakref.WeakKeyDictionary()  # What ``makeEngine`` made each of its engines with
+
+
+def _forgetEngines():
+    '''Forget the shared engines in a freshly forked child process, whose pooled connections are really
+    its parent's. We don't dispose of them, as that would close the parent's connections.
+    '''
+    _engines.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forgetEngines)
+
+
+def makeEngine(
+    url, poolSize=DEFAULT_POOL_SIZE, maxOverflow=DEFAULT_MAX_OVERFLOW, prePing=True, statementTimeout=None,
+    applicationName=DEFAULT_APPLICATION_NAME, executemanyMode=DEFAULT_EXECUTEMANY_MODE,
+    pageSize=DEFAULT_PAGE_SIZE, pgbouncer=False, echo=False, **kw
+):
+    '''Make an engine for the database at ``url``. On PostgreSQL, the engine pools ``poolSize``
+    connections plus up to ``maxOverflow`` more, pinging each before use if ``prePing``; every statement
+    is cancelled after ``statementTimeout`` milliseconds (if given); connections identify themselves as
+    ``applicationName``; and ``executemany`` runs in ``executemanyMode`` (one of ``EXECUTEMANY_MODES``),
+    ``pageSize`` rows at a time. With ``pgbouncer``, the engine keeps no pool of its own and sets the
+    timeout at the start of each transaction, which works with PgBouncer's transaction pooling. Other
+    databases (such as SQLite) get just ``prePing`` and ``echo``. Any other ``kw`` go to
+    ``create_engine``.
+    '''
+    if executemanyMode not in EXECUTEMANY_MODES:
+        raise ValueError(f'Unknown executemany mode "{executemanyMode}"; choose from {", ".join(EXECUTEMANY_MODES)}')
+    settings = dict(
+        kw, poolSize=poolSize, maxOverflow=maxOverflow, prePing=prePing, statementTimeout=statementTimeout,
+        applicationName=applicationName, executemanyMode=executemanyMode, pageSize=pageSize,
+        pgbouncer=pgbouncer, echo=echo
+    )
+    url = make_url(url)
+    if url.get_backend_name() != 'postgresql':
+        engine = create_engine(url, pool_pre_ping=prePing, echo=echo, **kw)
+        _settings[engine] = settings
+        return engine
+
+    connectArgs = dict(kw.pop('connect_args', {}))
+    if applicationName:
+        connectArgs['application_name'] = applicationName
+    if statementTimeout is not None and not pgbouncer:
+        connectArgs['options'] = f'-c statement_timeout={int(statementTimeout)}'
+    if pgbouncer:
+        kw['poolclass'] = NullPool
+    else:
+        kw.update(pool_size=poolSize, max_overflow=maxOverflow, pool_recycle=DEFAULT_POOL_RECYCLE)
+    if url.get_driver_name() == 'psycopg2' and executemanyMode != 'default':
+        kw.update(executemany_mode=executemanyMode, executemany_batch_page_size=pageSize)
+        if executemanyMode == 'values':
+            kw['executemany_values_page_size'] = pageSize
+    engine = create_engine(url, pool_pre_ping=prePing, echo=echo, connect_args=connectArgs, **kw)
+
+    if statementTimeout is not None and pgbouncer:
+        @event.listens_for(engine, 'begin')
+        def setTimeout(connection):
+            connection.execute(f'SET LOCAL statement_timeout = {int(statementTimeout)}')
+    _settings[engine] = settings
+    return engine
+
+
+def engineSettings(engine):
+    '''Return the keyword arguments for ``makeEngine`` that ``engine`` was made with (none if it was made
+    some other way), so worker processes can make engines of their own just like it.
+    '''
+    return dict(_settings.get(engine, {}))
+
+
+def _frozen(value):
+    '''Make a hashable stand-in for the setting ``value``: dicts (such as ``connect_args``) become sorted
+    tuples of their items, lists and tuples tuples, and sets frozensets, all with their contents frozen in
+    turn; anything else that can't be hashed stands in as its ``repr``.
+    '''
+    if isinstance(value, dict):
+        return (dict, tuple(sorted(((k, _frozen(v)) for k, v in value.items()), key=repr)))
+    elif isinstance(value, (list, tuple)):
+        return (type(value), tuple(_frozen(v) for v in value))
+    elif isinstance(value, (set, frozenset)):
+        return frozenset(_frozen(v) for v in value)
+    try:
+        hash(value)
+    except TypeError:
+        return (type(value), repr(value))
+    return value
+
+
+def sharedEngine(url, **settings):
+    '''Return the engine for the database at ``url`` made by ``makeEngine`` with the given ``settings``,
+    making it the first time it's asked for, so everything in this process that asks for the same one
+    shares its pool. Settings can be dicts and lists, like ``connect_args``, as well as plain values.
+    '''
+    key = (str(url), _frozen(settings))
+    with _lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _engines[key] = makeEngine(url, **settings)
+        return engine
+
+
+def sessionFactory(engine, **kw):
+    '''Make a thread-safe ``scoped_session`` bound to ``engine``: calling it gives each thread its own
+    session, and ``remove`` closes the calling thread's. Any ``kw`` go to ``sessionmaker``.
+    '''
+    return scoped_session(sessionmaker(bind=engine, **kw))
+
+
+# Command-line Arguments
+# ======================
+
+def addConnectionArguments(parser):
+    '''Add the command-line options for connecting to the database to the argument ``parser``'''
+    parser.add_argument('-U', '--username', default='mcl', help='Database username (%(default)s)')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('-w', '--no-password', default=True, action='store_true', help="Don't use a database password")
+    group.add_argument('-W', '--password', default=False, action='store_true', help='Prompt for a database password')
+    parser.add_argument('-H', '--host', default='localhost', help='Database host (%(default)s)')
+    parser.add_argument('-d', '--dbname', default='clinical_data', help='Database name (%(default)s)')
+    parser.add_argument('-v', '--verbose', action='store_true', default=False, help='Be verbose (%(default)s)')
+    parser.add_argument(
+        '--pool-size', type=int, default=DEFAULT_POOL_SIZE, help='Database connections to keep open (%(default)s)'
+    )
+    parser.add_argument(
+        '--max-overflow', type=int, default=DEFAULT_MAX_OVERFLOW,
+        help='Extra database connections to open when busy (%(default)s)'
+    )
+    parser.add_argument(
+        '--statement-timeout', type=int, metavar='MS', help='Cancel statements that run longer than this (never)'
+    )
+    parser.add_argument(
+        '--application-name', default=DEFAULT_APPLICATION_NAME,
+        help='Name connections give the database server (%(default)s)'
+    )
+    parser.add_argument(
+        '--executemany-mode', default=DEFAULT_EXECUTEMANY_MODE, choices=EXECUTEMANY_MODES,
+        help='How psycopg2 sends many rows of parameters (%(default)s)'
+    )
+    parser.add_argument(
+        '--page-size', type=int, default=DEFAULT_PAGE_SIZE,
+        help='Rows per statement when psycopg2 sends many rows of parameters (%(default)s)'
+    )
+    parser.add_argument(
+        '--pgbouncer', action='store_true', default=False,
+        help='Connect through PgBouncer in transaction pooling mode (%(default)s)'
+    )
+
+
+def urlFromArguments(args):
+    '''Make a database URL from the parsed ``args`` of a parser set up with ``addConnectionArguments``,
+    prompting for a password if needed.
+    '''
+    password = None if not args.password else getpass.getpass(f'{args.username} password: ')
+    if password:
+        return f'postgresql://{args.username}:{password}@{args.host}/{args.dbname}'
+    else:
+        return f'postgresql://{args.username}@{args.host}/{args.dbname}'
+
+
+def engineFromArguments(args):
+    '''Make an engine (see ``makeEngine``) from the parsed ``args`` of a parser set up with
+    ``addConnectionArguments``, prompting for a password if needed.
+    '''
+    return makeEngine(
+        urlFromArguments(args), poolSize=args.pool_size, maxOverflow=args.max_overflow,
+        statementTimeout=args.statement_timeout, applicationName=args.application_name,
+        executemanyMode=args.executemany_mode, pageSize=args.page_size, pgbouncer=args.pgbouncer,
+        echo=args.verbose
+    )
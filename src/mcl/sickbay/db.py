@@ -9,6 +9,7 @@ Database related interations.
 
 
 from . import VERSION
+from .connection import addConnectionArguments, engineFromArguments, urlFromArguments  # Still importable from here
 from .model import createMetadata
 from .model.clinicalcore import ClinicalCore, PriorLesion, CoreRace, CoreTobacco
 from .model.specimens import Biospecimen, AdjacentSpecimen
@@ -35,10 +36,10 @@ from .model.enums import (
     ProstaticNoduleLocations, PositiveMargins, SeminalVesicle, LymphaticInvasion, LypmhLocation,
     AJCCProstateInvasionExtent, AJCCRegionalLymphInvasionExtent, AdditionalUninvolvedProstateFindings
 )
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from .json import ClinicalCoreEncoder, Smart3SeqGenomicsEncoder
-import argparse, getpass, datetime, json
+from .scan import scanObjects
+import argparse, datetime, json
 
 
 _description = '''Generate and populate some database structures for
@@ -1072,24 +1073,12 @@ def main():
     '''Command-line entrypoint: creates tables and optionally populates with some test data'''
     parser = argparse.ArgumentParser(description=_description)
     parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
-    parser.add_argument('-U', '--username', default='mcl', help='Database username (%(default)s)')
-    group = parser.add_mutually_exclusive_group()
-    group.add_argument('-w', '--no-password', default=True, action='store_true', help="Don't use a database password")
-    group.add_argument('-W', '--password', default=False, action='store_true', help='Prompt for a database password')
-    parser.add_argument('-H', '--host', default='localhost', help='Database host (%(default)s)')
-    parser.add_argument('-d', '--dbname', default='clinical_data', help='Database name (%(default)s)')
-    parser.add_argument('-v', '--verbose', action='store_true', default=False, help='Be verbose (%(default)s)')
+    addConnectionArguments(parser)
     parser.add_argument('-a', '--add-test-data', action='store_true', default=False, help='Add test data (%(default)s)')
     parser.add_argument('-s', '--add-sample-data', action='store_true', default=False, help="Add Kristen Anton's sample data (%(default)s)")
     args = parser.parse_args()
 
-    password = None if not args.password else getpass.getpass(f'{args.username} password: ')
-    if password:
-        url = f'postgresql://{args.username}:{password}@{args.host}/{args.dbname}'
-    else:
-        url = f'postgresql://{args.username}@{args.host}/{args.dbname}'
-
-    engine = create_engine(url, echo=args.verbose)
+    engine = engineFromArguments(args)
     createMetadata(engine)
 
     Session = sessionmaker()
@@ -1101,7 +1090,7 @@ def main():
     if args.add_sample_data:
         addSampleData(session)
 
-    for i in session.query(Smart3SeqGenomics):
+    for i in scanObjects(session, Smart3SeqGenomics):
         # Do a JSON dump:
         print(json.dumps(i, cls=Smart3SeqGenomicsEncoder))
         # Or just access your favorite attributes:
@@ -0,0 +1,316 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Exporting. These are generators that stream Sickbay data out as JSON text without ever holding
+more than a chunk of participants in memory.
+'''
+
+from . import VERSION
+from .connection import addConnectionArguments, engineFromArguments, engineSettings, sharedEngine
+from .json import ClinicalCoreEncoder, SickbayEncoder, RESTORABLE_SERIALIZERS, SERIALIZERS
+from .model import (
+    Biospecimen,
+    BreastOrgan,
+    ClinicalCore,
+    Genomics,
+    Imaging,
+    LungOrgan,
+    Organ,
+    PancreasOrgan,
+    ProstateOrgan,
+    Smart3SeqGenomics,
+)
+from .rows import iterDocuments
+from .scan import DEFAULT_CHUNK_SIZE, SCAN_MODES, iterObjects, scanObjects
+from .trees import polymorphicOptions, subclassesOf, treeOptions
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from sqlalchemy.orm import sessionmaker
+import argparse, gzip, io, os.path, sys
+
+
+_description = '''Export Sickbay data as newline-delimited JSON, one document per line. Name the
+tables to export; "clinicalCores" gives whole participant trees. With more than one table, each goes
+to its own file in the output directory.
+'''
+
+__version__ = VERSION
+
+# Mapped classes we can export, keyed by table name
+EXPORTABLES = {cls.__tablename__: cls for cls in (
+    ClinicalCore, Biospecimen, Genomics, Smart3SeqGenomics, Imaging, Organ, BreastOrgan, ProstateOrgan,
+    LungOrgan, PancreasOrgan
+)}
+
+# File name suffixes for each kind of compression
+COMPRESSION_SUFFIXES = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+def iterParticipants(session, chunkSize=DEFAULT_CHUNK_SIZE):
+    '''Yield every ``ClinicalCore`` in ``session`` ordered by ``participant_ID``, ``chunkSize`` at a time,
+    with each chunk's whole trees loaded in a fixed number of queries (see ``mcl.sickbay.trees``).
+    '''
+    return iterObjects(session, ClinicalCore, chunkSize, options=treeOptions())
+
+
+def _loaderOptions(cls):
+    '''Return the loader options for instances of ``cls`` that are about to be encoded: whole trees for
+    participants, and subclasses' columns for organs and genomics.
+    '''
+    if cls is ClinicalCore:
+        return treeOptions()
+    return polymorphicOptions(cls, 'selectin') if subclassesOf(cls) else ()
+
+
+def encodeParticipants(session, chunkSize=DEFAULT_CHUNK_SIZE, **kw):
+    '''Yield fragments of text that together form a JSON array of every participant in ``session``, each
+    encoded by ``ClinicalCoreEncoder``. Joined together, the fragments are exactly what
+    ``json.dumps(participants, cls=ClinicalCoreEncoder, **kw)`` would produce (as long as you don't ask
+    for an ``indent``), but only one chunk of participants is ever in memory. Any ``kw`` go to the
+    encoder, just like with ``json.dumps``.
+    '''
+    encoder = ClinicalCoreEncoder(**kw)
+    separator = encoder.item_separator
+    yield '['
+    first = True
+    for participant in iterParticipants(session, chunkSize):
+        if first:
+            first = False
+        else:
+            yield separator
+        yield encoder.encode(participant)
+    yield ']'
+
+
+def dumpParticipants(session, fp, chunkSize=DEFAULT_CHUNK_SIZE, **kw):
+    '''Write every participant in ``session`` as a JSON array to the file-like ``fp`` (which could just as
+    well be a socket's ``makefile``), a chunk at a time. Any ``kw`` go to the encoder.
+    '''
+    for fragment in encodeParticipants(session, chunkSize, **kw):
+        fp.write(fragment)
+
+
+def keyRanges(session, cls, chunkSize=DEFAULT_CHUNK_SIZE):
+    '''Split the instances of the mapped class ``cls`` in ``session`` into ranges of about ``chunkSize``
+    primary keys each. Return a list of ``(after, through)`` pairs, in order, where ``after`` is the key
+    the range starts after (``None`` for the first) and ``through`` is the last key in it (``None`` for the
+    last, so rows added meanwhile aren't missed). Only the keys themselves are read.
+    '''
+    key = cls.__mapper__.primary_key[0]
+    ranges, after, count = [], None, 0
+    for (value,) in session.query(key).order_by(key).yield_per(chunkSize * 10):
+        count += 1
+        if count == chunkSize:
+            ranges.append((after, value))
+            after, count = value, 0
+    ranges.append((after, None))
+    return ranges
+
+
+_workerEngine = None  # Each worker process's own engine, made by ``_startWorker``
+
+
+def _startWorker(url, settings):
+    '''Start a worker process for ``writeNDJSONParallel`` by making its engine for the database at ``url``
+    with the same ``settings`` as the engine it was given (see ``mcl.sickbay.connection.engineSettings``).
+    '''
+    global _workerEngine
+    _workerEngine = sharedEngine(url, **settings)
+
+
+def _encodeRange(cls, after, through, chunkSize, rows, restorable):
+    '''Worker for ``writeNDJSONParallel``: encode the instances of ``cls`` in the primary key range
+    ``after`` (exclusive) to ``through`` (inclusive) with the worker's engine as newline-delimited JSON,
+    and return the text.
+    '''
+    session = sessionmaker(bind=_workerEngine)()
+    try:
+        if rows:
+            documents = iterDocuments(session, cls, chunkSize, after, through, restorable)
+        else:
+            objects = iterObjects(session, cls, chunkSize, after, through, _loaderOptions(cls))
+            serializers = RESTORABLE_SERIALIZERS if restorable else SERIALIZERS
+            documents = (serializers[obj.__class__](obj) for obj in objects)
+        encode = SickbayEncoder().encode
+        return ''.join(encode(document) + '\n' for document in documents)
+    finally:
+        session.close()
+
+
+def writeNDJSONParallel(
+    engine, cls, fp, processes=None, chunkSize=DEFAULT_CHUNK_SIZE, rows=False, restorable=False
+):
+    '''Write every instance of the mapped class ``cls`` in ``engine`` to the text file ``fp`` as
+    newline-delimited JSON, just like ``writeNDJSON``, but with the encoding spread across ``processes``
+    worker processes (by default, one per CPU). Instances are split into ranges of ``chunkSize`` primary
+    keys; each worker has its own engine, made with the same settings as ``engine``, and its own session,
+    and finished ranges are written in key order, so the output is the same as ``writeNDJSON`` makes.
+    Return how many documents we wrote.
+    '''
+    session = sessionmaker(bind=engine)()
+    try:
+        ranges = keyRanges(session, cls, chunkSize)
+    finally:
+        session.close()
+    count, pending = 0, deque()
+    processes = processes or os.cpu_count() or 1
+    initargs = (str(engine.url), engineSettings(engine))
+    with ProcessPoolExecutor(max_workers=processes, initializer=_startWorker, initargs=initargs) as executor:
+        for after, through in ranges:
+            # Keep only a couple of ranges per worker in flight so memory stays bounded
+            pending.append(executor.submit(_encodeRange, cls, after, through, chunkSize, rows, restorable))
+            if len(pending) >= processes * 2:
+                count += _writeRange(fp, pending.popleft())
+        while pending:
+            count += _writeRange(fp, pending.popleft())
+    return count
+
+
+def _writeRange(fp, future):
+    '''Write the newline-delimited JSON text from ``future`` to ``fp`` and return how many lines it had'''
+    text = future.result()
+    fp.write(text)
+    return text.count('\n')
+
+
+def writeNDJSON(session, cls, fp, chunkSize=DEFAULT_CHUNK_SIZE, rows=False, scan=SCAN_MODES[0], restorable=False):
+    '''Write every instance of the mapped class ``cls`` in ``session`` to the text file ``fp`` as
+    newline-delimited JSON, each line the same as the matching encoder in ``mcl.sickbay.json`` would make.
+    For ``ClinicalCore`` that's the whole participant tree. If ``rows`` is True, skip the ORM and build
+    the documents straight from result rows with ``mcl.sickbay.rows``, which is much faster for bulk
+    export. Otherwise, ``scan`` says how to walk the table (see ``mcl.sickbay.scan``). With ``restorable``,
+    the documents also carry what the encoders leave out but ``mcl.sickbay.load`` needs (see
+    ``RESTORABLE_SERIALIZERS`` in ``mcl.sickbay.json``). Return how many we wrote.
+    '''
+    if rows:
+        documents = iterDocuments(session, cls, chunkSize, restorable=restorable)
+    else:
+        objects = scanObjects(session, cls, scan, chunkSize, _loaderOptions(cls))
+        serializers = RESTORABLE_SERIALIZERS if restorable else SERIALIZERS
+        documents = (serializers[obj.__class__](obj) for obj in objects)
+    encode, count, lines = SickbayEncoder().encode, 0, []
+    for document in documents:
+        lines.append(encode(document))
+        lines.append('\n')
+        count += 1
+        if len(lines) >= chunkSize * 2:
+            fp.write(''.join(lines))
+            lines.clear()
+    fp.write(''.join(lines))
+    return count
+
+
+def openOutput(path, compression='none'):
+    '''Open ``path`` for writing UTF-8 text compressed with ``compression``, which is one of the keys of
+    ``COMPRESSION_SUFFIXES``. The path ``-`` means the standard output. For ``zstd`` you'll need the
+    optional ``zstandard`` package.
+    '''
+    stdout = path == '-'
+    if compression == 'gzip':
+        if stdout:
+            return io.TextIOWrapper(gzip.GzipFile(fileobj=sys.stdout.buffer, mode='wb'), encoding='utf-8')
+        return gzip.open(path, 'wt', encoding='utf-8')
+    elif compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError('zstd compression needs the zstandard package; try installing mcl.sickbay[zstd]')
+        return zstandard.open(sys.stdout.buffer if stdout else path, 'wt', encoding='utf-8', closefd=not stdout)
+    elif compression == 'none':
+        if stdout:
+            return open(sys.stdout.fileno(), 'w', encoding='utf-8', closefd=False)
+        return open(path, 'w', encoding='utf-8')
+    else:
+        raise ValueError(f'Unknown compression {compression}')
+
+
+def exportNDJSON(
+    engine, tables, output, compression='none', jobs=1, chunkSize=DEFAULT_CHUNK_SIZE, rows=False, processes=1,
+    scan=SCAN_MODES[0], restorable=False
+):
+    '''Export each of the ``tables`` (keys of ``EXPORTABLES``) from ``engine`` as newline-delimited JSON.
+    With one table, ``output`` is the file to write (``-`` for the standard output); with more, it's a
+    directory and each table goes into its own file there. Up to ``jobs`` tables are written in parallel,
+    each with its own session, which lets database reads and compression overlap. With ``rows``, documents
+    come straight from result rows rather than ORM objects. With more than one ``processes``, each table is
+    encoded by that many worker processes (see ``writeNDJSONParallel``); otherwise ORM objects come from
+    a ``scan`` of each table (see ``mcl.sickbay.scan``). With ``restorable``, the documents can be loaded
+    back in (see ``writeNDJSON``). Return a dict of how many documents went into each table's file.
+    '''
+    if len(tables) == 1:
+        paths = {tables[0]: output}
+    else:
+        os.makedirs(output, exist_ok=True)
+        paths = {t: os.path.join(output, f'{t}.ndjson{COMPRESSION_SUFFIXES[compression]}') for t in tables}
+    Session = sessionmaker(bind=engine)
+
+    def export(table):
+        if processes != 1:
+            with openOutput(paths[table], compression) as fp:
+                return writeNDJSONParallel(engine, EXPORTABLES[table], fp, processes, chunkSize, rows, restorable)
+        session = Session()
+        try:
+            with openOutput(paths[table], compression) as fp:
+                return writeNDJSON(session, EXPORTABLES[table], fp, chunkSize, rows, scan, restorable)
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        return dict(zip(tables, executor.map(export, tables)))
+
+
+def main():
+    '''Command-line entrypoint: exports tables as newline-delimited JSON'''
+    parser = argparse.ArgumentParser(description=_description)
+    parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+    addConnectionArguments(parser)
+    parser.add_argument(
+        '-o', '--output', default='-',
+        help='File to write, or with more than one table, directory to write into (%(default)s)'
+    )
+    parser.add_argument(
+        '-c', '--compression', default='none', choices=sorted(COMPRESSION_SUFFIXES),
+        help='How to compress the output (%(default)s)'
+    )
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='How many tables to write at once (%(default)s)')
+    parser.add_argument(
+        '-n', '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Objects to fetch per query (%(default)s)'
+    )
+    parser.add_argument(
+        '-r', '--rows', action='store_true', default=False,
+        help='Build documents straight from result rows instead of ORM objects; faster (%(default)s)'
+    )
+    parser.add_argument(
+        '-p', '--processes', type=int, default=1,
+        help='Worker processes to encode each table with; 0 for one per CPU (%(default)s)'
+    )
+    parser.add_argument(
+        '-s', '--scan', default=SCAN_MODES[0], choices=SCAN_MODES,
+        help='Page through tables by primary key or stream them through a server-side cursor (%(default)s)'
+    )
+    parser.add_argument(
+        '-R', '--restorable', action='store_true', default=False,
+        help='Include what the documents usually leave out but load-clinical-data needs, such as every '
+        'organ\'s anchor_type (%(default)s)'
+    )
+    parser.add_argument('tables', nargs='*', metavar='TABLE', help=f'Tables to export: {", ".join(EXPORTABLES)}')
+    args = parser.parse_args()
+    tables = args.tables if args.tables else [ClinicalCore.__tablename__]
+    for table in tables:
+        if table not in EXPORTABLES:
+            parser.error(f'Unknown table {table}; choose from {", ".join(EXPORTABLES)}')
+    if len(tables) > 1 and args.output == '-':
+        parser.error('With more than one table, give an output directory with --output')
+
+    engine = engineFromArguments(args)
+    exportNDJSON(
+        engine, tables, args.output, args.compression, args.jobs, args.chunk_size, args.rows, args.processes, args.scan,
+        args.restorable
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Indexes. The model declares an index on every foreign key, ``labcasID``, polymorphic discriminator, and
+pending inscribed ID (see ``mcl.sickbay.model.base.declareIndexes``), and ``createMetadata`` builds them
+with the tables. Databases made before they were declared don't have them, so every relationship load
+there scans a whole table. ``createIndexes`` adds whatever's missing; on PostgreSQL it can build them
+``CONCURRENTLY`` so a busy database keeps taking writes meanwhile. The command-line tool first adds any
+columns the model has gained since the database was made (see ``mcl.sickbay.model.base.addColumns``).
+'''
+
+from . import VERSION
+from .connection import addConnectionArguments, engineFromArguments
+from .model import Base
+from .model.base import addColumns, missingColumns
+from sqlalchemy import inspect
+from sqlalchemy.exc import SAWarning
+import argparse, warnings
+
+
+_description = '''Add the columns and indexes of the Sickbay data model that an existing database doesn't have
+yet.
+'''
+
+__version__ = VERSION
+
+
+def missingIndexes(bind):
+    '''Return the model's indexes that the database reached by ``bind`` doesn't have yet, in the order of
+    their tables' dependencies. Tables the database doesn't have at all (such as ``ingestionBatches`` in
+    databases older than it) are skipped; ``createMetadata`` makes them along with their indexes.
+    '''
+    missing = []
+    with bind.connect() as connection:
+        inspector = inspect(connection)
+        names = set(inspector.get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in names:
+                continue
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', SAWarning)  # We only need the names, not partial predicates
+                existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            indexes = sorted(table.indexes, key=lambda index: index.name)
+            missing.extend(index for index in indexes if index.name not in existing)
+    return missing
+
+
+def createIndexes(bind, concurrently=False):
+    '''Create any of the model's indexes that an existing database reached by ``bind`` doesn't have yet.
+    With ``concurrently`` on PostgreSQL, build each with ``CREATE INDEX CONCURRENTLY`` outside of any
+    transaction, which takes longer but doesn't lock out writes; a build that fails that way leaves an
+    invalid index that must be dropped before trying again. Return the names of the indexes we made.
+    '''
+    made = []
+    with bind.connect() as connection:
+        concurrently = concurrently and connection.dialect.name == 'postgresql'
+        if concurrently:
+            connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+        for index in missingIndexes(connection):
+            options = index.dialect_options['postgresql']
+            options['concurrently'] = concurrently
+            try:
+                index.create(connection)
+            finally:
+                options['concurrently'] = False
+            made.append(index.name)
+    return made
+
+
+def main():
+    '''Command-line entrypoint: adds missing columns and indexes'''
+    parser = argparse.ArgumentParser(description=_description)
+    parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+    addConnectionArguments(parser)
+    parser.add_argument(
+        '-c', '--concurrently', action='store_true', default=False,
+        help='Build indexes on PostgreSQL without locking out writes; slower (%(default)s)'
+    )
+    parser.add_argument(
+        '-n', '--dry-run', action='store_true', default=False,
+        help="Just list the missing columns and indexes; don't make them (%(default)s)"
+    )
+    args = parser.parse_args()
+
+    engine = engineFromArguments(args)
+    if args.dry_run:
+        for column in missingColumns(engine):
+            print(f'Missing column {column.name} on {column.table.name}')
+        for index in missingIndexes(engine):
+            print(f'Missing index {index.name} on {index.table.name}')
+    else:
+        for column in addColumns(engine):
+            print(f'Added column {column.name} to {column.table.name}')
+        for name in createIndexes(engine, args.concurrently):
+            print(f'Created index {name}')
+
+
+if __name__ == '__main__':
+    main()
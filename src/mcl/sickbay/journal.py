@@ -0,0 +1,102 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Load journal. A load that commits a batch at a time can also write an ``IngestionBatch`` row for each
+batch in the same transaction, recording the file, the batch's lines, and the byte offset where the rest
+of the file begins. If the load dies, the journal says exactly what made it into the database, and a
+restarted load can seek straight past it rather than truncating everything and starting over. That only
+holds for the same version of the file, though; if it's changed since, the journal's ``stale``, and the
+earlier version's records have to go before the new one can load.
+'''
+
+from .model import IngestionBatch
+from sqlalchemy import select
+import os
+
+
+_table = IngestionBatch.__table__
+
+
+def fileSignature(path):
+    '''Identify the current version of the file at ``path`` by its size and modification time'''
+    status = os.stat(path)
+    return f'{status.st_size}:{status.st_mtime_ns}'
+
+
+def lastBatch(connection, path, signature):
+    '''Return the journal row of the last committed batch of this version (``signature``) of the file at
+    ``path``, or ``None`` if none of it has been committed.
+    '''
+    query = select(_table.c).where(_table.c.path == path).where(_table.c.signature == signature)
+    return connection.execute(query.order_by(_table.c.batch.desc()).limit(1)).first()
+
+
+def forget(connection, path):
+    '''Remove every journal entry for the file at ``path``, so the next load of it starts from the top'''
+    connection.execute(_table.delete().where(_table.c.path == path))
+
+
+def earlierVersions(connection, path, signature):
+    '''Tell whether any batches of a version of the file at ``path`` other than ``signature`` have been
+    committed, meaning records from a version that's since changed may be in the database.
+    '''
+    query = select([_table.c.batch]).where(_table.c.path == path).where(_table.c.signature != signature)
+    return connection.execute(query.limit(1)).first() is not None
+
+
+class Journal(object):
+    '''Journal of the load of the file at ``path``. Call ``resume`` once the file's header has been read
+    to skip past what's already been committed, ``record`` in each batch's transaction, and ``finish`` at
+    the end. The ``line`` counts how many lines of the file are behind us. The journal is ``stale`` if an
+    earlier version of the file was loaded, in whole or in part; call ``restart`` once its records are gone.
+    '''
+    def __init__(self, connection, path):
+        self.path, self.signature, self.fp = path, fileSignature(path), None
+        self.stale = earlierVersions(connection, path, self.signature)
+        last = lastBatch(connection, path, self.signature)
+        if last is None:
+            self.batch, self.line, self.offset, self.finished = 0, None, None, False
+        else:
+            self.batch, self.line, self.offset, self.finished = last.batch, last.lastLine, last.offset, last.finished
+
+    def restart(self, connection):
+        '''Forget every journal entry for the file, earlier versions and all, so the load starts afresh'''
+        forget(connection, self.path)
+        self.batch, self.line, self.offset, self.finished, self.stale = 0, None, None, False, False
+
+    def resume(self, fp, headerLines=1):
+        '''Note the file object ``fp`` (opened on ``path``) whose position marks the end of each batch,
+        and if some batches are already committed, seek it past them. ``fp`` must be positioned right
+        after the header's ``headerLines``. Return the number to add to line numbers counted from there
+        to make them line numbers in the whole file.
+        '''
+        self.fp = fp
+        if self.offset is None:
+            self.line = headerLines
+            return 0
+        fp.seek(self.offset)
+        return self.line - headerLines
+
+    def record(self, connection, firstLine, lastLine, rows):
+        '''Journal a batch of ``rows`` from ``firstLine`` to ``lastLine`` that's about to be committed on
+        ``connection``; the file object's current position is where the rest of the file starts.
+        '''
+        self.batch += 1
+        self.line, self.offset = lastLine, self.fp.tell()
+        connection.execute(_table.insert().values(
+            path=self.path, signature=self.signature, batch=self.batch, firstLine=firstLine, lastLine=lastLine,
+            offset=self.offset, rows=rows, finished=False
+        ))
+
+    def finish(self, connection):
+        '''Journal that the whole file has been loaded'''
+        if not self.finished:
+            self.batch += 1
+            connection.execute(_table.insert().values(
+                path=self.path, signature=self.signature, batch=self.batch, firstLine=self.line,
+                lastLine=self.line, offset=self.fp.tell(), rows=0, finished=True
+            ))
+            self.finished = True
@@ -20,6 +20,7 @@ from .model import (
     ProstateOrgan,
     Smart3SeqGenomics,
 )
+from operator import attrgetter
 import json, datetime, enum
 
 
@@ -51,22 +52,15 @@ class SickbayEncoder(json.JSONEncoder):
 
 
 class LabCASMetadataEncoder(SickbayEncoder):
+    # These attributes are nullable; labcasID is not, so it's always present
+    _labcasAttributes = (
+        'fileName', 'siteID', 'submittingInvestigatorID', 'processingLevel', 'fileType',
+        'consortium', 'protocolID', 'dateFileGenerated'
+    )
     def default(self, obj):
         '''See https://docs.python.org/3/library/json.html#json.JSONEncoder.default'''
         if isinstance(obj, LabCASMetadata):
-            # Add a "tag" to indicate the "class", and the labcasID which is non-nullable
-            d = {
-                f'__{obj.__class__.__module__}.{obj.__class__.__name__}__': True,
-                'labcasID': obj.labcasID
-            }
-
-            # These other attributes are nullable
-            nullableAttributes = (
-                'fileName', 'siteID', 'submittingInvestigatorID', 'processingLevel', 'fileType',
-                'consortium', 'protocolID', 'dateFileGenerated'
-            )
-            self.addAttributes(obj, nullableAttributes, d)
-            return d
+            return SERIALIZERS[LabCASMetadata](obj)
         else:
             return super(LabCASMetadataEncoder, self).default(obj)
 
@@ -75,13 +69,7 @@ class OrganEncoder(LabCASMetadataEncoder):
     def default(self, obj):
         '''See https://docs.python.org/3/library/json.html#json.JSONEncoder.default'''
         if isinstance(obj, Organ):
-            d = super(OrganEncoder, self).default(obj)
-            d['identifier'] = obj.identifier
-            d['organType'] = obj.organType
-            if obj.histopathology_precancer_types is not None and len(obj.histopathology_precancer_types) > 0:
-                # 🤔 Should this return the enumeration's name or value? Guess we'll do name for now
-                d['histopathology_precancer_types'] = [i.hp_type.name for i in obj.histopathology_precancer_types]
-            return d
+            return SERIALIZERS[Organ](obj)
         else:
             return super(OrganEncoder, self).default(obj)
 
@@ -101,9 +89,7 @@ class BreastOrganEncoder(OrganEncoder):
     def default(self, obj):
         '''See https://docs.python.org/3/library/json.html#json.JSONEncoder.default'''
         if isinstance(obj, BreastOrgan):
-            d = super(BreastOrganEncoder, self).default(obj)
-            self.addAttributes(obj, self._breastAttributes, d)
-            return d
+            return SERIALIZERS[BreastOrgan](obj)
         else:
             return super(BreastOrganEncoder, self).default(obj)
 
@@ -126,9 +112,7 @@ class ProstateOrganEncoder(OrganEncoder):
     def default(self, obj):
         '''See https://docs.python.org/3/library/json.html#json.JSONEncoder.default'''
         if isinstance(obj, ProstateOrgan):
-            d = super(ProstateOrganEncoder, self).default(obj)
-            self.addAttributes(obj, self._prostateAttributes, d)
-            return d
+            return SERIALIZERS[ProstateOrgan](obj)
         else:
             return super(ProstateOrganEncoder, self).default(obj)
 
@@ -145,9 +129,7 @@ class LungOrganEncoder(OrganEncoder):
     def default(self, obj):
         '''See https://docs.python.org/3/library/json.html#json.JSONEncoder.default'''
         if isinstance(obj, LungOrgan):
-            d = super(LungOrganEncoder, self).default(obj)
-            self.addAttributes(obj, self._lungAttributes, d)
-            return d
+            return SERIALIZERS[LungOrgan](obj)
         else:
             return super(LungOrganEncoder, self).default(obj)
 
@@ -168,9 +150,7 @@ class PancreasOrganEncoder(OrganEncoder):
     def default(self, obj):
         '''See https://docs.python.org/3/library/json.html#json.JSONEncoder.default'''
         if isinstance(obj, PancreasOrgan):
-            d = super(PancreasOrganEncoder, self).default(obj)
-            self.addAttributes(obj, self._pancreasAttributes, d)
-            return d
+            return SERIALIZERS[PancreasOrgan](obj)
         else:
             return super(PancreasOrganEncoder, self).default(obj)
 
@@ -195,12 +175,7 @@ class GenomicsEncoder(LabCASMetadataEncoder):
     def default(self, obj):
         '''See https://docs.python.org/3/library/json.html#json.JSONEncoder.default'''
         if isinstance(obj, Genomics):
-            d = super(GenomicsEncoder, self).default(obj)
-            d['specimen_ID'] = obj.specimen_ID
-            when = obj.sequencing_date
-            d['sequencing_date'] = (when.year, when.month, when.day)
-            self.addAttributes(obj, self._genomicsAttributes, d)
-            return d
+            return SERIALIZERS[Genomics](obj)
         else:
             return super(GenomicsEncoder, self).default(obj)
 
@@ -213,9 +188,7 @@ class Smart3SeqGenomicsEncoder(GenomicsEncoder):
     def default(self, obj):
         '''See https://docs.python.org/3/library/json.html#json.JSONEncoder.default'''
         if isinstance(obj, Smart3SeqGenomics):
-            d = super(Smart3SeqGenomicsEncoder, self).default(obj)
-            self.addAttributes(obj, self._smart3SeqGenomicsAttributes, d)
-            return d
+            return SERIALIZERS[Smart3SeqGenomics](obj)
         else:
             return super(Smart3SeqGenomicsEncoder, self).default(obj)
 
@@ -243,28 +216,7 @@ class ClinicalCoreEncoder(LabCASMetadataEncoder):
     def default(self, obj):
         '''See https://docs.python.org/3/library/json.html#json.JSONEncoder.default'''
         if isinstance(obj, ClinicalCore):
-            d = super(ClinicalCoreEncoder, self).default(obj)
-            d['participant_ID'] = obj.participant_ID
-            self.addAttributes(obj, self._clinicalCoreAttributes, d)
-            if obj.prior_lesions is not None and len(obj.prior_lesions) > 0:
-                # 🤔 Should this return the enumeration's name or value? Guess we'll do name for now
-                d['prior_lesions'] = [i.lesion_type.name for i in obj.prior_lesions]
-            if obj.core_races is not None and len(obj.core_races) > 0:
-                # 🤔 Ditto
-                d['core_races'] = [i.race.name for i in obj.core_races]
-            if obj.core_tobaccos is not None and len(obj.core_tobaccos) > 0:
-                d['core_tobaccos'] = [i.type_tobacco_used.name for i in obj.core_tobaccos]
-            if obj.biospecimens:
-                e = BiospecimenEncoder()
-                d['biospecimens'] = [e.default(i) for i in obj.biospecimens]
-            if obj.genomics:
-                d['genomics'] = [GENOMICS_ENCODERS[i.__class__]().default(i) for i in obj.genomics]
-            if obj.images:
-                e = ImagingEncoder()
-                d['images'] = [e.default(i) for i in obj.images]
-            if obj.organs:
-                d['organs'] = [ORGAN_ENCODERS[i.__class__]().default(i) for i in obj.organs]
-            return d
+            return SERIALIZERS[ClinicalCore](obj)
         else:
             return super(ClinicalCoreEncoder, self).default(obj)
 
@@ -282,17 +234,7 @@ class BiospecimenEncoder(LabCASMetadataEncoder):
     def default(self, obj):
         '''See https://docs.python.org/3/library/json.html#json.JSONEncoder.default'''
         if isinstance(obj, Biospecimen):
-            d = super(BiospecimenEncoder, self).default(obj)
-            d['specimen_ID'] = obj.specimen_ID
-            self.addAttributes(obj, self._biospecimenAttributes, d)
-            if obj.adjacent_specimens:
-                d['adjacent_specimens'] = [i.adjacent_specimen_ID for i in obj.adjacent_specimens]
-            if obj.genomics:
-                d['genomics'] = [GENOMICS_ENCODERS[i.__class__]().default(i) for i in obj.genomics]
-            if obj.images:
-                e = ImagingEncoder()
-                d['images'] = [e.default(i) for i in obj.images]
-            return d
+            return SERIALIZERS[Biospecimen](obj)
         else:
             return super(BiospecimenEncoder, self).default(obj)
 
@@ -302,9 +244,485 @@ class ImagingEncoder(LabCASMetadataEncoder):
     def default(self, obj):
         '''See https://docs.python.org/3/library/json.html#json.JSONEncoder.default'''
         if isinstance(obj, Imaging):
-            d = super(ImagingEncoder, self).default(obj)
-            d['identifier'] = obj.identifier
-            self.addAttributes(obj, self._imagingAttributes, d)
-            return d
+            return SERIALIZERS[Imaging](obj)
         else:
             return super(ImagingEncoder, self).default(obj)
+
+
+# Compiled Serializers
+# ====================
+#
+# Running the ``isinstance``/``super`` chain of the encoders above and ``getattr``-ing each attribute
+# one at a time adds up when exporting tens of thousands of participants. So for each mapped class we
+# compile a flat serializer once, at import time, that already knows which attributes to fetch and
+# which of them are enumerations. The encoders above just hand off to these; the output is the same.
+#
+# Each step also carries a ``kind`` (plus ``names``, ``relationship``, or ``path`` as appropriate) so
+# other serializers, such as the ones in ``mcl.sickbay.rows`` and ``mcl.sickbay.pgjson``, can follow
+# the very same plans.
+
+_enumerationLabels = {}  # Cache of member → (label, token) tables, keyed by enumeration class
+
+
+def _labelsFor(cls, name):
+    '''Return a dict that maps members of the enumerated column ``name`` of the mapped class ``cls``
+    to ``(label, token)`` pairs, or ``None`` if ``name`` isn't an enumerated column.
+    '''
+    columns = getattr(getattr(getattr(cls, name, None), 'property', None), 'columns', None)
+    if not columns:
+        return None
+    enumClass = getattr(columns[0].type, 'enum_class', None)
+    if enumClass is None:
+        return None
+    labels = _enumerationLabels.get(enumClass)
+    if labels is None:
+        labels = _enumerationLabels[enumClass] = {member: (member.value, member.name) for member in enumClass}
+    return labels
+
+
+def _getter(names):
+    '''Make a function that returns a tuple of the values of the attributes ``names`` of an object'''
+    if len(names) == 0:
+        return lambda obj: ()
+    elif len(names) == 1:
+        single = attrgetter(names[0])
+        return lambda obj: (single(obj),)
+    else:
+        return attrgetter(*names)
+
+
+def _required(*names):
+    '''Compile a step that always adds the attributes ``names``, even if they're ``None``'''
+    getter = _getter(names)
+    def step(obj, d):
+        d.update(zip(names, getter(obj)))
+    step.kind, step.names = 'required', names
+    return step
+
+
+def _optional(cls, attrNames):
+    '''Compile a step that adds the attributes in ``attrNames`` from an instance of ``cls`` just like
+    ``SickbayEncoder.addAttributes`` does. Names that ``cls`` doesn't have would always be ``None``, so we
+    drop them here rather than look for them on every object.
+    '''
+    names = tuple(name for name in attrNames if hasattr(cls, name))
+    plan = tuple((name, _labelsFor(cls, name)) for name in names)
+    getter = _getter(names)
+    def step(obj, d):
+        for (name, labels), value in zip(plan, getter(obj)):
+            if value is not None:
+                pair = None if labels is None else labels.get(value)
+                d[name] = value if pair is None else {'label': pair[0], 'token': pair[1]}
+    step.kind, step.names = 'optional', names
+    return step
+
+
+def _listing(relationship, path):
+    '''Compile a step that lists ``path`` across each item in the 1-to-many ``relationship``, if any.
+    The step remembers its ``relationship``, ``path``, and ``item`` getter.
+    '''
+    getter = attrgetter(path)
+    def step(obj, d):
+        items = getattr(obj, relationship)
+        if items:
+            d[relationship] = [getter(i) for i in items]
+    step.kind, step.relationship, step.path, step.item = 'listing', relationship, path, getter
+    return step
+
+
+def _nested(relationship, serializers=None):
+    '''Compile a step that serializes each item in the 1-to-many ``relationship``, if any, with the
+    ``serializers`` (by default, ``SERIALIZERS``). The step remembers its ``relationship``; its ``item``
+    is ``None`` since each item is a whole document.
+    '''
+    def step(obj, d):
+        items = getattr(obj, relationship)
+        if items:
+            chosen = SERIALIZERS if serializers is None else serializers
+            d[relationship] = [chosen[i.__class__](i) for i in items]
+    step.kind, step.relationship, step.item = 'nested', relationship, None
+    return step
+
+
+def _sequencingDate(obj, d):
+    '''Step for genomics, whose non-nullable ``sequencing_date`` is always present'''
+    when = obj.sequencing_date
+    d['sequencing_date'] = (when.year, when.month, when.day)
+
+
+_sequencingDate.kind, _sequencingDate.names = 'date', ('sequencing_date',)
+
+
+def _compile(*steps):
+    '''Compile the ``steps`` into a single serializer function that turns an object into a plain dict'''
+    tags = {}
+    def serialize(obj):
+        cls = obj.__class__
+        tag = tags.get(cls)
+        if tag is None:
+            # Add a "tag" to indicate the "class"
+            tag = tags[cls] = f'__{cls.__module__}.{cls.__name__}__'
+        d = {tag: True}
+        for step in steps:
+            step(obj, d)
+        return d
+    return serialize
+
+
+def _labcasSteps(cls):
+    return (_required('labcasID'), _optional(cls, LabCASMetadataEncoder._labcasAttributes))
+
+
+def _organSteps(cls):
+    # 🤔 Should this return the enumeration's name or value? Guess we'll do name for now
+    return _labcasSteps(cls) + (
+        _required('identifier', 'organType'), _listing('histopathology_precancer_types', 'hp_type.name')
+    )
+
+
+def _genomicsSteps(cls):
+    return _labcasSteps(cls) + (
+        _required('specimen_ID'), _sequencingDate, _optional(cls, GenomicsEncoder._genomicsAttributes)
+    )
+
+
+# The steps that make up the serialization of each mapped class, in order
+PLANS = {
+    LabCASMetadata: _labcasSteps(LabCASMetadata),
+    Organ: _organSteps(Organ),
+    BreastOrgan: (*_organSteps(BreastOrgan), _optional(BreastOrgan, BreastOrganEncoder._breastAttributes)),
+    ProstateOrgan: (*_organSteps(ProstateOrgan), _optional(ProstateOrgan, ProstateOrganEncoder._prostateAttributes)),
+    LungOrgan: (*_organSteps(LungOrgan), _optional(LungOrgan, LungOrganEncoder._lungAttributes)),
+    PancreasOrgan: (*_organSteps(PancreasOrgan), _optional(PancreasOrgan, PancreasOrganEncoder._pancreasAttributes)),
+    Genomics: _genomicsSteps(Genomics),
+    Smart3SeqGenomics: (
+        *_genomicsSteps(Smart3SeqGenomics),
+        _optional(Smart3SeqGenomics, Smart3SeqGenomicsEncoder._smart3SeqGenomicsAttributes)
+    ),
+    ClinicalCore: (
+        *_labcasSteps(ClinicalCore),
+        _required('participant_ID'),
+        _optional(ClinicalCore, ClinicalCoreEncoder._clinicalCoreAttributes),
+        # 🤔 Should these return the enumeration's name or value? Guess we'll do name for now
+        _listing('prior_lesions', 'lesion_type.name'),
+        _listing('core_races', 'race.name'),
+        _listing('core_tobaccos', 'type_tobacco_used.name'),
+        _nested('biospecimens'),
+        _nested('genomics'),
+        _nested('images'),
+        _nested('organs'),
+    ),
+    Biospecimen: (
+        *_labcasSteps(Biospecimen),
+        _required('specimen_ID'),
+        _optional(Biospecimen, BiospecimenEncoder._biospecimenAttributes),
+        _listing('adjacent_specimens', 'adjacent_specimen_ID'),
+        _nested('genomics'),
+        _nested('images'),
+    ),
+    Imaging: (
+        *_labcasSteps(Imaging), _required('identifier'), _optional(Imaging, ImagingEncoder._imagingAttributes)
+    ),
+    # Additional plans here as additional organs, genomics, etc., come to be
+}
+
+
+SERIALIZERS = {cls: _compile(*steps) for cls, steps in PLANS.items()}
+
+
+# Restorable Documents
+# ====================
+#
+# The documents above leave out a few attributes that the database can't do without: organs other than
+# breast ones don't say their ``anchor_type``. That's how they've always been written, so they stay that
+# way; but an export meant to be loaded back in can opt into the restorable plans here, which add what's
+# missing so that every row comes back as it was.
+
+RESTORABLE_SERIALIZERS = {}  # Filled in below; the nested steps of the restorable plans look in here
+
+
+def _restorable(cls, steps):
+    '''Make the restorable plan for ``cls`` from its usual ``steps``: nested documents are restorable too,
+    and any attributes the database requires that no step adds are added at the end.
+    '''
+    steps = tuple(
+        _nested(step.relationship, RESTORABLE_SERIALIZERS) if step.kind == 'nested' else step for step in steps
+    )
+    given = {name for step in steps for name in getattr(step, 'names', ())}
+    missing = tuple(name for name in _requiredAttributes(cls) if name not in given)
+    return steps + (_required(*missing),) if missing else steps
+
+
+def _requiredAttributes(cls):
+    '''Name the attributes of the mapped class ``cls`` whose columns can't be null and have no default,
+    other than keys (which are given or generated) and the polymorphic discriminator.
+    '''
+    mapper = getattr(cls, '__mapper__', None)
+    if mapper is None:
+        return ()
+    return tuple(
+        mapper.get_property_by_column(column).key for column in mapper.columns
+        if not column.nullable and column.default is None and column.server_default is None
+        and not column.primary_key and not column.foreign_keys and column is not mapper.polymorphic_on
+    )
+
+
+# The steps of each mapped class's restorable documents, in order
+RESTORABLE_PLANS = {cls: _restorable(cls, steps) for cls, steps in PLANS.items()}
+
+RESTORABLE_SERIALIZERS.update((cls, _compile(*steps)) for cls, steps in RESTORABLE_PLANS.items())
+
+
+# Projections
+# ===========
+#
+# Listing pages and summaries don't need whole participant trees. A projection compiles a serializer
+# from the same plans that keeps only the selected fields and stops at a maximum depth of relationships,
+# so the unselected relationships are never even loaded.
+
+_projections = {}  # Cache of projected serializers, keyed by (class, selection, depth)
+
+
+def _selection(fields):
+    '''Normalize ``fields`` into a hashable selection. ``fields`` can be ``None`` (or ``True``) for
+    everything, a sequence of names, or a dict mapping names to the fields to select within them. Names
+    can be dotted, so ``biospecimens.specimen_ID`` is the same as ``{'biospecimens': ['specimen_ID']}``.
+    The selection is ``None`` for everything or a sorted tuple of (name, selection) pairs.
+    '''
+    if fields is None or fields is True:
+        return None
+    tree = {}
+    for name, within in (fields.items() if isinstance(fields, dict) else ((name, None) for name in fields)):
+        head, dot, rest = name.partition('.')
+        within = _selection({rest: within} if dot else within)
+        tree[head] = _merge(tree[head], within) if head in tree else within
+    return tuple(sorted(tree.items()))
+
+
+def _merge(a, b):
+    '''Merge the normalized selections ``a`` and ``b``'''
+    if a is None or b is None:
+        return None
+    merged = dict(a)
+    for name, within in b:
+        merged[name] = _merge(merged[name], within) if name in merged else within
+    return tuple(sorted(merged.items()))
+
+
+def _projectedNested(relationship, selection, depth):
+    '''Compile a step that serializes each item in the 1-to-many ``relationship`` with the projection of
+    its own class for ``selection`` and ``depth``.
+    '''
+    serializers = {}
+    def step(obj, d):
+        items = getattr(obj, relationship)
+        if items:
+            serialized = []
+            for i in items:
+                serialize = serializers.get(i.__class__)
+                if serialize is None:
+                    serialize = serializers[i.__class__] = _projection(i.__class__, selection, depth)
+                serialized.append(serialize(i))
+            d[relationship] = serialized
+    return step
+
+
+def _projection(cls, selection, depth):
+    '''Compile (or fetch from the cache) the projected serializer of ``cls`` for the normalized
+    ``selection`` and ``depth``, which is ``None`` for no limit.
+    '''
+    key = (cls, selection, depth)
+    serializer = _projections.get(key)
+    if serializer is None:
+        if selection is None and depth is None:
+            serializer = SERIALIZERS[cls]
+        else:
+            wanted = None if selection is None else dict(selection)
+            steps = []
+            for step in PLANS[cls]:
+                if step.kind in ('listing', 'nested'):
+                    name = step.relationship
+                    if depth == 0 or (wanted is not None and name not in wanted):
+                        continue
+                    if step.kind == 'listing':
+                        steps.append(step)
+                    else:
+                        within = None if wanted is None else wanted[name]
+                        steps.append(_projectedNested(name, within, None if depth is None else depth - 1))
+                else:
+                    names = step.names if wanted is None else tuple(n for n in step.names if n in wanted)
+                    if not names:
+                        continue
+                    elif step.kind == 'required':
+                        steps.append(_required(*names))
+                    elif step.kind == 'optional':
+                        steps.append(_optional(cls, names))
+                    else:
+                        steps.append(step)
+            serializer = _compile(*steps)
+        serializer = _projections[key] = serializer
+    return serializer
+
+
+def projection(cls, fields=None, depth=None):
+    '''Return a serializer for instances of the mapped class ``cls`` (or its subclasses) that turns them
+    into plain dicts like ``SERIALIZERS`` does, but with just the ``fields`` selected (see ``_selection``;
+    ``None`` for all) and following at most ``depth`` levels of relationships (``None`` for no limit, 0 for
+    none at all). Listings like ``prior_lesions`` count as a level too. Names a class doesn't have are
+    ignored, so a selection can mention fields of several organ or genomics subclasses at once.
+    '''
+    return _projection(cls, _selection(fields), depth)
+
+
+class ProjectionEncoder(SickbayEncoder):
+    '''Encoder for any Sickbay object that includes only the selected ``fields`` down to a maximum
+    ``depth``; for example, ``json.dumps(participant, cls=ProjectionEncoder, fields=['participant_ID',
+    'gender'], depth=0)``. See ``projection``.
+    '''
+    def __init__(self, *args, fields=None, depth=None, **kw):
+        super(ProjectionEncoder, self).__init__(*args, **kw)
+        self.selection, self.depth = _selection(fields), depth
+    def default(self, obj):
+        '''See https://docs.python.org/3/library/json.html#json.JSONEncoder.default'''
+        if obj.__class__ in PLANS:
+            return _projection(obj.__class__, self.selection, self.depth)(obj)
+        else:
+            return super(ProjectionEncoder, self).default(obj)
+
+
+# Decoding
+# ========
+#
+# Going the other way, ``SickbayDecoder`` turns the documents made above back into mapped objects. We
+# compile a decoding for each tagged class from the same plans, so each document's keys are looked up
+# in a single dict that already knows which are enumerations (resolved by token through a cached table),
+# which is the sequencing date, and which are listings or nested documents.
+
+_enumerationTokens = {}  # Cache of token → member tables, keyed by enumeration class
+
+
+def _tokensFor(cls, name):
+    '''Return a dict that maps tokens of the enumerated column ``name`` of the mapped class ``cls`` to
+    their members, or ``None`` if ``name`` isn't an enumerated column.
+    '''
+    enumClass = getattr(getattr(cls.__mapper__.columns.get(name), 'type', None), 'enum_class', None)
+    if enumClass is None:
+        return None
+    tokens = _enumerationTokens.get(enumClass)
+    if tokens is None:
+        tokens = _enumerationTokens[enumClass] = {member.name: member for member in enumClass}
+    return tokens
+
+
+def _enumerated(tokens):
+    '''Make a function that resolves a ``label``/``token`` dict, or a bare token, with ``tokens``'''
+    def convert(value):
+        return tokens[value['token'] if isinstance(value, dict) else value]
+    return convert
+
+
+def _date(value):
+    return datetime.date(*value)
+
+
+class _Decoding(object):
+    '''How to decode a document for the mapped class ``cls``: ``converters`` maps attribute names to
+    a function to convert their values (or ``None`` to take them as-is), ``listings`` maps relationship
+    names to the class, attribute, and converter of each listed item, ``nested`` names the relationships
+    of whole documents, ``required`` names the attributes the database can't do without, and ``keys``
+    names the primary key attributes.
+    '''
+    def __init__(self, cls):
+        mapper = cls.__mapper__
+        discriminator = getattr(mapper.polymorphic_on, 'key', None)
+        self.converters, self.listings, self.nested = {}, {}, set()
+        for step in RESTORABLE_PLANS[cls]:  # What any document might carry
+            if step.kind == 'date':
+                self.converters.update((name, _date) for name in step.names)
+            elif step.kind == 'listing':
+                target, name = mapper.relationships[step.relationship].mapper.class_, step.path.split('.')[0]
+                tokens = _tokensFor(target, name)
+                self.listings[step.relationship] = (target, name, None if tokens is None else _enumerated(tokens))
+            elif step.kind == 'nested':
+                self.nested.add(step.relationship)
+            else:
+                for name in step.names:
+                    if name != discriminator:
+                        tokens = _tokensFor(cls, name)
+                        self.converters[name] = None if tokens is None else _enumerated(tokens)
+        self.required = _requiredAttributes(cls)
+        self.keys = tuple(mapper.get_property_by_column(column).key for column in mapper.primary_key)
+        self.base = mapper.base_mapper.class_
+
+
+# Mapped classes keyed by the tag the encoders give their documents
+TAGGED = {f'__{cls.__module__}.{cls.__name__}__': cls for cls in PLANS if hasattr(cls, '__mapper__')}
+
+DECODINGS = {cls: _Decoding(cls) for cls in TAGGED.values()}
+
+
+class SickbayDecoder(json.JSONDecoder):
+    '''Decoder for everything the Sickbay encoders make; pass it to ``json.load(cls=)``. Objects tagged
+    with ``__<module>.<Class>__`` become instances of that mapped class again, with their enumerations
+    resolved to members, their listings (like ``prior_lesions``) turned back into related objects, and
+    their nested documents into related instances. Untagged objects stay dicts.
+
+    A document without an attribute the database requires, such as the ``anchor_type`` that the usual organ
+    documents leave out, can't be restored and raises ``ValueError``; export with ``RESTORABLE_SERIALIZERS``
+    to include them.
+
+    Within a single ``decode``, a document for an object that's already been decoded (say, genomics
+    nested under both a participant and one of its biospecimens) gives back that same object, so each
+    row is only inserted once.
+    '''
+    def __init__(self, *args, **kw):
+        kw.setdefault('object_hook', self.rehydrate)
+        super(SickbayDecoder, self).__init__(*args, **kw)
+        self.identities = {}
+    def decode(self, s, *args, **kw):
+        '''See https://docs.python.org/3/library/json.html#json.JSONDecoder.decode'''
+        self.identities.clear()
+        return super(SickbayDecoder, self).decode(s, *args, **kw)
+    def rehydrate(self, d):
+        '''Turn the dict ``d`` back into an object if it has a class tag'''
+        cls = next((TAGGED[key] for key in d if key in TAGGED), None)
+        if cls is None:
+            return d
+        decoding, values, related = DECODINGS[cls], {}, {}
+        converters, listings, nested = decoding.converters, decoding.listings, decoding.nested
+        for key, value in d.items():
+            if key in converters:
+                convert = converters[key]
+                values[key] = value if convert is None or value is None else convert(value)
+            elif key in listings:
+                target, name, convert = listings[key]
+                related[key] = [self.build(target, {name: i if convert is None else convert(i)}, {}) for i in value]
+            elif key in nested:
+                related[key] = value
+        return self.build(cls, values, related)
+    def build(self, cls, values, related):
+        '''Build an instance of ``cls`` with attribute ``values`` and ``related`` items for each of its
+        relationships, unless we've already built the object with the same identity.
+        '''
+        decoding = DECODINGS.get(cls)
+        if decoding is None:
+            return self.construct(cls, values, related)
+        missing = [name for name in decoding.required if values.get(name) is None]
+        if missing:
+            raise ValueError(
+                f'{cls.__name__} document has no {", ".join(missing)}, which the database requires; '
+                'only restorable exports can be loaded'
+            )
+        identity = (decoding.base,) + tuple(values.get(key) for key in decoding.keys)
+        obj = self.identities.get(identity)
+        if obj is None:
+            obj = self.construct(cls, values, related)
+            if None not in identity:
+                self.identities[identity] = obj
+        return obj
+    def construct(self, cls, values, related):
+        '''Make the new instance of the mapped class ``cls``; subclasses can make something else'''
+        obj = cls(**values)
+        for name, items in related.items():
+            setattr(obj, name, items)
+        return obj
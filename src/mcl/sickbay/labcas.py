@@ -0,0 +1,799 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+LabCAS DATA files. Sites submit clinical data to LabCAS as delimited text files (comma- or tab-separated)
+with a header row naming the common data elements, such as ``12_78_ClinicalCore_20200624_0_DATA``. The
+loader here parses such files and streams their rows straight into PostgreSQL with ``COPY``, a chunk at
+a time, without ever making an ORM object. Columns map onto the attributes of the mapped class for the
+file; enumerated values may be given either by label (``Female``) or token (``female``), in any case;
+``|``-separated lists become rows in the child tables (like ``prior_lesions``); and a ``participant_ID``
+or ``specimen_ID`` in a file that isn't about participants or specimens goes into the matching
+``inscribed_…`` column so the record can be associated later.
+'''
+
+from . import VERSION
+from .connection import addConnectionArguments, engineFromArguments, engineSettings, sharedEngine
+from .journal import Journal, forget as forgetJournal
+from .model import (
+    Biospecimen,
+    BreastOrgan,
+    ClinicalCore,
+    Genomics,
+    Imaging,
+    LungOrgan,
+    Organ,
+    PancreasOrgan,
+    ProstateOrgan,
+    Smart3SeqGenomics,
+)
+from .model.base import inscriptions
+from .validation import validateBatch
+from sqlalchemy import Boolean, Date, Float, Integer, Sequence, bindparam, func, select
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import sessionmaker
+import argparse, contextlib, csv, datetime, hashlib, io, os, psycopg2, re, sys
+
+
+_description = '''Load LabCAS DATA files into the Sickbay database with PostgreSQL COPY. The kind of
+data in each file comes from its name, like 12_78_ClinicalCore_20200624_0_DATA, unless you say otherwise.
+'''
+
+__version__ = VERSION
+
+DEFAULT_CHUNK_SIZE = 10000  # How many file rows to send per COPY
+
+# Mapped classes for each kind of LabCAS DATA file, as named in the file names
+DATA_TYPES = {
+    'ClinicalCore': ClinicalCore,
+    'Biospecimen': Biospecimen,
+    'Genomics': Genomics,
+    'Smart3SeqGenomics': Smart3SeqGenomics,
+    'Imaging': Imaging,
+    'BreastCore': BreastOrgan,
+    'ProstateCore': ProstateOrgan,
+    'LungCore': LungOrgan,
+    'PancreasCore': PancreasOrgan,
+}
+
+# LabCAS file names: protocol ID, site ID, data type, date, and version
+_fileNamePattern = re.compile(r'^(?P<protocolID>\d+)_(?P<siteID>\d+)_(?P<dataType>[A-Za-z0-9]+)_\d+_\d+_DATA')
+
+# Columns that name another record in a file that's about something else, and where they go
+_inscriptions = {
+    'participant_ID': 'inscribed_clinicalCore_participant_ID',
+    'specimen_ID': 'inscribed_biospecimen_specimen_ID',
+}
+
+# ``|``-separated columns that become child rows: column → (relationship, attribute of each child)
+_lists = {
+    ClinicalCore: {
+        'prior_lesion_type': ('prior_lesions', 'lesion_type'),
+        'race': ('core_races', 'race'),
+        'type_tobacco_used': ('core_tobaccos', 'type_tobacco_used'),
+        'tobacco_types': ('core_tobaccos', 'type_tobacco_used'),
+    },
+    Biospecimen: {
+        'adjacent_specimen_ID': ('adjacent_specimens', 'adjacent_specimen_ID'),
+        'adjacent_specimen_IDs': ('adjacent_specimens', 'adjacent_specimen_ID'),
+    },
+    Organ: {
+        'histopathology_precancer_type': ('histopathology_precancer_types', 'hp_type'),
+    },
+}
+
+_polarTokens = {'yes': True, 'y': True, 'true': True, 't': True, '1': True,
+                'no': False, 'n': False, 'false': False, 'f': False, '0': False}
+
+
+# Converters
+# ==========
+#
+# Each turns a (non-empty) cell of text into the value to store, raising ``ValueError`` if it can't.
+
+def _enumConverter(enumClass, tokens=True):
+    '''Make a converter for ``enumClass`` that accepts labels or tokens in any case and gives the token,
+    which is what the database stores, or if ``tokens`` is false the member itself, for ORM objects.
+    '''
+    lookup = enumClass.lookup
+    def convert(text):
+        member = lookup(text.strip())
+        if member is None:
+            raise ValueError(f'"{text}" is not one of the permissible values of {enumClass.__name__}')
+        return member.name if tokens else member
+    return convert
+
+
+def _integer(text):
+    try:
+        return int(text)
+    except ValueError:
+        number = float(text)
+        if not number.is_integer():
+            raise
+        return int(number)
+
+
+def _boolean(text):
+    value = _polarTokens.get(text.strip().lower())
+    if value is None:
+        raise ValueError(f'"{text}" is not a yes/no value')
+    return value
+
+
+def _date(text):
+    return datetime.date.fromisoformat(text.strip())
+
+
+def _converter(column, tokens=True):
+    '''Return the converter for cells bound for ``column``; ``tokens`` is as for ``_enumConverter``'''
+    enumClass = getattr(column.type, 'enum_class', None)
+    if enumClass is not None:
+        return _enumConverter(enumClass, tokens)
+    elif isinstance(column.type, Boolean):
+        return _boolean
+    elif isinstance(column.type, Integer):
+        return _integer
+    elif isinstance(column.type, Float):
+        return float
+    elif isinstance(column.type, Date):
+        return _date
+    else:
+        return str
+
+
+def _copyText(value):
+    '''Format ``value`` as a field of PostgreSQL's ``COPY`` text format'''
+    if value is None:
+        return '\\N'
+    elif value is True:
+        return 't'
+    elif value is False:
+        return 'f'
+    text = str(value)
+    if '\\' in text or '\t' in text or '\n' in text or '\r' in text:
+        text = text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+    return text
+
+
+# Layouts
+# =======
+
+class _Target(object):
+    '''Rows headed for one table: its ``columns`` (keys, in order) and the ``rows`` gathered so far'''
+    def __init__(self, table, columns):
+        self.table, self.columns, self.rows = table, tuple(columns), []
+
+
+class _Child(object):
+    '''A ``|``-separated list in the file at ``index`` that becomes rows of a child table: the
+    ``relationship`` on the parent, the child's mapped ``cls`` and the ``attribute`` each item goes into,
+    the child's sequence-backed ``key`` column, the parent's attribute its foreign key takes (``parentKey``),
+    where to gather its rows (``target``), and the converter for its items.
+    '''
+    __slots__ = ('index', 'relationship', 'cls', 'attribute', 'key', 'parentKey', 'target', 'convert')
+    def __init__(self, index, relationship, cls, attribute, key, parentKey, target, convert):
+        self.index, self.relationship, self.cls, self.attribute = index, relationship, cls, attribute
+        self.key, self.parentKey, self.target, self.convert = key, parentKey, target, convert
+
+
+class Layout(object):
+    '''How the columns of a DATA file with ``header`` map onto the tables for the mapped class ``cls``.
+    The ``metadata`` are extra values (like ``labcasID``) that go into every record. Enumerated cells
+    convert to tokens for ``COPY``, or if ``tokens`` is false to members for ORM objects (though items of
+    ``|``-separated lists always become tokens, since they always go in as Core rows). With ``upsert``,
+    records already in the database are replaced if their content hash differs and skipped if it doesn't.
+    '''
+    def __init__(self, cls, header, metadata, tokens=True, upsert=False):
+        self.cls, mapper = cls, cls.__mapper__
+        columns = {prop.key.lower(): prop.columns[0] for prop in mapper.column_attrs}
+        lists = {}
+        for c in reversed(cls.__mro__):
+            lists.update((name.lower(), spec) for name, spec in _lists.get(c, {}).items())
+        protected = {c.key for c in mapper.primary_key if isinstance(c.default, Sequence)}
+        if mapper.polymorphic_on is not None:
+            protected.add(mapper.polymorphic_on.key)
+        self.fields, self.children, self.ignored = [], [], []
+        for index, name in enumerate(header):
+            name = name.strip()
+            key = name.lower()
+            if key in columns and columns[key].key not in protected and (
+                columns[key].primary_key or not columns[key].foreign_keys
+            ):
+                column = columns[key]
+            elif name in _inscriptions and _inscriptions[name].lower() in columns:
+                column = columns[_inscriptions[name].lower()]
+            elif key in lists:
+                relationship, attribute = lists[key]
+                prop = mapper.relationships[relationship]
+                (parentColumn, childColumn), = prop.local_remote_pairs
+                itemColumn, childKey = prop.mapper.columns[attribute], prop.mapper.primary_key[0]
+                target = _Target(prop.mapper.local_table, (childKey.key, childColumn.key, itemColumn.key))
+                self.children.append(_Child(  # Child rows always go in as Core rows, so they always get tokens
+                    index, relationship, prop.mapper.class_, attribute, childKey, parentColumn.key, target,
+                    _converter(itemColumn)
+                ))
+                continue
+            else:
+                self.ignored.append(name)
+                continue
+            self.fields.append((index, column.key, _converter(column, tokens)))
+
+        self.metadata = {k: v for k, v in metadata.items() if k.lower() in columns and v is not None}
+        self.key = mapper.primary_key[0]
+        self.allocate = self.key.key in protected
+        if self.key.key not in {key for index, key, convert in self.fields} and not self.allocate:
+            raise ValueError(f'The file has no {self.key.key} column, which {cls.__name__} needs')
+        given = {key for index, key, convert in self.fields} | set(self.metadata) | {self.key.key}
+        self.discriminator = None
+        if mapper.polymorphic_on is not None:
+            self.discriminator = (mapper.polymorphic_on.key, mapper.polymorphic_identity)
+            given.add(mapper.polymorphic_on.key)
+        self.upsert, self.replaced, self.unchanged = upsert, set(), 0
+        if upsert:
+            if not upsertable(cls):
+                raise ValueError(f'{cls.__name__} has no natural key and content hash to upsert with')
+            self.hashed = tuple(sorted(key for index, key, convert in self.fields))
+            given.add('contentHash')
+        self.targets = [
+            _Target(m.local_table, (c.key for c in m.local_table.c if c.key in given))
+            for m in reversed(list(mapper.iterate_to_root()))
+        ]
+
+    def add(self, records, connection, lineNumbers):
+        '''Convert the ``records`` (lists of cells) into rows for each target table, reserving keys from
+        sequences for the whole lot at once. If any record won't fit the model, raise a ``ValueError``
+        listing every problem in the lot before anything goes to the database.
+        '''
+        if not records:
+            return
+        keys = _allocate(connection, self.key, len(records)) if self.allocate else None
+        converted = []  # (values, list of items for each child) for each record
+        for i, record in enumerate(records):
+            values = dict(self.metadata)
+            try:
+                for index, key, convert in self.fields:
+                    text = record[index] if index < len(record) else ''
+                    values[key] = convert(text) if text.strip() else self.metadata.get(key)
+                if keys is not None:
+                    values[self.key.key] = keys[i]
+                if self.discriminator is not None:
+                    values[self.discriminator[0]] = self.discriminator[1]
+                lists = []
+                for child in self.children:
+                    text = record[child.index] if child.index < len(record) else ''
+                    lists.append([child.convert(item) for item in text.split('|') if item.strip()])
+            except ValueError as ex:
+                raise ValueError(f'Line {lineNumbers[i]}: {ex}') from ex
+            converted.append((values, lists))
+        validateBatch(self.cls, [values for values, lists in converted], lineNumbers, [
+            (child.cls, child.attribute, [lists[position] for values, lists in converted])
+            for position, child in enumerate(self.children)
+        ])
+        if self.upsert:
+            converted = self._changed(connection, converted)
+        for values, lists in converted:
+            for target in self.targets:
+                target.rows.append(tuple(values.get(key) for key in target.columns))
+        expandLists(connection, self.children, converted)
+
+    def _changed(self, connection, converted):
+        '''Work out the content hash of each of the ``converted`` records and return just those that are new
+        or whose hash differs from the one in the database, noting the keys of the latter as ``replaced``.
+        '''
+        key = self.key.key
+        for values, lists in converted:
+            values['contentHash'] = _contentHash(values, self.hashed, lists)
+        query = select([self.key, self.key.table.c.contentHash]).where(
+            self.key.in_([values[key] for values, lists in converted])
+        )
+        existing = dict(connection.execute(query).fetchall())
+        changed = []
+        for values, lists in converted:
+            if values[key] in existing:
+                if existing[values[key]] == values['contentHash']:
+                    self.unchanged += 1
+                    continue
+                self.replaced.add(values[key])
+            changed.append((values, lists))
+        return changed
+
+    def flush(self, connection):
+        '''Send all the gathered rows to the database, parents first, and return how many went into each
+        table. When upserting, the old child rows of replaced records go first.
+        '''
+        for target in self.targets:
+            if target.rows:
+                if self.upsert:
+                    _upsert(connection, target, self.replaced)
+                else:
+                    copyRows(connection, target)
+        if self.replaced:
+            for child in self.children:
+                foreignKey = child.target.table.c[child.target.columns[1]]
+                connection.execute(child.target.table.delete().where(foreignKey.in_(self.replaced)))
+            self.replaced.clear()
+        for child in self.children:
+            if child.target.rows:
+                copyRows(connection, child.target)
+        counts = {}
+        for target in self.targets + [child.target for child in self.children]:
+            if target.rows:
+                counts[target.table.name] = counts.get(target.table.name, 0) + len(target.rows)
+                target.rows.clear()
+        return counts
+
+
+def expandLists(connection, children, parents):
+    '''Turn the ``|``-separated lists of a whole batch of ``parents`` into rows for each of the ``children``
+    tables at once, reserving the keys for each child table in one block, and add the rows to each child's
+    target. Each of the ``parents`` is a mapping of its values (which must include the key its children
+    refer to) and a list of items for each child.
+    '''
+    for position, child in enumerate(children):
+        pairs = [(values[child.parentKey], item) for values, lists in parents for item in lists[position]]
+        if pairs:
+            keys = _allocate(connection, child.key, len(pairs))
+            child.target.rows.extend((key, parent, item) for key, (parent, item) in zip(keys, pairs))
+
+
+def _allocate(connection, column, count):
+    '''Reserve ``count`` new values for the sequence-backed key ``column`` and return them as a list. On
+    PostgreSQL that's one round-trip; elsewhere we count up from the current largest key.
+    '''
+    if connection.dialect.name == 'postgresql':
+        query = select([column.default.next_value()]).select_from(func.generate_series(1, count))
+        return [row[0] for row in connection.execute(query)]
+    largest = connection.execute(select([func.max(column)])).scalar() or 0
+    return list(range(largest + 1, largest + count + 1))
+
+
+def _contentHash(values, keys, lists):
+    '''Fingerprint a record from its ``values`` for the ``keys`` that came from the file and its child ``lists``'''
+    content = repr((tuple(values.get(key) for key in keys), lists)).encode('utf-8')
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def _upsert(connection, target, replaced):
+    '''Send the rows of ``target`` so that new ones are inserted and those whose keys are in ``replaced``
+    overwrite what's there. PostgreSQL gets ``INSERT … ON CONFLICT DO UPDATE``; elsewhere we insert the
+    new rows and update the replaced ones separately.
+    '''
+    keys = [c.key for c in target.table.primary_key]
+    rows = [dict(zip(target.columns, row)) for row in target.rows]
+    if connection.dialect.name == 'postgresql':
+        statement = postgresql.insert(target.table)
+        updates = {key: statement.excluded[key] for key in target.columns if key not in keys}
+        if updates:
+            statement = statement.on_conflict_do_update(index_elements=keys, set_=updates)
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=keys)
+        connection.execute(statement, rows)
+    else:
+        key = keys[0]
+        new = [row for row in rows if row[key] not in replaced]
+        old = [dict(row, _key=row[key]) for row in rows if row[key] in replaced]
+        if new:
+            connection.execute(target.table.insert(), new)
+        if old:
+            connection.execute(target.table.update().where(target.table.c[key] == bindparam('_key')), old)
+
+
+def copyRows(connection, target):
+    '''Send the rows of ``target``, one of the targets of a ``Layout`` or of its children, with ``COPY …
+    FROM STDIN`` on PostgreSQL (through psycopg2), or an ``executemany`` insert anywhere else.
+    '''
+    if connection.dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        for row in target.rows:
+            buffer.write('\t'.join(_copyText(value) for value in row))
+            buffer.write('\n')
+        buffer.seek(0)
+        preparer = connection.dialect.identifier_preparer
+        columns = ', '.join(preparer.quote(key) for key in target.columns)
+        statement = f'COPY {preparer.format_table(target.table)} ({columns}) FROM STDIN'
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(statement, buffer)
+        finally:
+            cursor.close()
+    else:
+        connection.execute(target.table.insert(), [dict(zip(target.columns, row)) for row in target.rows])
+
+
+# Loading
+# =======
+
+def classForFile(path):
+    '''Work out the mapped class for the LabCAS DATA file at ``path`` from its name, or return ``None``'''
+    match = _fileNamePattern.match(os.path.basename(path))
+    return DATA_TYPES.get(match.group('dataType')) if match else None
+
+
+def dataFiles(locations):
+    '''Expand the ``locations``, paths to files or directories, into the paths of files to load: every file
+    given, plus each file anywhere under each directory whose name makes it a DATA file we know, in order.
+    '''
+    paths = []
+    for location in locations:
+        if os.path.isdir(location):
+            for directory, dirs, names in sorted(os.walk(location)):
+                paths.extend(os.path.join(directory, name) for name in sorted(names) if classForFile(name))
+        else:
+            paths.append(location)
+    return paths
+
+
+def upsertable(cls):
+    '''Tell whether records of the mapped class ``cls`` can be upserted, which takes a natural key (rather
+    than one from a sequence) and a content hash to compare.
+    '''
+    mapper = cls.__mapper__
+    return not isinstance(mapper.primary_key[0].default, Sequence) and 'contentHash' in mapper.columns
+
+
+def forgetFile(connection, cls, fileName):
+    '''Delete the records of the mapped class ``cls`` that were loaded from the file named ``fileName``,
+    along with the rows of any tables that refer to them, such as their child lists, so the file can be
+    loaded again afresh. Records are matched by their own ``fileName``, so any whose file gave them a
+    ``fileName`` of some other file are taken to be from that one and stay. Return how many records went.
+    '''
+    mapper = cls.__mapper__
+    base = mapper.base_mapper.local_table
+    key = base.c[mapper.base_mapper.primary_key[0].key]
+    doomed = select([key]).where(base.c.fileName == fileName)
+    if mapper.polymorphic_on is not None:
+        doomed = doomed.where(mapper.polymorphic_on == mapper.polymorphic_identity)
+    tables = [m.local_table for m in mapper.iterate_to_root()]  # Most derived first
+    for table in reversed(cls.metadata.sorted_tables):
+        if table not in tables:
+            for fk in table.foreign_keys:
+                if fk.column.table in tables:
+                    connection.execute(table.delete().where(fk.parent.in_(doomed)))
+    count = 0
+    for table in tables:
+        count = connection.execute(table.delete().where(list(table.primary_key)[0].in_(doomed))).rowcount
+    return count
+
+
+def pruneFile(connection, cls, fileName, keys):
+    '''Delete the records of the mapped class ``cls`` loaded from the file named ``fileName`` whose primary
+    keys aren't among ``keys``, such as those a new version of the file no longer has, along with their
+    child lists. Records of other tables that refer to them came from other files, so they're detached
+    instead where their foreign key can be null, keeping the ID in their inscribed column (if they have
+    one) for ``mcl.sickbay.resolve`` to attach them again should the record come back; those whose foreign
+    key can't be null go too. Return how many records went.
+    '''
+    mapper = cls.__mapper__
+    base = mapper.base_mapper.local_table
+    key = base.c[mapper.base_mapper.primary_key[0].key]
+    query = select([key]).where(base.c.fileName == fileName)
+    if mapper.polymorphic_on is not None:
+        query = query.where(mapper.polymorphic_on == mapper.polymorphic_identity)
+    doomed = [row[0] for row in connection.execute(query) if row[0] not in keys]
+    tables = [m.local_table for m in mapper.iterate_to_root()]  # Most derived first
+    lists = {
+        mapper.relationships[relationship].mapper.local_table
+        for c in cls.__mro__ for relationship, attribute in _lists.get(c, {}).values()
+    }
+    count = 0
+    for start in range(0, len(doomed), DEFAULT_CHUNK_SIZE):
+        chunk = doomed[start:start + DEFAULT_CHUNK_SIZE]
+        for table in reversed(cls.metadata.sorted_tables):
+            if table in tables:
+                continue
+            inscribed = {reference.key: column.key for column, reference in inscriptions(table)}
+            for fk in table.foreign_keys:
+                if fk.column.table not in tables:
+                    continue
+                elif fk.parent.nullable and table not in lists:
+                    values = {fk.parent.key: None}
+                    if fk.parent.key in inscribed:
+                        values[inscribed[fk.parent.key]] = fk.parent
+                    connection.execute(table.update().where(fk.parent.in_(chunk)).values(values))
+                else:
+                    connection.execute(table.delete().where(fk.parent.in_(chunk)))
+        for table in tables:  # The base table comes last, so its count is the one that stays
+            deleted = connection.execute(table.delete().where(list(table.primary_key)[0].in_(chunk))).rowcount
+        count += deleted
+    return count
+
+
+def _keysInFile(path, layout):
+    '''Return the set of primary keys of the records in the DATA file at ``path`` laid out by ``layout``'''
+    index, convert = next((index, convert) for index, key, convert in layout.fields if key == layout.key.key)
+    with open(path, 'r', encoding='utf-8-sig', newline='') as fp:
+        reader = dataReader(fp)
+        next(reader, None)
+        return {convert(record[index]) for record in reader if index < len(record) and record[index].strip()}
+
+
+def fileMetadata(path, labcasID, metadata):
+    '''Make the LabCAS metadata for every record from the file at ``path``, for its ``Layout``'''
+    values = {'labcasID': labcasID or path, 'fileName': os.path.basename(path)}
+    match = _fileNamePattern.match(os.path.basename(path))
+    if match:
+        values.update(protocolID=match.group('protocolID'), siteID=match.group('siteID'))
+    values.update(metadata)
+    return values
+
+
+def dataReader(fp):
+    '''Make a CSV reader for ``fp``, guessing between tabs and commas from its first line'''
+    first = fp.readline()
+    delimiter = '\t' if first.count('\t') >= first.count(',') else ','
+    return csv.reader(_chain(first, fp), delimiter=delimiter)
+
+
+def _chain(first, fp):
+    yield first
+    yield from iter(fp.readline, '')  # Not plain iteration, which would stop fp.tell() working
+
+
+def loadDataFile(
+    bind, path, cls=None, labcasID=None, chunkSize=DEFAULT_CHUNK_SIZE, upsert=False, journal=False, replace=False,
+    **metadata
+):
+    '''Load the LabCAS DATA file at ``path`` into the engine or connection ``bind``, all in one transaction,
+    sending ``chunkSize`` rows per ``COPY``. The mapped class comes from the file name unless you give
+    ``cls``. Every record gets ``labcasID`` (the path, by default), the file name, and the protocol and site
+    IDs from the file name, plus any other LabCAS ``metadata`` you give, like ``consortium``. Return a dict
+    of how many rows went into each table, plus the header columns we ``ignored``.
+
+    To reload a corrected file, set ``upsert``: records whose ``participant_ID`` or ``specimen_ID`` are
+    already in the database then replace what's there (child lists included) if their content changed,
+    and are skipped entirely if it didn't; the count of those is ``unchanged``. Only classes with such
+    natural keys can be upserted; organs and images get new keys every time.
+
+    To load a new version of a file loaded before, set ``replace``: records of classes that can be upserted
+    are, and then those loaded from a file of the same name that the new version no longer has are deleted
+    (see ``pruneFile``); the count of those is ``pruned``. For the other classes the records loaded from a
+    file of the same name are deleted first (see ``forgetFile``); the count of those is ``forgotten``.
+
+    For big files, set ``journal``: each chunk is then committed on its own along with an entry in the
+    ``ingestionBatches`` journal (see ``mcl.sickbay.journal``), and loading the same file again resumes
+    after the last chunk committed, or does nothing if it all was. The count of lines skipped that way is
+    ``resumed``. If the file has changed since an earlier journaled load of it, that load's records are
+    still there, so this raises ``ValueError`` unless you also set ``replace``, in which case the file
+    starts over from the top.
+    '''
+    cls = cls or classForFile(path)
+    if cls is None:
+        raise ValueError(f'Cannot tell what kind of data is in {path}; please give the mapped class')
+    forget = replace and not (upsert or upsertable(cls))
+    prune = replace and not forget
+    upsert = upsert or prune
+    with open(path, 'r', encoding='utf-8-sig', newline='') as fp, bind.connect() as connection:
+        reader = dataReader(fp)
+        header = next(reader, None)
+        if header is None:
+            return {}
+        values = fileMetadata(path, labcasID, metadata)
+        layout = Layout(cls, header, values, upsert=upsert)
+        counts, log, base = {}, None, 0
+        if journal:
+            log = Journal(connection, path)
+            if log.stale:
+                if not replace:
+                    raise ValueError(f'{path} has changed since it was loaded before; give replace to replace it')
+                with connection.begin():
+                    log.restart(connection)
+            counts['resumed'] = (log.line or reader.line_num) - reader.line_num
+            base = log.resume(fp, reader.line_num)
+        if log is None or not log.finished:
+            with contextlib.nullcontext() if journal else connection.begin():
+                if forget and (log is None or log.offset is None):  # Not when resuming after earlier chunks
+                    with connection.begin() if journal else contextlib.nullcontext():
+                        counts['forgotten'] = forgetFile(connection, cls, values['fileName'])
+                records, lineNumbers = [], []
+                for record in reader:
+                    if not any(cell.strip() for cell in record):
+                        continue
+                    records.append(record)
+                    lineNumbers.append(reader.line_num + base)
+                    if len(records) >= chunkSize:
+                        _send(connection, layout, records, lineNumbers, counts, log)
+                        records, lineNumbers = [], []
+                _send(connection, layout, records, lineNumbers, counts, log)
+                with connection.begin() if journal else contextlib.nullcontext():
+                    if prune:
+                        counts['pruned'] = pruneFile(connection, cls, values['fileName'], _keysInFile(path, layout))
+                    if log is not None:
+                        log.finish(connection)
+        counts['ignored'] = layout.ignored
+        if upsert:
+            counts['unchanged'] = layout.unchanged
+        return counts
+
+
+def _send(connection, layout, records, lineNumbers, counts, journal):
+    '''Send a chunk of ``records`` through the ``layout`` and tally the rows in ``counts``. With a
+    ``journal``, the chunk gets its own transaction and journal entry.
+    '''
+    if not records:
+        return
+    with connection.begin():
+        layout.add(records, connection, lineNumbers)
+        _count(counts, layout.flush(connection))
+        if journal is not None:
+            journal.record(connection, lineNumbers[0], lineNumbers[-1], len(records))
+
+
+def _count(counts, more):
+    for table, count in more.items():
+        counts[table] = counts.get(table, 0) + count
+
+
+# Parallel Loading
+# ================
+
+# Keys in the results of ``loadDataFile`` that aren't tables
+_notTables = ('ignored', 'resumed', 'unchanged', 'forgotten', 'pruned')
+
+_workerEngine = None  # Each worker process's own engine, made by ``_startWorker``
+
+
+def _loadFile(bind, path, cls, options):
+    '''Load one file for ``loadDataFiles`` with the keyword arguments in ``options``; return its counts and
+    ``None``, or ``None`` and why it failed. Besides bad values and database errors, that covers files
+    ``csv`` can't parse and errors psycopg2 raises straight from ``COPY``.
+    '''
+    try:
+        return loadDataFile(bind, path, cls, **options), None
+    except (OSError, ValueError, csv.Error, SQLAlchemyError, psycopg2.Error) as ex:
+        return None, str(ex)
+
+
+def _startWorker(url, settings):
+    '''Start a worker process for ``loadDataFiles`` by making its engine (and so its pool of connections)
+    for the database at ``url`` with the same ``settings`` as the engine it was given (see
+    ``mcl.sickbay.connection.engineSettings``).
+    '''
+    global _workerEngine
+    _workerEngine = sharedEngine(url, **settings)
+
+
+def _loadFileInWorker(path, cls, options):
+    '''Worker for ``loadDataFiles``: load the file at ``path`` with the worker's engine'''
+    return _loadFile(_workerEngine, path, cls, options)
+
+
+def loadDataFiles(
+    engine, paths, cls=None, processes=None, chunkSize=DEFAULT_CHUNK_SIZE, upsert=False, journal=False, replace=(),
+    **metadata
+):
+    '''Load many LabCAS DATA files into the database of ``engine`` across ``processes`` worker processes
+    (by default, one per CPU), each file in its own transaction (or, with ``journal``, its own series of
+    them) as with ``loadDataFile``, whose arguments these share, except that ``replace`` holds the paths
+    of just those files to load with ``replace`` set. All the files load at once, in no particular order:
+    the loader never sets foreign keys, only the inscribed IDs that ``mcl.sickbay.resolve`` turns into
+    them afterwards, so no file has to wait for another. A file that fails (including one whose kind of
+    data can't be told) doesn't stop the others. Worker processes make engines of their own with the same
+    settings as ``engine``.
+
+    Return a report: a dict with the results of ``loadDataFile`` for each path that loaded under
+    ``files``, why each path that didn't failed under ``errors``, and how many rows went into each table
+    from all the files together under ``totals``.
+    '''
+    report = {'files': {}, 'errors': {}, 'totals': {}}
+    options, replace = dict(metadata, chunkSize=chunkSize, upsert=upsert, journal=journal), set(replace)
+    processes = processes or os.cpu_count() or 1
+    executor = None
+    if processes > 1:
+        initargs = (str(engine.url), engineSettings(engine))
+        executor = ProcessPoolExecutor(max_workers=processes, initializer=_startWorker, initargs=initargs)
+    try:
+        jobs = [(path, dict(options, replace=path in replace)) for path in paths]
+        if executor is None:
+            results = [(path, _loadFile(engine, path, cls, o)) for path, o in jobs]
+        else:
+            futures = [(path, executor.submit(_loadFileInWorker, path, cls, o)) for path, o in jobs]
+            results = [(path, future.result()) for path, future in futures]
+        for path, (counts, error) in results:
+            if error is not None:
+                report['errors'][path] = error
+            else:
+                report['files'][path] = counts
+                _count(report['totals'], {k: v for k, v in counts.items() if k not in _notTables})
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return report
+
+
+def main():
+    '''Command-line entrypoint: loads LabCAS DATA files'''
+    parser = argparse.ArgumentParser(description=_description)
+    parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+    addConnectionArguments(parser)
+    parser.add_argument(
+        '-t', '--type', choices=sorted(DATA_TYPES), help='Kind of data in the files, if not from their names'
+    )
+    parser.add_argument(
+        '-n', '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows to send per COPY (%(default)s)'
+    )
+    parser.add_argument('-c', '--consortium', help='Consortium URL to record with each row')
+    parser.add_argument(
+        '-o', '--objects', action='store_true', default=False,
+        help='Go through ORM objects, committing a chunk at a time, rather than COPY; slower (%(default)s)'
+    )
+    parser.add_argument(
+        '-p', '--processes', type=int, default=1,
+        help='Worker processes to load files with at once; 0 for one per CPU (%(default)s)'
+    )
+    parser.add_argument(
+        '-j', '--journal', action='store_true', default=False,
+        help='Commit and journal each chunk, and resume files whose loads were cut short (%(default)s)'
+    )
+    parser.add_argument(
+        '-u', '--upsert', action='store_true', default=False,
+        help='Replace records already loaded if they changed and skip them if not (%(default)s)'
+    )
+    parser.add_argument(
+        '-m', '--manifest', action='store_true', default=False,
+        help='Load only files that are new or changed since the file manifest last saw them, replacing the '
+        'records of changed ones (%(default)s)'
+    )
+    parser.add_argument('files', nargs='+', metavar='FILE', help='LabCAS DATA files, or directories of them, to load')
+    args = parser.parse_args()
+    if args.objects and args.upsert:
+        parser.error('--upsert needs COPY loading; it does not work with --objects')
+
+    engine = engineFromArguments(args)
+    cls = DATA_TYPES[args.type] if args.type else None
+    paths, plan, failed = dataFiles(args.files), None, False
+    if args.manifest:
+        from .manifest import planDelta, recordFiles  # The manifest builds on this module
+        plan = planDelta(engine, paths)
+        paths = plan.scheduled
+        print(f'{len(plan.new)} new, {len(plan.changed)} changed, {len(plan.unchanged)} unchanged files')
+    if args.objects:
+        from .pipeline import ingestDataFile  # The pipeline builds on this module
+        session = sessionmaker(bind=engine)()
+        try:
+            for path in paths:
+                if plan is not None and path in plan.changed:
+                    fileClass = cls or classForFile(path)
+                    if fileClass is not None and upsertable(fileClass):
+                        print(f'{path}: failed: replacing its records needs COPY loading', file=sys.stderr)
+                        failed = True
+                        continue
+                    elif fileClass is not None:
+                        forgetFile(session.connection(), fileClass, os.path.basename(path))
+                        forgetJournal(session.connection(), path)
+                        session.commit()
+                count = ingestDataFile(
+                    session, path, cls, batchSize=args.chunk_size, journal=args.journal, consortium=args.consortium
+                )
+                print(f'{path}: {count} records')
+                if plan is not None:
+                    recordFiles(engine, plan, [path])
+        finally:
+            session.close()
+        if failed:
+            sys.exit(1)
+        return
+    report = loadDataFiles(
+        engine, paths, cls, args.processes, args.chunk_size, args.upsert, args.journal,
+        plan.changed if plan is not None else (), consortium=args.consortium
+    )
+    if plan is not None:
+        recordFiles(engine, plan, list(report['files']))
+    for path, counts in report['files'].items():
+        ignored = counts.pop('ignored')
+        print(f'{path}: ' + ', '.join(f'{count} {table}' for table, count in counts.items()))
+        if ignored:
+            print(f'{path}: ignored columns {", ".join(ignored)}')
+    for path, error in report['errors'].items():
+        print(f'{path}: failed: {error}', file=sys.stderr)
+    print('Total: ' + ', '.join(f'{count} {table}' for table, count in report['totals'].items()))
+    if report['errors']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Loading. These functions restore what ``mcl.sickbay.export`` wrote with ``restorable`` set (the usual
+documents leave out some attributes the database requires): newline-delimited JSON documents
+(or JSON arrays of them), decoded by ``SickbayDecoder`` and inserted a batch at a time, either as ORM
+objects through a session or, much faster, as Core parameter lists with one ``executemany`` per table.
+'''
+
+from . import VERSION
+from .connection import addConnectionArguments, engineFromArguments
+from .json import DECODINGS, SickbayDecoder
+from .model import Base
+from sqlalchemy import Sequence, func, select
+from sqlalchemy.orm import sessionmaker
+import argparse, gzip, sys
+
+
+_description = '''Load Sickbay data from newline-delimited JSON files such as export-clinical-data
+--restorable makes. Files ending in .gz or .zst are decompressed; "-" means the standard input.
+'''
+
+__version__ = VERSION
+
+DEFAULT_BATCH_SIZE = 1000  # How many documents to insert per transaction
+
+_tables = {}  # Cache of per-table column plans, keyed by mapper
+
+
+class _Record(object):
+    '''What ``_RecordDecoder`` makes instead of an ORM object: the mapped class, a dict of attribute
+    values, and a dict of related records keyed by relationship name.
+    '''
+    __slots__ = ('cls', 'values', 'related')
+    def __init__(self, cls, values, related):
+        self.cls, self.values, self.related = cls, values, related
+
+
+class _RecordDecoder(SickbayDecoder):
+    '''Decoder that makes lightweight ``_Record``s rather than instrumented ORM objects'''
+    def construct(self, cls, values, related):
+        return _Record(cls, values, related)
+
+
+def _tablePlan(mapper):
+    '''Work out how to split the values of an instance of ``mapper`` into rows for each of its tables,
+    starting with the base table: return a sequence of table, the non-key columns (which default to
+    ``None``), the key columns (which are omitted if they're not given so their sequences can fill them
+    in), and the polymorphic discriminator column and value, if any.
+    '''
+    plan = _tables.get(mapper)
+    if plan is None:
+        plan = []
+        for m in reversed(list(mapper.iterate_to_root())):
+            table = m.local_table
+            keys = tuple(c.key for c in table.primary_key)
+            others = tuple(c.key for c in table.c if c.key not in keys)
+            discriminator = None
+            if mapper.polymorphic_on is not None and mapper.polymorphic_on.table is table:
+                discriminator = (mapper.polymorphic_on.key, mapper.polymorphic_identity)
+            plan.append((table, others, keys, discriminator))
+        plan = _tables[mapper] = tuple(plan)
+    return plan
+
+
+def _flatten(record, rows):
+    '''Add rows for the ``record`` and everything related to it to ``rows``, a dict mapping each table
+    to a dict of its rows keyed by primary key. Related records get their foreign keys set from the
+    record's values; rows with the same primary key (like genomics nested in two places) are merged.
+    '''
+    mapper = record.cls.__mapper__
+    values = record.values
+    for name, items in record.related.items():
+        (parentColumn, childColumn), = mapper.relationships[name].local_remote_pairs
+        for item in items:
+            item.values[childColumn.key] = values.get(parentColumn.key)
+            _flatten(item, rows)
+    for table, others, keys, discriminator in _tablePlan(mapper):
+        row = dict.fromkeys(others)
+        row.update((key, values[key]) for key in others if key in values)
+        identity = tuple(values.get(key) for key in keys)
+        if None in identity:
+            identity = (None, len(rows.setdefault(table, {})))  # No key yet; the sequence will make one
+        else:
+            row.update(zip(keys, identity))
+        if discriminator is not None:
+            row[discriminator[0]] = discriminator[1]
+        existing = rows.setdefault(table, {}).get(identity)
+        if existing is None:
+            rows[table][identity] = row
+        else:
+            existing.update((k, v) for k, v in row.items() if v is not None)
+
+
+def _decoded(documents, decoder):
+    '''Decode each JSON text in ``documents`` with ``decoder``, skipping blank lines and flattening
+    arrays, and yield the results.
+    '''
+    for text in documents:
+        if text.strip():
+            decoded = decoder.decode(text)
+            if isinstance(decoded, list):
+                yield from decoded
+            else:
+                yield decoded
+
+
+def iterParameters(documents, batchSize=DEFAULT_BATCH_SIZE):
+    '''Decode the JSON texts in ``documents`` (like the lines of an NDJSON file) ``batchSize`` at a time,
+    and for each batch yield a list of ``(table, parameters)`` pairs ordered so that tables come before
+    any that refer to them. The ``parameters`` are lists of dicts ready for
+    ``connection.execute(table.insert(), parameters)``; within a list, every dict has the same keys.
+    '''
+    decoder, rows, count = _RecordDecoder(), {}, 0
+    for record in _decoded(documents, decoder):
+        if record.__class__ is not _Record or record.cls not in DECODINGS:
+            raise ValueError(f'Not a Sickbay document: {record!r}')
+        _flatten(record, rows)
+        count += 1
+        if count >= batchSize:
+            yield _parameters(rows)
+            rows, count = {}, 0
+    if rows:
+        yield _parameters(rows)
+
+
+def _parameters(rows):
+    '''Turn the ``rows`` by table into ``(table, parameters)`` pairs in dependency order, splitting the
+    rows of a table into groups that have the same keys so each group can be one ``executemany``.
+    '''
+    parameters = []
+    for table in Base.metadata.sorted_tables:
+        groups = {}
+        for row in rows.get(table, {}).values():
+            groups.setdefault(tuple(row), []).append(row)
+        parameters.extend((table, group) for group in groups.values())
+    return parameters
+
+
+def resetSequences(connection):
+    '''Move each primary key sequence past the largest key in its table, since loading rows with their
+    keys given doesn't use up sequence values. Only PostgreSQL needs this; elsewhere it does nothing.
+    '''
+    if connection.dialect.name != 'postgresql':
+        return
+    for table in Base.metadata.sorted_tables:
+        for column in table.primary_key:
+            if isinstance(column.default, Sequence):
+                largest = connection.execute(select([func.max(column)])).scalar()
+                if largest is not None:
+                    connection.execute(select([func.setval(column.default.name, largest)]))
+
+
+def loadRows(bind, documents, batchSize=DEFAULT_BATCH_SIZE):
+    '''Insert the JSON texts in ``documents`` into the engine or connection ``bind`` with Core
+    ``executemany`` statements, one transaction per ``batchSize`` documents. This skips the ORM entirely
+    and is the quickest way to restore an export. Return how many rows went into each table.
+    '''
+    counts = {}
+    with bind.connect() as connection:
+        for batch in iterParameters(documents, batchSize):
+            with connection.begin():
+                for table, parameters in batch:
+                    connection.execute(table.insert(), parameters)
+                    counts[table.name] = counts.get(table.name, 0) + len(parameters)
+        with connection.begin():
+            resetSequences(connection)
+    return counts
+
+
+def loadObjects(session, documents, batchSize=DEFAULT_BATCH_SIZE):
+    '''Decode the JSON texts in ``documents`` into ORM objects and add them to the ``session``,
+    committing every ``batchSize`` documents and then clearing the session so memory stays flat. Use
+    this when you want the ORM's events and validation; otherwise ``loadRows`` is faster. Return how
+    many top-level objects were loaded.
+    '''
+    decoder, batch, count = SickbayDecoder(), [], 0
+    for obj in _decoded(documents, decoder):
+        batch.append(obj)
+        if len(batch) >= batchSize:
+            count += _commit(session, batch)
+    count += _commit(session, batch)
+    resetSequences(session.connection())
+    session.commit()
+    return count
+
+
+def _commit(session, batch):
+    '''Add and commit the objects in ``batch``, then empty it and the session; return how many there were'''
+    count = len(batch)
+    if count:
+        session.add_all(batch)
+        session.commit()
+        session.expunge_all()
+        batch.clear()
+    return count
+
+
+def openInput(path):
+    '''Open ``path`` for reading UTF-8 text, decompressing it if it ends in ``.gz`` or ``.zst``. The path
+    ``-`` means the standard input. For ``.zst`` files you'll need the optional ``zstandard`` package.
+    '''
+    if path == '-':
+        return open(sys.stdin.fileno(), 'r', encoding='utf-8', closefd=False)
+    elif path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    elif path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError('zstd compression needs the zstandard package; try installing mcl.sickbay[zstd]')
+        return zstandard.open(path, 'rt', encoding='utf-8')
+    else:
+        return open(path, 'r', encoding='utf-8')
+
+
+def main():
+    '''Command-line entrypoint: loads newline-delimited JSON into the database'''
+    parser = argparse.ArgumentParser(description=_description)
+    parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+    addConnectionArguments(parser)
+    parser.add_argument(
+        '-n', '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+        help='Documents to insert per transaction (%(default)s)'
+    )
+    parser.add_argument(
+        '-o', '--objects', action='store_true', default=False,
+        help='Insert through ORM objects rather than straight Core statements; slower (%(default)s)'
+    )
+    parser.add_argument('files', nargs='+', metavar='FILE', help='NDJSON files to load, in order; "-" for stdin')
+    args = parser.parse_args()
+
+    engine = engineFromArguments(args)
+    for path in args.files:
+        with openInput(path) as documents:
+            if args.objects:
+                session = sessionmaker(bind=engine)()
+                try:
+                    loadObjects(session, documents, args.batch_size)
+                finally:
+                    session.close()
+            else:
+                loadRows(engine, documents, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
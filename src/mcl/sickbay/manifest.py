@@ -0,0 +1,90 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+File manifest. The ``labcasFiles`` table (``mcl.sickbay.model.LabCASFile``) keeps the size and a hash of
+the content of every LabCAS DATA file loaded. ``planDelta`` compares incoming files against it and
+schedules only the ones that are new or changed, so a nightly reload of a whole directory parses and
+inserts just what's different rather than everything again. A changed file has to replace the records
+loaded from it before, rather than add to them; ``mcl.sickbay.labcas.loadDataFile`` does that when given
+``replace``.
+'''
+
+from .model import LabCASFile
+from sqlalchemy import select
+import datetime, hashlib, os
+
+
+_table = LabCASFile.__table__
+
+_blockSize = 1024 * 1024  # How much of a file to hash at a time
+
+
+def fileDigest(path):
+    '''Return the size of the file at ``path`` and a hash of its content'''
+    digest, size = hashlib.blake2b(digest_size=32), 0
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(_blockSize), b''):
+            digest.update(block)
+            size += len(block)
+    return size, digest.hexdigest()
+
+
+class Plan(object):
+    '''What to do with a set of incoming files: the paths of those that are ``new`` to the manifest, those
+    that ``changed`` since they were loaded, and those ``unchanged``. ``digests`` maps each path to its
+    size and content hash.
+    '''
+    __slots__ = ('new', 'changed', 'unchanged', 'digests')
+    def __init__(self):
+        self.new, self.changed, self.unchanged, self.digests = [], [], [], {}
+
+    @property
+    def scheduled(self):
+        '''The paths of the files that need loading'''
+        return self.new + self.changed
+
+
+def planDelta(bind, paths):
+    '''Compare the files at ``paths`` against the manifest in the database reached by ``bind``, an engine
+    or connection, and return a ``Plan`` of which ones need loading. Files are matched by name, since the
+    directory they arrive in may differ, and a file has changed if its size or content hash differs. Every
+    file gets hashed, even one whose size alone shows it changed, since the manifest records the hash of
+    each file loaded.
+    '''
+    names = sorted({os.path.basename(path) for path in paths})
+    query = select([_table.c.fileName, _table.c.size, _table.c.contentHash]).where(_table.c.fileName.in_(names))
+    with bind.connect() as connection:
+        known = {name: (size, contentHash) for name, size, contentHash in connection.execute(query)}
+    plan = Plan()
+    for path in paths:
+        digest = plan.digests[path] = fileDigest(path)
+        entry = known.get(os.path.basename(path))
+        if entry is None:
+            plan.new.append(path)
+        elif entry != digest:
+            plan.changed.append(path)
+        else:
+            plan.unchanged.append(path)
+    return plan
+
+
+def recordFiles(bind, plan, paths):
+    '''Record the files at ``paths``, all of which must be in the ``plan``, as loaded in the manifest in
+    the database reached by ``bind``, replacing whatever it said about files of the same names.
+    '''
+    now = datetime.datetime.utcnow()
+    rows = {
+        os.path.basename(path): dict(
+            fileName=os.path.basename(path), path=os.path.abspath(path), size=plan.digests[path][0],
+            contentHash=plan.digests[path][1], loaded=now
+        )
+        for path in paths
+    }
+    if not rows:
+        return
+    with bind.connect() as connection, connection.begin():
+        connection.execute(_table.delete().where(_table.c.fileName.in_(list(rows))))
+        connection.execute(_table.insert(), list(rows.values()))
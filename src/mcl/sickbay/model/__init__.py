@@ -8,19 +8,22 @@ Data model implementation module.
 '''
 
 
-from .base import Base, LabCASMetadata
+from .base import Base, LabCASMetadata, addColumns
 from .clinicalcore import ClinicalCore, PriorLesion
 from .genomics import Genomics, Smart3SeqGenomics
 from .images import Imaging
+from .ingestion import IngestionBatch, LabCASFile
 from .organs import Organ, BreastOrgan, ProstateOrgan, LungOrgan, PancreasOrgan
 from .specimens import Biospecimen, AdjacentSpecimen
 
 
 def createMetadata(engine):
     '''Make all the known data definitions a reality in the given ``engine``. Note that this requires
-    plenty of classes defined by import above.
+    plenty of classes defined by import above. Tables that already exist get any columns the model has
+    added since they were made (see ``mcl.sickbay.model.base.addColumns``).
     '''
     Base.metadata.create_all(engine)
+    addColumns(engine)
 
 
 __all__ = [
@@ -31,6 +34,8 @@ __all__ = [
     createMetadata,
     Genomics,
     Imaging,
+    IngestionBatch,
+    LabCASFile,
     LabCASMetadata,
     LungOrgan,
     Organ,
@@ -7,7 +7,8 @@ Characterization of Screen-Detected Lesions.
 Base classes and base data model definitions.
 '''
 
-from sqlalchemy import Column, String
+from sqlalchemy import Column, Index, String, inspect
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.ext.declarative import declarative_base
 
 
@@ -32,3 +33,82 @@ class LabCASMetadata(object):
     submittingInvestigatorID = Column(String(10))
     processingLevel          = Column(String(16))
     fileType                 = Column(String(32))
+
+    # Fingerprint of the data the record came from, so reloading an unchanged record can be skipped
+    contentHash = Column(String(32))
+
+
+# Prefix of columns that record whom a detached row belongs to before it's associated with them
+INSCRIBED_PREFIX = 'inscribed_'
+
+
+def inscriptions(table):
+    '''Return (inscribed column, foreign key column) pairs of ``table``: ``inscribed_clinicalCore_participant_ID``
+    goes with ``clinicalCore_participant_ID``, and so on.
+    '''
+    return [
+        (column, table.c[column.key[len(INSCRIBED_PREFIX):]])
+        for column in table.c if column.key.startswith(INSCRIBED_PREFIX)
+    ]
+
+
+def pendingIndexes(table):
+    '''Add to ``table`` a partial index on each inscribed column covering only the rows whose foreign key
+    hasn't been set yet, so finding detached rows to associate (see ``mcl.sickbay.resolve``) stays quick
+    however many rows are already attached. Databases without partial indexes get the whole column indexed.
+    '''
+    for inscribed, reference in inscriptions(table):
+        Index(
+            f'ix_{table.name}_pending_{reference.key}', inscribed,
+            postgresql_where=reference.is_(None), sqlite_where=reference.is_(None)
+        )
+
+
+def declareIndexes(cls):
+    '''Declare the indexes for the table of the mapped class ``cls``: one on each foreign key column that
+    isn't also the primary key, so loading a relationship looks up its rows rather than scanning the whole
+    table; one on ``labcasID``, so the rows from a file can be found; one on the polymorphic discriminator
+    (``organType``, ``genomicType``); and the partial indexes on inscribed IDs from ``pendingIndexes``.
+    ``createMetadata`` builds them all; ``mcl.sickbay.indexes`` adds them to existing databases.
+    '''
+    table = cls.__table__
+    columns = [column for column in table.c if column.foreign_keys and not column.primary_key]
+    if 'labcasID' in table.c:
+        columns.append(table.c.labcasID)
+    discriminator = cls.__mapper__.polymorphic_on
+    if discriminator is not None and discriminator.table is table:
+        columns.append(discriminator)
+    for column in columns:
+        Index(f'ix_{table.name}_{column.key}', column)
+    pendingIndexes(table)
+
+
+def missingColumns(bind):
+    '''Return the model's columns that tables already in the database reached by ``bind`` don't have yet,
+    such as ``contentHash`` in tables made before it was added to ``LabCASMetadata``. Tables that aren't
+    there at all are left for ``create_all`` to make.
+    '''
+    missing = []
+    with bind.connect() as connection:
+        inspector = inspect(connection)
+        names = set(inspector.get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name in names:
+                existing = {column['name'] for column in inspector.get_columns(table.name)}
+                missing.extend(column for column in table.c if column.name not in existing)
+    return missing
+
+
+def addColumns(bind):
+    '''Add the model's columns that existing tables in the database reached by ``bind`` lack with
+    ``ALTER TABLE … ADD COLUMN``, so the ORM can select them. Columns added since the model's first release
+    are all nullable, so existing rows simply get ``NULL``. Return the columns we added.
+    '''
+    with bind.connect() as connection:
+        missing = missingColumns(connection)
+        with connection.begin():
+            for column in missing:
+                table = connection.dialect.identifier_preparer.format_table(column.table)
+                definition = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.execute(f'ALTER TABLE {table} ADD COLUMN {definition}')
+    return missing
@@ -7,7 +7,7 @@ Characterization of Screen-Detected Lesions.
 Clinical core of the data model.
 '''
 
-from .base import Base, LabCASMetadata
+from .base import Base, LabCASMetadata, declareIndexes
 from .genomics import Genomics
 from .images import Imaging
 from .organs import Organ
@@ -184,3 +184,12 @@ ClinicalCore.organs        = relationship('Organ',        order_by=Organ.identif
 ClinicalCore.prior_lesions = relationship('PriorLesion',  order_by=PriorLesion.identifier,  back_populates='clinicalCore')
 ClinicalCore.core_races    = relationship('CoreRace',     order_by=CoreRace.identifier,     back_populates='clinicalCore')
 ClinicalCore.core_tobaccos = relationship('CoreTobacco',  order_by=CoreTobacco.identifier,  back_populates='clinicalCore')
+
+
+# Indexes
+# -------
+
+declareIndexes(ClinicalCore)
+declareIndexes(PriorLesion)
+declareIndexes(CoreRace)
+declareIndexes(CoreTobacco)
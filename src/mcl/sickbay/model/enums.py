@@ -10,14 +10,69 @@ Enumerations.
 from aenum import Enum
 
 
+_labelTables = {}   # Cache of lowercase label → member tables, keyed by enumeration class
+_lookupTables = {}  # Cache of lowercase label/name → member tables, keyed by enumeration class
+_codeTables = {}    # Cache of lowercase label/name → position tables, keyed by enumeration class
+
+
 class _CaseInsensitiveEnum(Enum):
     @classmethod
     def _missing_name_(cls, value):
-        value = value.lower()
-        for member in cls:
-            if member.value.lower() == value:
-                return member
-        return None
+        '''Find the member whose label is ``value``, ignoring case, for item access like ``Gender['MALE']``.
+        Names still have to match exactly there; ``lookup`` and ``parseColumn`` take names in any case too.
+        '''
+        table = _labelTables.get(cls)
+        if table is None:
+            table = _labelTables[cls] = {member.value.lower(): member for member in cls}
+        return table.get(value.lower())
+
+    @classmethod
+    def lookupTable(cls):
+        '''Return the table that maps the lowercase label and lowercase name of each member to the
+        member, building it the first time. Labels win if a label happens to match another's name.
+        '''
+        table = _lookupTables.get(cls)
+        if table is None:
+            table = {name.lower(): member for name, member in cls.__members__.items()}
+            table.update((member.value.lower(), member) for member in cls)
+            _lookupTables[cls] = table
+        return table
+
+    @classmethod
+    def lookup(cls, text):
+        '''Return the member whose label or name is ``text``, ignoring case, or ``None`` if there's none.
+        Unlike item access, which takes names only as they're spelled, this accepts names in any case,
+        since LabCAS DATA files give tokens as often as labels.
+        '''
+        table = _lookupTables.get(cls) or cls.lookupTable()
+        return table.get(text.lower())
+
+    @classmethod
+    def parseColumn(cls, cells, codes=False):
+        '''Parse a whole column of text ``cells`` at once, each a label or name in any case with any
+        surrounding whitespace. Blank (or ``None``) cells become ``None``. Return a pair: a list of the
+        members (or, if ``codes`` is True, their integer positions in declaration order, handy for
+        dictionary encoding), and a list of ``(index, cell)`` for each cell that isn't a permissible value,
+        whose result is ``None``.
+        '''
+        table = _lookupTables.get(cls) or cls.lookupTable()
+        if codes:
+            codeTable = _codeTables.get(cls)
+            if codeTable is None:
+                positions = {member: position for position, member in enumerate(cls)}
+                codeTable = _codeTables[cls] = {text: positions[member] for text, member in table.items()}
+            table = codeTable
+        results, errors = [], []
+        for index, cell in enumerate(cells):
+            text = cell.strip() if cell is not None else ''
+            if not text:
+                results.append(None)
+                continue
+            result = table.get(text.lower())
+            if result is None:
+                errors.append((index, cell))
+            results.append(result)
+        return results, errors
 
 
 class Anchors(_CaseInsensitiveEnum):
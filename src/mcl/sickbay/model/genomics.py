@@ -7,7 +7,7 @@ Characterization of Screen-Detected Lesions.
 Genomics of the data model.
 '''
 
-from .base import Base, LabCASMetadata
+from .base import Base, LabCASMetadata, declareIndexes
 from sqlalchemy import Column, Integer, String, ForeignKey, Date, Enum, Boolean, Float
 from sqlalchemy.orm import relationship
 
@@ -89,3 +89,9 @@ class Smart3SeqGenomics(Genomics):
     # Object-relational mapping details:
     __mapper_args__ = {'polymorphic_identity': 'smart3SeqGenomics'}
     __tablename__ = 'smart3SeqGenomics'
+
+
+# Indexes
+# -------
+
+declareIndexes(Genomics)
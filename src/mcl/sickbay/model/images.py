@@ -7,7 +7,7 @@ Characterization of Screen-Detected Lesions.
 Images of the data model.
 '''
 
-from .base import Base, LabCASMetadata
+from .base import Base, LabCASMetadata, declareIndexes
 from sqlalchemy import Column, Integer, String, ForeignKey, Sequence
 from sqlalchemy.orm import relationship
 
@@ -41,3 +41,9 @@ class Imaging(Base, LabCASMetadata):
 
     # Object-relational details:
     __tablename__ = 'images'
+
+
+# Indexes
+# -------
+
+declareIndexes(Imaging)
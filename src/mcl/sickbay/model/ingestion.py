@@ -0,0 +1,77 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Ingestion bookkeeping of the data model.
+'''
+
+from .base import Base
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Index, Integer, Sequence, String
+import datetime
+
+
+# Database
+# ========
+
+class IngestionBatch(Base):
+    '''📒 Journal entry for a batch of a file that a load committed, written in the same transaction as
+    the batch's rows, so a load that dies partway can pick up after the last one.
+    '''
+
+    # Primary key, an auto-sequenced ID number:
+    identifier = Column(Integer, Sequence('ingestion_batch_id_seq'), primary_key=True)
+
+    # Which file, and which version of it (its size and modification time), since a changed file has
+    # to start over:
+    path      = Column(String(2000), nullable=False)
+    signature = Column(String(64), nullable=False)
+
+    # Where the batch was in the file:
+    batch     = Column(Integer, nullable=False)     # Counting from 1 in each file
+    firstLine = Column(Integer, nullable=False)
+    lastLine  = Column(Integer, nullable=False)
+    offset    = Column(BigInteger, nullable=False)  # Byte offset of the rest of the file after this batch
+    rows      = Column(Integer, nullable=False)
+
+    # Status:
+    finished  = Column(Boolean, nullable=False, default=False)  # True once the whole file's loaded
+    committed = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    # Methods:
+    def __repr__(self):
+        return f'<{self.__class__.__name__}(path={self.path}, batch={self.batch})>'
+
+    # Object-relational details:
+    __tablename__ = 'ingestionBatches'
+
+
+class LabCASFile(Base):
+    '''🗂 Manifest entry for a LabCAS DATA file that's been loaded, with its size and a hash of its content,
+    so a reload of a whole directory can skip the files that haven't changed.
+    '''
+
+    # Primary key, the file's name, which LabCAS makes unique (the directory it's in may move):
+    fileName = Column(String(255), primary_key=True)
+
+    # Where we last loaded it from and what was in it:
+    path        = Column(String(2000), nullable=False)
+    size        = Column(BigInteger, nullable=False)
+    contentHash = Column(String(64), nullable=False)
+
+    # When:
+    loaded = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    # Methods:
+    def __repr__(self):
+        return f'<{self.__class__.__name__}(fileName={self.fileName})>'
+
+    # Object-relational details:
+    __tablename__ = 'labcasFiles'
+
+
+# Indexes
+# -------
+
+Index('ix_ingestionBatches_path', IngestionBatch.path, IngestionBatch.batch)
@@ -7,7 +7,7 @@ Characterization of Screen-Detected Lesions.
 Organs of the data model.
 '''
 
-from .base import Base, LabCASMetadata
+from .base import Base, LabCASMetadata, declareIndexes
 from sqlalchemy import Column, Integer, String, ForeignKey, Enum, Sequence, Float
 from sqlalchemy.orm import relationship
 
@@ -357,3 +357,10 @@ Organ.histopathology_precancer_types = relationship(
     order_by=HistopathologyPrecancerType.identifier,
     back_populates='organ'
 )
+
+
+# Indexes
+# -------
+
+declareIndexes(Organ)
+declareIndexes(HistopathologyPrecancerType)
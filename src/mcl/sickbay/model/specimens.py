@@ -7,7 +7,7 @@ Characterization of Screen-Detected Lesions.
 Biological specimens of the data model.
 '''
 
-from .base import Base, LabCASMetadata
+from .base import Base, LabCASMetadata, declareIndexes
 from .enums import (
     Specimen, AnatomicalSite, TumorTissue, Laterality, Precancers, RulesOfAcquisition, Preserves, Fixatives,
     Analytes, Storage, SlideCharges, Packaging, Destinations
@@ -115,3 +115,10 @@ Biospecimen.adjacent_specimens = relationship(
 
 Biospecimen.genomics = relationship('Genomics', order_by=Genomics.specimen_ID, back_populates='biospecimen')
 Biospecimen.images   = relationship('Imaging',  order_by=Imaging.identifier,   back_populates='biospecimen')
+
+
+# Indexes
+# -------
+
+declareIndexes(Biospecimen)
+declareIndexes(AdjacentSpecimen)
@@ -0,0 +1,159 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+PostgreSQL-side JSON. Rather than lazily load each relationship of each participant and serialize it
+in Python, the query builder here makes a single SQL statement per batch that uses
+``jsonb_build_object`` and ``jsonb_agg`` to assemble complete documents inside PostgreSQL, right next
+to the data. The documents follow the same plans as the encoders in ``mcl.sickbay.json``, so they
+have the same shape: the same class tags, keys, ``label``/``token`` enumerations, and omitted
+``None`` values. However, since they're built as ``jsonb`` their keys come back in PostgreSQL's
+order rather than ours, and whole-number floats come back as ints.
+'''
+
+from .json import PLANS
+from .model import ClinicalCore
+from sqlalchemy import Integer, and_, bindparam, case, cast, extract, func, literal, select, true
+from sqlalchemy.dialects.postgresql import JSONB, aggregate_order_by
+
+
+DEFAULT_CHUNK_SIZE = 500  # How many documents to build per statement
+
+_maxPairs = 50  # PostgreSQL functions take at most 100 arguments, so at most 50 key/value pairs
+_queries = {}  # Cache of (first, next) statements, keyed by mapped class
+
+
+def _aliased(mapper):
+    '''Alias every table ``mapper`` needs: the tables it inherits from, inner joined, plus the tables
+    of its polymorphic subclasses, left outer joined. Return a dict mapping each table to its alias, and
+    the from clause joining them.
+    '''
+    aliases, fromClause = {}, None
+    for m in reversed(list(mapper.iterate_to_root())):
+        alias = aliases[m.local_table] = m.local_table.alias()
+        fromClause = alias if fromClause is None else fromClause.join(alias, _inheritance(m, aliases))
+    for m in mapper.self_and_descendants:
+        if m is not mapper and m.local_table not in aliases:
+            aliases[m.local_table] = m.local_table.alias()
+            fromClause = fromClause.outerjoin(aliases[m.local_table], _inheritance(m, aliases))
+    return aliases, fromClause
+
+
+def _inheritance(mapper, aliases):
+    '''Make the condition that joins the aliased table of ``mapper`` to that of the mapper it inherits'''
+    parent, child = aliases[mapper.inherits.local_table], aliases[mapper.local_table]
+    return and_(*(
+        parent.c[p.key] == child.c[c.key]
+        for p, c in zip(mapper.inherits.local_table.primary_key, mapper.local_table.primary_key)
+    ))
+
+
+def _column(cls, name, aliases):
+    '''Find the aliased column for the attribute ``name`` of the mapped class ``cls``'''
+    column = cls.__mapper__.columns[name]
+    return aliases[column.table].c[column.key]
+
+
+def _enumeration(column, enumClass):
+    '''Make the ``label``/``token`` object for an enumerated ``column``. PostgreSQL stores the member's
+    name (the token), so we look up the label with a ``CASE``.
+    '''
+    labels = case([(column == literal(m.name), literal(m.value)) for m in enumClass])
+    return case([(column.is_(None), None)], else_=func.jsonb_build_object('label', labels, 'token', column))
+
+
+def _pairs(cls, aliases):
+    '''Generate the key/value pairs of the document for the mapped class ``cls`` by following its plan'''
+    mapper = cls.__mapper__
+    for step in PLANS[cls]:
+        if step.kind == 'required':
+            for name in step.names:
+                yield name, _column(cls, name, aliases)
+        elif step.kind == 'optional':
+            for name in step.names:
+                column = _column(cls, name, aliases)
+                enumClass = getattr(mapper.columns[name].type, 'enum_class', None)
+                yield name, column if enumClass is None else _enumeration(column, enumClass)
+        elif step.kind == 'date':
+            for name in step.names:
+                when = _column(cls, name, aliases)
+                parts = (cast(extract(part, when), Integer) for part in ('year', 'month', 'day'))
+                yield name, func.jsonb_build_array(*parts)
+        elif step.kind in ('listing', 'nested'):
+            yield step.relationship, _aggregate(mapper.relationships[step.relationship], step, aliases)
+        else:
+            raise ValueError(f'Unknown kind of step {step.kind} for {cls.__name__}')
+
+
+def _object(cls, aliases):
+    '''Build the ``jsonb`` object for an instance of ``cls``, starting with its class tag and going in
+    groups of key/value pairs to stay under PostgreSQL's limit on function arguments.
+    '''
+    document = func.jsonb_build_object(f'__{cls.__module__}.{cls.__name__}__', true(), type_=JSONB)
+    pairs = list(_pairs(cls, aliases))
+    for start in range(0, len(pairs), _maxPairs):
+        args = [arg for pair in pairs[start:start + _maxPairs] for arg in pair]
+        document = document.op('||')(func.jsonb_build_object(*args, type_=JSONB))
+    return document
+
+
+def _document(mapper, aliases):
+    '''Build the ``jsonb`` document for a row of ``mapper``, picking the right polymorphic subclass'''
+    subclasses = [m for m in mapper.self_and_descendants if m is not mapper]
+    if not subclasses:
+        return _object(mapper.class_, aliases)
+    discriminator = aliases[mapper.polymorphic_on.table].c[mapper.polymorphic_on.key]
+    return case(
+        [(discriminator == m.polymorphic_identity, _object(m.class_, aliases)) for m in subclasses],
+        else_=_object(mapper.class_, aliases)
+    )
+
+
+def _aggregate(prop, step, parentAliases):
+    '''Make the correlated subquery that aggregates the 1-to-many relationship ``prop`` into an array,
+    either of whole documents or, for listings, of the single column named by the step's ``path``
+    '''
+    aliases, fromClause = _aliased(prop.mapper)
+    (parentColumn, childColumn), = prop.local_remote_pairs
+    if step.kind == 'nested':
+        item = _document(prop.mapper, aliases)
+    else:
+        item = _column(prop.mapper.class_, step.path.split('.')[0], aliases)
+    order = [aliases[column.table].c[column.key] for column in prop.order_by or ()]
+    return select([func.jsonb_agg(aggregate_order_by(item, *order) if order else item)]).select_from(
+        fromClause
+    ).where(
+        aliases[childColumn.table].c[childColumn.key] == parentAliases[parentColumn.table].c[parentColumn.key]
+    ).as_scalar()
+
+
+def documentQueries(cls=ClinicalCore, chunkSize=DEFAULT_CHUNK_SIZE):
+    '''Make the SQL statements that build the documents for ``chunkSize`` instances of the mapped class
+    ``cls`` at a time (by default, whole participant trees). Each statement returns rows of the primary
+    key and the document, ordered by primary key. Return a pair: the statement for the first chunk,
+    and the statement for the next chunks, which needs the last primary key seen as ``after``.
+    '''
+    mapper = cls.__mapper__
+    aliases, fromClause = _aliased(mapper)
+    key = aliases[mapper.primary_key[0].table].c[mapper.primary_key[0].key]
+    document = func.jsonb_strip_nulls(_document(mapper, aliases), type_=JSONB)
+    first = select([key, document]).select_from(fromClause).order_by(key).limit(chunkSize)
+    return first, first.where(key > bindparam('after'))
+
+
+def iterDocuments(connection, cls=ClinicalCore, chunkSize=DEFAULT_CHUNK_SIZE):
+    '''Yield a document for every instance of the mapped class ``cls`` (by default, whole participant
+    trees) ordered by primary key, using one round-trip to PostgreSQL per ``chunkSize`` documents. The
+    ``connection`` can be an engine, a connection, or a session.
+    '''
+    queries = _queries.get((cls, chunkSize))
+    if queries is None:
+        queries = _queries[(cls, chunkSize)] = documentQueries(cls, chunkSize)
+    first, following = queries
+    result = connection.execute(first).fetchall()
+    while result:
+        for key, document in result:
+            yield document
+        result = connection.execute(following, {'after': key}).fetchall()
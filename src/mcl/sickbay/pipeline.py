@@ -0,0 +1,175 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Ingestion pipeline. Adding a whole submission to one session before committing, as ``addSampleData``
+does, grows the session's identity map with every object and runs out of memory on big files. The
+pipeline here instead chains generator stages—read, parse, validate, make objects, write—so only one
+batch of ORM objects exists at a time: each batch is committed and then expunged from the session
+before the next is read. Every stage takes and gives an iterator, so you can swap in or add your own.
+
+Only the records themselves become ORM objects. Their ``|``-separated lists (prior lesions, races,
+adjacent specimens, and so on) are expanded for a whole batch at once after the records are flushed,
+with keys reserved in blocks, and go in with one ``COPY`` (or multi-row insert) per child table.
+
+Use this when you want ORM objects (and their events); ``mcl.sickbay.labcas.loadDataFile`` is quicker
+when you don't.
+'''
+
+from .journal import Journal
+from .labcas import Layout, classForFile, copyRows, dataReader, expandLists, fileMetadata
+from .validation import validateBatch
+
+
+DEFAULT_BATCH_SIZE = 1000  # How many records to commit at a time
+
+
+class Parsed(object):
+    '''A record of a DATA file after parsing: the ``lineNumber`` it came from, a dict of attribute
+    ``values``, and ``lists``, a sequence of (child, items) pairs for its ``|``-separated lists.
+    '''
+    __slots__ = ('lineNumber', 'values', 'lists')
+    def __init__(self, lineNumber, values, lists):
+        self.lineNumber, self.values, self.lists = lineNumber, values, lists
+
+
+# Stages
+# ======
+
+def readRecords(reader, base=0):
+    '''Yield (line number, cells) for every row from the CSV ``reader`` that isn't blank, adding ``base`` to
+    the reader's line numbers (for when it starts partway into a file).
+    '''
+    for cells in reader:
+        if any(cell.strip() for cell in cells):
+            yield reader.line_num + base, cells
+
+
+def parseRecords(records, layout):
+    '''Turn each (line number, cells) in ``records`` into a ``Parsed`` record according to the
+    ``layout``, converting cells to numbers, dates, enumeration members, and so on.
+    '''
+    for lineNumber, cells in records:
+        values = dict(layout.metadata)
+        try:
+            for index, key, convert in layout.fields:
+                text = cells[index] if index < len(cells) else ''
+                values[key] = convert(text) if text.strip() else layout.metadata.get(key)
+            lists = []
+            for child in layout.children:
+                text = cells[child.index] if child.index < len(cells) else ''
+                lists.append((child, [child.convert(item) for item in text.split('|') if item.strip()]))
+        except ValueError as ex:
+            raise ValueError(f'Line {lineNumber}: {ex}') from ex
+        yield Parsed(lineNumber, values, lists)
+
+
+def validateRecords(parsed, cls, batchSize=DEFAULT_BATCH_SIZE):
+    '''Check the ``Parsed`` records against the columns of ``cls`` (see ``mcl.sickbay.validation``) a
+    batch of ``batchSize`` at a time, raising a ``ValueError`` that lists every problem in the first batch
+    that has any, and yield the records of each batch that has none.
+    '''
+    for batch in batched(parsed, batchSize):
+        validateBatch(cls, [record.values for record in batch], [record.lineNumber for record in batch], [
+            (child.cls, child.attribute, [record.lists[position][1] for record in batch])
+            for position, (child, items) in enumerate(batch[0].lists)
+        ])
+        yield from batch
+
+
+def makeObjects(parsed, cls):
+    '''Make an instance of ``cls`` for each ``Parsed`` record and yield it along with the record, whose
+    lists ``writeBatches`` turns into child rows.
+    '''
+    for record in parsed:
+        yield cls(**record.values), record
+
+
+def batched(objects, batchSize=DEFAULT_BATCH_SIZE):
+    '''Gather ``objects`` into lists of ``batchSize`` and yield each'''
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batchSize:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def writeBatches(session, batches, journal=None):
+    '''Add each batch of (object, ``Parsed`` record) pairs to the ``session`` and flush it, then insert the
+    child rows from all of the records' lists in bulk (see ``mcl.sickbay.labcas.expandLists``), commit,
+    and expunge everything so the next batch starts with an empty identity map. Yield how many objects
+    were in each batch.
+
+    With a ``mcl.sickbay.journal.Journal``, each batch is journaled in its transaction. The journal's file
+    must be positioned at the end of each batch when it's written, so earlier stages mustn't read ahead
+    of the batches (``validateRecords`` with the same batch size doesn't).
+    '''
+    for batch in batches:
+        session.add_all(obj for obj, record in batch)
+        session.flush()
+        children = [child for child, items in batch[0][1].lists]
+        if children:
+            parentKeys = {child.parentKey for child in children}
+            parents = [
+                ({key: getattr(obj, key) for key in parentKeys}, [items for child, items in record.lists])
+                for obj, record in batch
+            ]
+            connection = session.connection()
+            expandLists(connection, children, parents)
+            for child in children:
+                if child.target.rows:
+                    copyRows(connection, child.target)
+                    child.target.rows.clear()
+        if journal is not None:
+            journal.record(session.connection(), batch[0][1].lineNumber, batch[-1][1].lineNumber, len(batch))
+        session.commit()
+        session.expunge_all()
+        yield len(batch)
+
+
+# Ingestion
+# =========
+
+def ingestDataFile(
+    session, path, cls=None, labcasID=None, batchSize=DEFAULT_BATCH_SIZE, journal=False, **metadata
+):
+    '''Ingest the LabCAS DATA file at ``path`` through the ORM into ``session``, committing every
+    ``batchSize`` records so memory stays flat however large the file. The class, ``labcasID``, and
+    ``metadata`` are as for ``mcl.sickbay.labcas.loadDataFile``. Since each batch is committed on its
+    own, a bad line stops the ingestion with earlier batches already in the database; set ``journal`` to
+    record each batch in the ``ingestionBatches`` journal so ingesting the file again picks up after the
+    last batch committed; if the file has changed since, this raises ``ValueError`` rather than add to the
+    earlier version's records. Return how many records we ingested.
+    '''
+    cls = cls or classForFile(path)
+    if cls is None:
+        raise ValueError(f'Cannot tell what kind of data is in {path}; please give the mapped class')
+    with open(path, 'r', encoding='utf-8-sig', newline='') as fp:
+        reader = dataReader(fp)
+        header = next(reader, None)
+        if header is None:
+            return 0
+        layout = Layout(cls, header, fileMetadata(path, labcasID, metadata), tokens=False)
+        log, base = None, 0
+        if journal:
+            log = Journal(session.connection(), path)
+            if log.stale:
+                raise ValueError(f'{path} has changed since it was ingested before; forget its records first')
+            if log.finished:
+                session.commit()
+                return 0
+            base = log.resume(fp, reader.line_num)
+        records = readRecords(reader, base)
+        parsed = parseRecords(records, layout)
+        valid = validateRecords(parsed, cls, batchSize)
+        objects = makeObjects(valid, cls)
+        count = sum(writeBatches(session, batched(objects, batchSize), log))
+        if log is not None:
+            log.finish(session.connection())
+            session.commit()
+        return count
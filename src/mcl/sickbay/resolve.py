@@ -0,0 +1,131 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Resolving detached records. Data often arrive before whatever they belong to: an organ file naming a
+participant who's not in the database yet, say. Such rows keep their parent's ID in an ``inscribed_…``
+column (https://github.com/MCLConsortium/mcl.sickbay/issues/3) and leave the foreign key empty. The
+resolver here attaches every such pending row whose parent now exists with one ``UPDATE … FROM``
+statement per foreign key, rather than loading and linking objects one at a time, and reports the
+orphans—pending rows whose parents still haven't turned up.
+'''
+
+from . import VERSION
+from .connection import addConnectionArguments, engineFromArguments
+from .indexes import createIndexes
+from .model import Base
+from .model.base import inscriptions
+from sqlalchemy import and_, exists, select
+import argparse
+
+
+_description = '''Associate detached Sickbay records with the participants and specimens named by their
+inscribed IDs, and report any whose participants or specimens aren't in the database yet.
+'''
+
+__version__ = VERSION
+
+_associations = None  # Cache of (table, inscribed column, foreign key column, parent column) tuples
+
+
+def associations():
+    '''Return a sequence of every (table, inscribed column, foreign key column, parent key column) in
+    the Sickbay model, such as ``organs.inscribed_clinicalCore_participant_ID`` going into
+    ``organs.clinicalCore_participant_ID`` which refers to ``clinicalCores.participant_ID``.
+    '''
+    global _associations
+    if _associations is None:
+        _associations = tuple(
+            (table, inscribed, reference, next(iter(reference.foreign_keys)).column)
+            for table in Base.metadata.sorted_tables
+            for inscribed, reference in inscriptions(table)
+        )
+    return _associations
+
+
+def _name(table, reference):
+    return f'{table.name}.{reference.key}'
+
+
+def _pending(inscribed, reference):
+    '''Make the condition for rows waiting to be associated: they have an inscribed ID but no foreign key'''
+    return and_(reference.is_(None), inscribed.isnot(None))
+
+
+def resolveStatement(table, inscribed, reference, parent, dialect):
+    '''Make the statement that sets ``reference`` from ``inscribed`` on every pending row of ``table``
+    whose ``parent`` exists. PostgreSQL gets ``UPDATE … FROM`` joined to the parent table; other
+    databases, which may not support that, get a correlated ``EXISTS`` instead.
+    '''
+    statement = table.update().values({reference.key: inscribed}).where(_pending(inscribed, reference))
+    if dialect.name == 'postgresql':
+        return statement.where(parent == inscribed)
+    return statement.where(exists(select([parent]).where(parent == inscribed)))
+
+
+def resolve(bind, tables=None):
+    '''Associate every detached row that's waiting for a parent already in the database reached by
+    ``bind``, an engine or connection, all in one transaction. Limit it to the named ``tables`` if given.
+    Return a dict of how many rows were associated, keyed by ``table.foreignKey``.
+    '''
+    counts = {}
+    with bind.connect() as connection, connection.begin():
+        for table, inscribed, reference, parent in associations():
+            if tables is None or table.name in tables:
+                statement = resolveStatement(table, inscribed, reference, parent, connection.dialect)
+                counts[_name(table, reference)] = connection.execute(statement).rowcount
+    return counts
+
+
+def orphans(bind, tables=None):
+    '''Find the detached rows whose parents aren't in the database reached by ``bind`` yet. Limit it to
+    the named ``tables`` if given. Return a dict keyed by ``table.foreignKey`` of the sorted distinct
+    inscribed IDs that named no one, leaving out foreign keys with no orphans.
+    '''
+    found = {}
+    with bind.connect() as connection:
+        for table, inscribed, reference, parent in associations():
+            if tables is not None and table.name not in tables:
+                continue
+            query = select([inscribed]).distinct().where(_pending(inscribed, reference)).where(
+                ~exists(select([parent]).where(parent == inscribed))
+            ).order_by(inscribed)
+            missing = [row[0] for row in connection.execute(query)]
+            if missing:
+                found[_name(table, reference)] = missing
+    return found
+
+
+def main():
+    '''Command-line entrypoint: associates detached records and reports orphans'''
+    parser = argparse.ArgumentParser(description=_description)
+    parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+    addConnectionArguments(parser)
+    parser.add_argument(
+        '-i', '--indexes', action='store_true', default=False,
+        help="Create any indexes the database doesn't have yet first (%(default)s)"
+    )
+    parser.add_argument(
+        '-o', '--orphans-only', action='store_true', default=False,
+        help="Just report orphans; don't associate anything (%(default)s)"
+    )
+    parser.add_argument('tables', nargs='*', metavar='TABLE', help='Tables to resolve; all of them by default')
+    args = parser.parse_args()
+
+    engine = engineFromArguments(args)
+    tables = set(args.tables) if args.tables else None
+    if args.indexes:
+        for name in createIndexes(engine):
+            print(f'Created index {name}')
+    if not args.orphans_only:
+        for name, count in resolve(engine, tables).items():
+            if count:
+                print(f'{name}: associated {count}')
+    for name, missing in orphans(engine, tables).items():
+        print(f'{name}: {len(missing)} orphaned IDs: {", ".join(missing)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Row-level serialization. For read-only bulk export there's no need to build ORM objects at all:
+the functions here run plain column-only ``select()`` statements against the tables and assemble the
+very same JSON documents as the encoders in ``mcl.sickbay.json`` straight from the result rows. That
+skips the identity map, attribute instrumentation, and lazy loading of relationships one object at a
+time; instead each relationship is fetched for a whole chunk of rows with a single query per table.
+'''
+
+from .json import PLANS, RESTORABLE_PLANS
+from .model import ClinicalCore
+from sqlalchemy import and_, select
+
+
+DEFAULT_CHUNK_SIZE = 500  # How many top-level rows to fetch per query
+
+_serializers = {}  # Cache of row serializers, keyed by mapped class and whether they're restorable
+_selectables = {}  # Cache of (columns, from clause) pairs, keyed by mapper
+
+
+def _selectable(mapper):
+    '''Return the columns and the from clause needed to select rows for ``mapper``, including the columns
+    of all the tables it inherits from. Columns are de-duplicated by key so that the primary key shared
+    by a joined-inheritance subclass and its base appears only once.
+    '''
+    selectable = _selectables.get(mapper)
+    if selectable is None:
+        columns = {}
+        for m in reversed(list(mapper.iterate_to_root())):
+            for column in m.local_table.c:
+                columns.setdefault(column.key, column)
+        selectable = _selectables[mapper] = (list(columns.values()), mapper.persist_selectable)
+    return selectable
+
+
+def _rowSerializer(cls, restorable=False):
+    '''Make a function that serializes a result row for the mapped class ``cls`` following the same plan
+    as ``SERIALIZERS[cls]`` (or with ``restorable``, ``RESTORABLE_SERIALIZERS[cls]``). Since rows don't
+    have relationships, the function takes a dict of those, already serialized, keyed by relationship
+    name. Return the function and the relationship steps.
+    '''
+    serializer = _serializers.get((cls, restorable))
+    if serializer is None:
+        tag = f'__{cls.__module__}.{cls.__name__}__'
+        plans = RESTORABLE_PLANS if restorable else PLANS
+        plan = tuple((step, getattr(step, 'relationship', None)) for step in plans[cls])
+        def serialize(row, related):
+            d = {tag: True}
+            for step, relationship in plan:
+                if relationship is None:
+                    step(row, d)
+                else:
+                    items = related.get(relationship)
+                    if items:
+                        d[relationship] = items
+            return d
+        steps = tuple(step for step, relationship in plan if relationship is not None)
+        serializer = _serializers[(cls, restorable)] = (serialize, steps)
+    return serializer
+
+
+def _fetch(connection, mapper, condition, orderBy, limit=None):
+    '''Fetch rows for ``mapper`` and all of its polymorphic subclasses that match ``condition``, returning
+    ``(class, row)`` pairs ordered by the ``orderBy`` columns. Each subclass gets its own query so each
+    row has exactly that subclass's columns and there are no name clashes between sibling tables. With
+    subclasses, a first query of the table they share picks which rows come in what order, so the ordering
+    (and any ``limit``) is the database's, collation and all, just as for a single class.
+    '''
+    mappers = list(mapper.self_and_descendants)
+    if len(mappers) == 1:
+        columns, selectable = _selectable(mapper)
+        query = select(columns).select_from(selectable).where(condition).order_by(*orderBy)
+        if mapper.inherits is not None:
+            query = query.where(mapper.polymorphic_on == mapper.polymorphic_identity)
+        if limit is not None:
+            query = query.limit(limit)
+        return [(mapper.class_, row) for row in connection.execute(query)]
+
+    key = mapper.primary_key[0]
+    query = select([key, mapper.polymorphic_on]).select_from(mapper.persist_selectable).where(condition)
+    query = query.order_by(*orderBy, *(() if any(c is key for c in orderBy) else (key,)))
+    if limit is not None:
+        query = query.limit(limit)
+    positions, byIdentity = {}, {}
+    for position, (value, identity) in enumerate(connection.execute(query)):
+        positions[value] = position
+        byIdentity.setdefault(identity, []).append(value)
+    pairs = []
+    for identity, values in byIdentity.items():
+        m = mapper.polymorphic_map.get(identity, mapper)
+        columns, selectable = _selectable(m)
+        query = select(columns).select_from(selectable).where(key.in_(values))
+        pairs.extend((m.class_, row) for row in connection.execute(query))
+    pairs.sort(key=lambda pair: positions[getattr(pair[1], key.key)])
+    return pairs
+
+
+def _serialize(connection, pairs, restorable=False):
+    '''Turn ``(class, row)`` pairs into documents, ``restorable`` ones if asked. Relationships are fetched
+    with one query per relationship (and subclass) for all of the rows at once, then recursively
+    serialized themselves.
+    '''
+    related = [{} for i in pairs]
+    byRelationship = {}
+    for index, (cls, row) in enumerate(pairs):
+        for step in _rowSerializer(cls, restorable)[1]:
+            prop = cls.__mapper__.relationships[step.relationship]
+            byRelationship.setdefault(prop, (step, []))[1].append(index)
+
+    for prop, (step, indexes) in byRelationship.items():
+        (parentColumn, childColumn), = prop.local_remote_pairs
+        parentKey, childKey = parentColumn.key, childColumn.key
+        keys = {getattr(pairs[i][1], parentKey) for i in indexes}
+        keys.discard(None)
+        if not keys:
+            continue
+        children = _fetch(connection, prop.mapper, childColumn.in_(keys), prop.order_by or ())
+        if step.item is None:
+            items = _serialize(connection, children, restorable)
+        else:
+            items = [step.item(row) for cls, row in children]
+        buckets = {}
+        for (cls, row), item in zip(children, items):
+            buckets.setdefault(getattr(row, childKey), []).append(item)
+        for i in indexes:
+            bucket = buckets.get(getattr(pairs[i][1], parentKey))
+            if bucket:
+                related[i][step.relationship] = bucket
+
+    return [_rowSerializer(cls, restorable)[0](row, r) for (cls, row), r in zip(pairs, related)]
+
+
+def iterDocuments(
+    connection, cls=ClinicalCore, chunkSize=DEFAULT_CHUNK_SIZE, after=None, through=None, restorable=False
+):
+    '''Yield a document (a plain dict) for every instance of the mapped class ``cls`` (by default, whole
+    participant trees), ordered by primary key. Each document is the same as ``SERIALIZERS`` (or with
+    ``restorable``, ``RESTORABLE_SERIALIZERS``) makes from the ORM object, but we get there from plain
+    result rows, ``chunkSize`` top-level rows at a time. The ``connection`` can be an engine, a
+    connection, or a session. To get just a range of primary keys, give the key to start ``after`` and
+    the key to go ``through``.
+    '''
+    mapper = cls.__mapper__
+    key = mapper.primary_key[0]
+    last = after
+    while True:
+        condition = key > last if last is not None else key.isnot(None)
+        if through is not None:
+            condition = and_(condition, key <= through)
+        pairs = _fetch(connection, mapper, condition, (key,), chunkSize)
+        if not pairs:
+            return
+        last = getattr(pairs[-1][1], key.key)
+        yield from _serialize(connection, pairs, restorable)
+        del pairs
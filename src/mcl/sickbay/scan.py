@@ -0,0 +1,84 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Table scans. ``session.query(cls)`` fetches every row and makes every object before you see the first,
+so walking a big table that way takes memory in proportion to the table. The iterators here walk any
+mapped class at constant memory instead, in one of two ways (see ``SCAN_MODES``):
+
+• ``keyset`` pages by primary key (``participant_ID``, ``specimen_ID``, ``identifier``, and so on): each
+  page is a fresh query for the next ``chunkSize`` keys after the last one seen, so it's just as quick
+  deep into the table as at the start, and no cursor or transaction stays open between pages
+• ``stream`` runs a single query and reads it through a server-side cursor (a named cursor on
+  PostgreSQL), making ``chunkSize`` objects at a time with ``yield_per``; it's one query rather than
+  many, but holds a transaction open for the whole walk
+
+Both take ``filters``, SQL expressions that rows must match, and loader ``options`` for each query.
+'''
+
+from sqlalchemy import and_
+
+
+DEFAULT_CHUNK_SIZE = 500  # How many objects to fetch per query
+
+SCAN_MODES = ('keyset', 'stream')
+
+
+def _key(cls):
+    '''Return the primary key column of the mapped class ``cls`` and the name of its attribute'''
+    key = cls.__mapper__.primary_key[0]
+    return key, cls.__mapper__.get_property_by_column(key).key
+
+
+def iterObjects(
+    session, cls, chunkSize=DEFAULT_CHUNK_SIZE, after=None, through=None, options=(), filters=()
+):
+    '''Yield every instance of the mapped class ``cls`` in ``session`` ordered by primary key, fetching
+    ``chunkSize`` of them per query. We page by primary key rather than ``OFFSET`` so each query is just
+    as fast deep into the table as it is at the start. The session's identity map holds objects weakly,
+    so once we're done with a chunk its objects are free to be garbage collected. To get just a range of
+    primary keys, give the key to start ``after`` and the key to go ``through``. Any loader ``options``
+    apply to each chunk's query, and only instances matching all the ``filters`` are yielded.
+    '''
+    key, name = _key(cls)
+    last = after
+    while True:
+        query = session.query(cls).options(*options).order_by(key)
+        if filters:
+            query = query.filter(and_(*filters))
+        if last is not None:
+            query = query.filter(key > last)
+        if through is not None:
+            query = query.filter(key <= through)
+        chunk = query.limit(chunkSize).all()
+        if not chunk:
+            return
+        last = getattr(chunk[-1], name)
+        yield from chunk
+        del chunk
+
+
+def streamObjects(session, cls, chunkSize=DEFAULT_CHUNK_SIZE, options=(), filters=()):
+    '''Yield every instance of the mapped class ``cls`` in ``session`` that matches all the ``filters``,
+    ordered by primary key, from a single query read through a server-side cursor ``chunkSize`` rows at
+    a time. Any loader ``options`` apply to the query; ``selectinload`` ones run once per chunk. The
+    cursor stays open until the generator is exhausted or closed.
+    '''
+    query = session.query(cls).options(*options).order_by(_key(cls)[0])
+    if filters:
+        query = query.filter(and_(*filters))
+    yield from query.execution_options(stream_results=True).yield_per(chunkSize)
+
+
+def scanObjects(session, cls, mode=SCAN_MODES[0], chunkSize=DEFAULT_CHUNK_SIZE, options=(), filters=()):
+    '''Yield every instance of the mapped class ``cls`` in ``session`` that matches all the ``filters``,
+    ordered by primary key, at constant memory, scanning the table with ``mode``, one of
+    ``SCAN_MODES``. Any loader ``options`` apply to each query.
+    '''
+    if mode == 'keyset':
+        return iterObjects(session, cls, chunkSize, options=options, filters=filters)
+    elif mode == 'stream':
+        return streamObjects(session, cls, chunkSize, options, filters)
+    raise ValueError(f'Unknown scan mode "{mode}"; choose from {", ".join(SCAN_MODES)}')
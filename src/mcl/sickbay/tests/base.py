@@ -0,0 +1,50 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Test fixtures shared by the test modules. Tests of PostgreSQL-only features run only if the
+``SICKBAY_TEST_POSTGRESQL`` environment variable gives the URL of a scratch PostgreSQL database; they
+drop and re-create the Sickbay tables there.
+'''
+
+from mcl.sickbay.db import addSampleData, addTestData
+from mcl.sickbay.model import Base, createMetadata
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import os, unittest
+
+
+POSTGRESQL_URL = os.environ.get('SICKBAY_TEST_POSTGRESQL')
+
+# Decorator for tests that need PostgreSQL
+needsPostgreSQL = unittest.skipUnless(POSTGRESQL_URL, 'SICKBAY_TEST_POSTGRESQL is not set')
+
+
+def memoryDatabase(populate=True, url='sqlite://'):
+    '''Make an in-memory SQLite database (or whatever database ``url`` names), with the sample and test
+    data in it if ``populate`` is true, and return its engine and a session on it.
+    '''
+    engine = create_engine(url)
+    createMetadata(engine)
+    session = sessionmaker(bind=engine)()
+    if populate:
+        addSampleData(session)
+        addTestData(session)
+    return engine, session
+
+
+def postgresqlDatabase(populate=True):
+    '''Empty the scratch PostgreSQL database at ``POSTGRESQL_URL`` and set it up like ``memoryDatabase``'''
+    Base.metadata.drop_all(create_engine(POSTGRESQL_URL))
+    return memoryDatabase(populate, POSTGRESQL_URL)
+
+
+class DatabaseTestCase(unittest.TestCase):
+    '''A test case with an in-memory database of the sample and test data in ``engine`` and ``session``'''
+    def setUp(self):
+        self.engine, self.session = memoryDatabase()
+
+    def tearDown(self):
+        self.session.close()
@@ -0,0 +1,124 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of the cache of encoded participant documents.
+'''
+
+from .base import DatabaseTestCase
+from mcl.sickbay.cache import DocumentCache, participantsOf
+from mcl.sickbay.json import ClinicalCoreEncoder
+from mcl.sickbay.model import Biospecimen, ClinicalCore, Genomics, Organ
+from sqlalchemy import event
+import json, unittest
+
+
+class LRUTest(unittest.TestCase):
+    '''The cache as a plain least-recently-used mapping'''
+    def testEviction(self):
+        cache = DocumentCache(maxSize=2)
+        cache.put('a', '1')
+        cache.put('b', '2')
+        self.assertEqual(cache.get('a'), '1')
+        cache.put('c', '3')
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.misses, 1)
+
+    def testInvalidate(self):
+        cache = DocumentCache()
+        cache.put('a', '1')
+        cache.put('b', '2')
+        cache.invalidate(['a', 'z'])
+        self.assertNotIn('a', cache)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class InvalidationTest(DatabaseTestCase):
+    '''Flushing changes through the ORM evicts the documents they touch'''
+    def setUp(self):
+        super(InvalidationTest, self).setUp()
+        self.cache = DocumentCache()
+        self.cache.listen(self.session)
+        self.ids = [p.participant_ID for p in self.session.query(ClinicalCore)]
+        for participantID in self.ids:
+            self.cache.document(self.session, participantID)
+
+    def tearDown(self):
+        self.cache.unlisten()
+        super(InvalidationTest, self).tearDown()
+
+    def assertCached(self, *evicted):
+        self.assertEqual({i for i in self.ids if i not in self.cache}, set(evicted))
+
+    def testDocument(self):
+        participant = self.session.query(ClinicalCore).get('MCL78_001')
+        text = self.cache.document(self.session, 'MCL78_001')
+        self.assertEqual(text, json.dumps(participant, cls=ClinicalCoreEncoder))
+        self.assertGreater(self.cache.hits, 0)
+        self.assertIsNone(self.cache.document(self.session, 'nobody'))
+
+    def testParticipant(self):
+        self.session.query(ClinicalCore).get('MCL78_003').weight = 80.0
+        self.session.flush()
+        self.assertCached('MCL78_003')
+
+    def testNested(self):
+        self.session.query(Organ).get(3).fileName = 'corrected'
+        self.session.query(Genomics).get('MCL78_001_10002').rin = 7.0
+        self.session.commit()
+        self.assertCached('XYZ123_456', 'MCL78_001')
+
+    def testMove(self):
+        specimen = self.session.query(Biospecimen).get('MCL111_404_10001')
+        specimen.clinicalCore = self.session.query(ClinicalCore).get('MCL111_001')
+        self.session.flush()
+        self.assertCached('MCL111_404', 'MCL111_001')
+
+    def testParticipantsOf(self):
+        genomics = self.session.query(Genomics).get('XYZ123_456_13')
+        self.assertEqual(participantsOf(self.session, [genomics]), {'XYZ123_456'})
+
+    def testNoQueries(self):
+        genomics, specimens = self.session.query(Genomics).all(), self.session.query(Biospecimen).all()
+        self.assertEqual(self.statements(lambda: participantsOf(self.session, genomics)), 0)
+        self.assertTrue(specimens)  # Keep them in the identity map, which holds them only weakly
+
+    def testBatched(self):
+        self.session.expunge_all()
+        genomics = self.session.query(Genomics).all()
+        self.assertGreater(len({g.biospecimen_specimen_ID for g in genomics if g.biospecimen_specimen_ID}), 1)
+        found = set()
+        self.assertEqual(self.statements(lambda: participantsOf(self.session, genomics, found)), 1)
+        self.assertIn('MCL78_001', found)
+
+    def statements(self, call):
+        '''Return how many SQL statements ``call`` runs'''
+        statements = []
+
+        def count(*args):
+            statements.append(args[2])
+
+        event.listen(self.engine, 'before_cursor_execute', count)
+        try:
+            call()
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', count)
+        return len(statements)
+
+    def testRollback(self):
+        self.session.query(ClinicalCore).get('MCL78_003').weight = 80.0
+        self.session.flush()
+        self.cache.document(self.session, 'MCL78_003')
+        self.session.rollback()
+        self.assertIn('MCL78_003', self.cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of columnar export. These need the optional ``pyarrow`` package.
+'''
+
+from .base import DatabaseTestCase, memoryDatabase
+from mcl.sickbay.columnar import exportTables, iterBatches, tables, writeTable
+from sqlalchemy import select
+import enum, importlib.util, os.path, tempfile, unittest
+
+
+def _plain(value):
+    '''Turn a database value into what the columnar files hold for it'''
+    return value.name if isinstance(value, enum.Enum) else value
+
+
+@unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+class ColumnarTest(DatabaseTestCase):
+    '''Writing tables to Arrow and Parquet files and reading them back'''
+    def rows(self, table):
+        with self.engine.connect() as connection:
+            query = select(table.c).order_by(*table.primary_key)
+            return [{k: _plain(v) for k, v in row.items()} for row in connection.execute(query)]
+
+    def testBatches(self):
+        with self.engine.connect() as connection:
+            for name, table in tables().items():
+                batches = list(iterBatches(connection, table, 2))
+                self.assertTrue(all(b.num_rows <= 2 for b in batches), name)
+                self.assertEqual([row for b in batches for row in b.to_pylist()], self.rows(table), name)
+
+    def testFormats(self):
+        import pyarrow, pyarrow.parquet
+        readers = {
+            'parquet': lambda path: pyarrow.parquet.read_table(path),
+            'arrow': lambda path: pyarrow.ipc.open_file(path).read_all(),
+        }
+        with tempfile.TemporaryDirectory() as directory, self.engine.connect() as connection:
+            for format, read in readers.items():
+                for name, table in tables().items():
+                    path = os.path.join(directory, f'{name}.{format}')
+                    count = writeTable(connection, table, path, format, batchSize=3)
+                    self.assertEqual(read(path).to_pylist(), self.rows(table), f'{name} as {format}')
+                    self.assertEqual(count, len(self.rows(table)))
+            with self.assertRaises(ValueError):
+                writeTable(connection, tables()['organs'], os.path.join(directory, 'x'), 'csv')
+
+    def testExportTables(self):
+        with tempfile.TemporaryDirectory() as directory:
+            engine, session = memoryDatabase(url=f'sqlite:///{directory}/sickbay.db')
+            session.close()
+            output = os.path.join(directory, 'out')
+            counts = exportTables(engine, ['clinicalCores', 'organs'], output, 'arrow', jobs=2)
+            self.assertEqual(counts, {'clinicalCores': 5, 'organs': 7})
+            self.assertTrue(os.path.isfile(os.path.join(output, 'organs.arrow')))
+
+
+if __name__ == '__main__':
+    unittest.main()
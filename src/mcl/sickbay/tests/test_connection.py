@@ -0,0 +1,122 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of making, sharing, and configuring engines. Making a PostgreSQL engine doesn't connect, so most of
+these need no server.
+'''
+
+from .base import POSTGRESQL_URL, needsPostgreSQL
+from mcl.sickbay.connection import (
+    addConnectionArguments,
+    engineFromArguments,
+    engineSettings,
+    makeEngine,
+    sessionFactory,
+    sharedEngine,
+)
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+import argparse, threading, unittest
+
+
+_URL = 'postgresql://mcl@localhost/clinical_data'
+
+
+class EngineTest(unittest.TestCase):
+    '''Tuning engines for PostgreSQL and everything else'''
+    def testPool(self):
+        engine = makeEngine(_URL, poolSize=3, maxOverflow=2)
+        self.assertEqual((engine.pool.size(), engine.pool._max_overflow, engine.pool._pre_ping), (3, 2, True))
+        self.assertEqual(engine.dialect.executemany_values_page_size, 1000)
+
+    def testExecutemany(self):
+        engine = makeEngine(_URL, executemanyMode='batch', pageSize=50)
+        self.assertEqual(engine.dialect.executemany_batch_page_size, 50)
+        with self.assertRaises(ValueError):
+            makeEngine(_URL, executemanyMode='sometimes')
+
+    def testPgBouncer(self):
+        self.assertIsInstance(makeEngine(_URL, pgbouncer=True).pool, NullPool)
+
+    def testSettings(self):
+        engine = makeEngine(_URL, poolSize=3, statementTimeout=10, pool_timeout=5)
+        settings = engineSettings(engine)
+        self.assertEqual((settings['poolSize'], settings['statementTimeout']), (3, 10))
+        self.assertEqual((settings['pgbouncer'], settings['pool_timeout']), (False, 5))
+        self.assertEqual(engineSettings(makeEngine(_URL, **settings)), settings)
+        self.assertEqual(engineSettings(create_engine('sqlite://')), {})
+
+    def testSQLite(self):
+        engine = makeEngine('sqlite://', poolSize=3, statementTimeout=10)
+        self.assertEqual(engine.execute('SELECT 1').scalar(), 1)
+
+
+class SharingTest(unittest.TestCase):
+    '''Sharing engines and sessions'''
+    def testSharedEngine(self):
+        engine = sharedEngine('sqlite://', prePing=False)
+        self.assertIs(sharedEngine('sqlite://', prePing=False), engine)
+        self.assertIsNot(sharedEngine('sqlite://'), engine)
+
+    def testUnhashableSettings(self):
+        engine = sharedEngine('sqlite://', connect_args={'timeout': 5, 'uri': False})
+        self.assertIs(sharedEngine('sqlite://', connect_args={'uri': False, 'timeout': 5}), engine)
+        self.assertIsNot(sharedEngine('sqlite://', connect_args={'timeout': 6, 'uri': False}), engine)
+        self.assertEqual(engineSettings(engine)['connect_args'], {'timeout': 5, 'uri': False})
+
+    def testSessionFactory(self):
+        Session = sessionFactory(makeEngine('sqlite://'))
+        sessions = []
+        thread = threading.Thread(target=lambda: sessions.append(Session()))
+        thread.start()
+        thread.join()
+        self.assertIs(Session(), Session())
+        self.assertIsNot(Session(), sessions[0])
+        Session.remove()
+
+
+class ArgumentsTest(unittest.TestCase):
+    '''The connection options every command-line tool shares'''
+    def parse(self, *args):
+        parser = argparse.ArgumentParser()
+        addConnectionArguments(parser)
+        return parser.parse_args(args)
+
+    def testDefaults(self):
+        engine = engineFromArguments(self.parse())
+        self.assertEqual(str(engine.url), _URL)
+        self.assertEqual(engine.pool.size(), 5)
+
+    def testOptions(self):
+        args = self.parse(
+            '-H', 'db', '-d', 'x', '--pool-size', '2', '--executemany-mode', 'batch', '--page-size', '50', '--pgbouncer'
+        )
+        engine = engineFromArguments(args)
+        self.assertEqual(str(engine.url), 'postgresql://mcl@db/x')
+        self.assertIsInstance(engine.pool, NullPool)
+        self.assertEqual(engine.dialect.executemany_batch_page_size, 50)
+        self.assertEqual(engineSettings(engine)['pageSize'], 50)
+
+
+@needsPostgreSQL
+class SettingsTest(unittest.TestCase):
+    '''What connections to a PostgreSQL server actually get'''
+    def assertSettings(self, engine):
+        with engine.connect() as connection, connection.begin():
+            self.assertEqual(connection.execute('SHOW application_name').scalar(), 'sickbay-test')
+            self.assertEqual(connection.execute('SHOW statement_timeout').scalar(), '1234ms')
+        engine.dispose()
+
+    def testConnection(self):
+        self.assertSettings(makeEngine(POSTGRESQL_URL, statementTimeout=1234, applicationName='sickbay-test'))
+
+    def testTransaction(self):
+        engine = makeEngine(POSTGRESQL_URL, statementTimeout=1234, applicationName='sickbay-test', pgbouncer=True)
+        self.assertSettings(engine)
+
+
+if __name__ == '__main__':
+    unittest.main()
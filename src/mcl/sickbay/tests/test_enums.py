@@ -0,0 +1,62 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of the enumerations' case-insensitive lookups and column parsing.
+'''
+
+from mcl.sickbay.model.enums import Gender, Income
+import unittest
+
+
+class LookupTest(unittest.TestCase):
+    '''Finding members by label or name'''
+    def testLabels(self):
+        self.assertIs(Gender.lookup('Female'), Gender.female)
+        self.assertIs(Gender.lookup('MALE'), Gender.male)
+        self.assertIs(Income.lookup('$10,000–$24,999'), Income.ten_thousand_to_24999)
+
+    def testNames(self):
+        self.assertIs(Income.lookup('TEN_THOUSAND_TO_24999'), Income.ten_thousand_to_24999)
+
+    def testMissing(self):
+        self.assertIsNone(Gender.lookup('sometimes'))
+
+    def testItems(self):
+        self.assertIs(Gender['male'], Gender.male)
+        self.assertIs(Gender['MALE'], Gender.male)
+        self.assertIs(Income['$10,000–$24,999'], Income.ten_thousand_to_24999)
+        with self.assertRaises(KeyError):
+            Income['TEN_THOUSAND_TO_24999']  # Item access matches labels in any case, but names only exactly
+
+    def testTable(self):
+        self.assertIs(Gender.lookupTable(), Gender.lookupTable())
+        for member in Gender:
+            self.assertIs(Gender.lookupTable()[member.value.lower()], member)
+
+
+class ParseColumnTest(unittest.TestCase):
+    '''Parsing whole columns of cells'''
+    cells = ['$10,000–$24,999', ' ten_thousand_to_24999 ', '', None, 'lots', '$25,000–$44,999']
+
+    def testMembers(self):
+        results, errors = Income.parseColumn(self.cells)
+        self.assertEqual(results, [
+            Income.ten_thousand_to_24999, Income.ten_thousand_to_24999, None, None, None,
+            Income.twenty_five_thousand_to_44999
+        ])
+        self.assertEqual(errors, [(4, 'lots')])
+
+    def testCodes(self):
+        results, errors = Income.parseColumn(self.cells, codes=True)
+        self.assertEqual(results, [0, 0, None, None, None, 1])
+        self.assertEqual(errors, [(4, 'lots')])
+        self.assertEqual([list(Income)[code] for code in results if code is not None], [
+            Income.ten_thousand_to_24999, Income.ten_thousand_to_24999, Income.twenty_five_thousand_to_44999
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of exporting.
+'''
+
+from .base import DatabaseTestCase, memoryDatabase
+from mcl.sickbay import export
+from mcl.sickbay.connection import engineSettings, makeEngine
+from mcl.sickbay.export import (
+    EXPORTABLES,
+    dumpParticipants,
+    encodeParticipants,
+    exportNDJSON,
+    iterObjects,
+    iterParticipants,
+    keyRanges,
+    writeNDJSON,
+    writeNDJSONParallel,
+)
+from mcl.sickbay.json import (
+    GENOMICS_ENCODERS,
+    ORGAN_ENCODERS,
+    BiospecimenEncoder,
+    ClinicalCoreEncoder,
+    ImagingEncoder,
+)
+from mcl.sickbay.model import Biospecimen, ClinicalCore, Imaging
+from mcl.sickbay.rows import iterDocuments
+import gzip, io, json, os.path, tempfile, unittest
+
+
+# The encoder that makes the document for each mapped class
+_encoders = {
+    ClinicalCore: ClinicalCoreEncoder, Biospecimen: BiospecimenEncoder, Imaging: ImagingEncoder,
+    **ORGAN_ENCODERS, **GENOMICS_ENCODERS
+}
+
+
+class StreamingTest(DatabaseTestCase):
+    '''Streaming participant trees out as a JSON array a chunk at a time'''
+    def testOrder(self):
+        expected = [p.participant_ID for p in self.session.query(ClinicalCore).order_by(ClinicalCore.participant_ID)]
+        for chunkSize in (1, 2, 500):
+            self.assertEqual([p.participant_ID for p in iterParticipants(self.session, chunkSize)], expected)
+
+    def testSameAsDumps(self):
+        participants = self.session.query(ClinicalCore).order_by(ClinicalCore.participant_ID).all()
+        for kw in ({}, {'separators': (',', ':')}, {'sort_keys': True}):
+            expected = json.dumps(participants, cls=ClinicalCoreEncoder, **kw)
+            for chunkSize in (1, 3, 500):
+                self.assertEqual(''.join(encodeParticipants(self.session, chunkSize, **kw)), expected)
+                fp = io.StringIO()
+                dumpParticipants(self.session, fp, chunkSize, **kw)
+                self.assertEqual(fp.getvalue(), expected)
+
+    def testEmpty(self):
+        self.session.query(ClinicalCore).delete()
+        self.assertEqual(''.join(encodeParticipants(self.session)), '[]')
+
+
+class NDJSONTest(DatabaseTestCase):
+    '''Exporting tables as newline-delimited JSON'''
+    def testIterObjects(self):
+        for cls in EXPORTABLES.values():
+            key = cls.__mapper__.primary_key[0]
+            expected = self.session.query(cls).order_by(key).all()
+            for chunkSize in (1, 2, 500):
+                self.assertEqual(list(iterObjects(self.session, cls, chunkSize)), expected)
+
+    def testLines(self):
+        for name, cls in EXPORTABLES.items():
+            fp = io.StringIO()
+            count = writeNDJSON(self.session, cls, fp, chunkSize=2)
+            expected = [json.dumps(o, cls=_encoders[o.__class__]) for o in iterObjects(self.session, cls)]
+            self.assertEqual(fp.getvalue().splitlines(), expected, name)
+            self.assertEqual(count, len(expected))
+
+    def testExportNDJSON(self):
+        with tempfile.TemporaryDirectory() as directory:
+            engine, session = memoryDatabase(url=f'sqlite:///{directory}/sickbay.db')
+            session.close()
+            output = os.path.join(directory, 'out')
+            counts = exportNDJSON(engine, ['clinicalCores', 'organs'], output, 'gzip', jobs=2, chunkSize=2)
+            self.assertEqual(counts, {'clinicalCores': 5, 'organs': 7})
+            for table, count in counts.items():
+                with gzip.open(os.path.join(output, f'{table}.ndjson.gz'), 'rt', encoding='utf-8') as fp:
+                    self.assertEqual(len([json.loads(line) for line in fp]), count)
+
+
+class ParallelTest(unittest.TestCase):
+    '''Encoding exports in worker processes, which need a database they can reach by URL'''
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine, self.session = memoryDatabase(url=f'sqlite:///{self.directory.name}/sickbay.db')
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def testKeyRanges(self):
+        for name, cls in EXPORTABLES.items():
+            everything = list(iterObjects(self.session, cls))
+            ranges = keyRanges(self.session, cls, 2)
+            self.assertEqual(ranges[0][0], None)
+            self.assertEqual(ranges[-1][1], None)
+            pieces = [o for after, through in ranges for o in iterObjects(self.session, cls, 2, after, through)]
+            self.assertEqual(pieces, everything, name)
+            documents = [d for after, through in ranges for d in iterDocuments(self.session, cls, 2, after, through)]
+            self.assertEqual(documents, list(iterDocuments(self.session, cls)), name)
+
+    def testSameAsSerial(self):
+        for rows in (False, True):
+            for name in ('clinicalCores', 'organs'):
+                serial, parallel = io.StringIO(), io.StringIO()
+                writeNDJSON(self.session, EXPORTABLES[name], serial, 2, rows)
+                count = writeNDJSONParallel(self.engine, EXPORTABLES[name], parallel, 2, 2, rows)
+                self.assertEqual(parallel.getvalue(), serial.getvalue(), name)
+                self.assertEqual(count, serial.getvalue().count('\n'))
+
+    def testRestorable(self):
+        for rows in (False, True):
+            serial, parallel = io.StringIO(), io.StringIO()
+            writeNDJSON(self.session, EXPORTABLES['organs'], serial, 2, rows, restorable=True)
+            writeNDJSONParallel(self.engine, EXPORTABLES['organs'], parallel, 2, 2, rows, restorable=True)
+            self.assertEqual(parallel.getvalue(), serial.getvalue())
+            self.assertEqual(serial.getvalue().count('anchor_type'), serial.getvalue().count('\n'))
+
+    def testWorkerEngine(self):
+        engine = makeEngine(self.engine.url, prePing=False, statementTimeout=1000)
+        export._startWorker(str(engine.url), engineSettings(engine))
+        self.assertEqual(engineSettings(export._workerEngine), engineSettings(engine))
+
+
+if __name__ == '__main__':
+    unittest.main()
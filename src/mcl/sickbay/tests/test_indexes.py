@@ -0,0 +1,97 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of the model's indexes and of adding them to databases that lack them.
+'''
+
+from .base import DatabaseTestCase, needsPostgreSQL, postgresqlDatabase
+from mcl.sickbay.indexes import createIndexes, missingIndexes
+from mcl.sickbay.model import (
+    Biospecimen,
+    BreastOrgan,
+    ClinicalCore,
+    Imaging,
+    IngestionBatch,
+    LabCASFile,
+    Organ,
+    createMetadata,
+)
+from mcl.sickbay.model.base import addColumns, missingColumns
+import unittest
+
+
+def _indexed(table):
+    '''Return the names of the columns of ``table`` that have an index to themselves'''
+    return {index.columns.keys()[0] for index in table.indexes if len(index.columns) == 1}
+
+
+class DeclaredTest(unittest.TestCase):
+    '''Which columns the model indexes'''
+    def testForeignKeys(self):
+        self.assertIn('clinicalCore_participant_ID', _indexed(Biospecimen.__table__))
+        self.assertIn('clinicalCore_participant_ID', _indexed(Organ.__table__))
+
+    def testLabCASAndDiscriminators(self):
+        self.assertIn('labcasID', _indexed(Biospecimen.__table__))
+        self.assertIn('organType', _indexed(Organ.__table__))
+
+    def testNotPrimaryKeys(self):
+        self.assertNotIn('identifier', _indexed(BreastOrgan.__table__))
+
+
+class CreateTest(DatabaseTestCase):
+    '''Adding the indexes an older database lacks'''
+    def dropSome(self):
+        indexes = sorted(Organ.__table__.indexes, key=lambda index: index.name)[:2]
+        for index in indexes:
+            index.drop(self.engine)
+        return [index.name for index in indexes]
+
+    def testCreateIndexes(self):
+        self.assertEqual(missingIndexes(self.engine), [])
+        self.assertEqual(createIndexes(self.engine), [])
+        dropped = self.dropSome()
+        self.assertEqual([index.name for index in missingIndexes(self.engine)], dropped)
+        self.assertEqual(createIndexes(self.engine, concurrently=True), dropped)
+        self.assertEqual(missingIndexes(self.engine), [])
+
+    def testMissingTables(self):
+        for table in (IngestionBatch.__table__, LabCASFile.__table__):
+            table.drop(self.engine)
+        self.assertEqual(missingIndexes(self.engine), [])
+        dropped = self.dropSome()
+        self.assertEqual(createIndexes(self.engine), dropped)
+
+
+class ColumnsTest(DatabaseTestCase):
+    '''Adding the columns an older database lacks'''
+    def testAddColumns(self):
+        self.assertEqual(missingColumns(self.engine), [])
+        for table in (ClinicalCore.__table__, Imaging.__table__):
+            self.engine.execute(f'ALTER TABLE "{table.name}" DROP COLUMN "contentHash"')
+        missing = [(column.table.name, column.name) for column in missingColumns(self.engine)]
+        self.assertEqual(sorted(missing), [('clinicalCores', 'contentHash'), ('images', 'contentHash')])
+        self.assertEqual(sorted((c.table.name, c.name) for c in addColumns(self.engine)), sorted(missing))
+        self.assertEqual(missingColumns(self.engine), [])
+        self.assertEqual(self.session.query(ClinicalCore).count(), 5)
+
+    def testCreateMetadata(self):
+        self.engine.execute('ALTER TABLE images DROP COLUMN "contentHash"')
+        createMetadata(self.engine)
+        self.assertEqual(missingColumns(self.engine), [])
+
+
+@needsPostgreSQL
+class ConcurrentTest(CreateTest):
+    '''Adding them to PostgreSQL without locking out writes'''
+    def setUp(self):
+        super(ConcurrentTest, self).setUp()
+        self.session.close()
+        self.engine, self.session = postgresqlDatabase(populate=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of journaled loads that pick up where an interrupted one left off.
+'''
+
+from .test_labcas import _CORE, LoaderTestCase, _writeDataFile
+from mcl.sickbay.journal import Journal, fileSignature, lastBatch
+from mcl.sickbay.labcas import loadDataFile
+from mcl.sickbay.model import ClinicalCore, Imaging, IngestionBatch
+from mcl.sickbay.pipeline import ingestDataFile
+import os, unittest
+
+
+_table = IngestionBatch.__table__
+
+
+class JournalTest(LoaderTestCase):
+    '''Loading a file of three clinical cores a record at a time'''
+    def setUp(self):
+        super(JournalTest, self).setUp()
+        self.path = self.dataFile('12_1_ClinicalCore_20200624_0_DATA', [
+            dict(_CORE, participant_ID=f'ABC1_00{i}') for i in (1, 2, 3)
+        ])
+
+    def journal(self):
+        with self.engine.connect() as connection:
+            return connection.execute(_table.select().order_by(_table.c.batch)).fetchall()
+
+    def interrupt(self, batches):
+        '''Make it look as if the load died after the first ``batches`` committed'''
+        self.engine.execute(_table.delete().where(_table.c.batch > batches))
+        keep = [f'ABC1_00{i}' for i in range(1, batches + 1)]
+        races = ClinicalCore.core_races.property.mapper.local_table
+        self.engine.execute(races.delete().where(races.c.clinicalCore_participant_ID.notin_(keep)))
+        self.engine.execute(ClinicalCore.__table__.delete().where(ClinicalCore.participant_ID.notin_(keep)))
+
+    def testJournal(self):
+        counts = loadDataFile(self.engine, self.path, chunkSize=1, journal=True)
+        self.assertEqual((counts['clinicalCores'], counts['resumed']), (3, 0))
+        entries = self.journal()
+        self.assertEqual([(e.batch, e.firstLine, e.lastLine, e.rows, e.finished) for e in entries], [
+            (1, 2, 2, 1, False), (2, 3, 3, 1, False), (3, 4, 4, 1, False), (4, 4, 4, 0, True)
+        ])
+        self.assertEqual({e.signature for e in entries}, {fileSignature(self.path)})
+        with self.engine.connect() as connection:
+            self.assertTrue(lastBatch(connection, self.path, fileSignature(self.path)).finished)
+            self.assertIsNone(lastBatch(connection, self.path, 'something else'))
+
+    def testFinished(self):
+        loadDataFile(self.engine, self.path, chunkSize=1, journal=True)
+        counts = loadDataFile(self.engine, self.path, chunkSize=1, journal=True)
+        self.assertEqual(counts['resumed'], 3)
+        self.assertNotIn('clinicalCores', counts)
+        self.assertEqual(self.session.query(ClinicalCore).count(), 3)
+
+    def testResume(self):
+        loadDataFile(self.engine, self.path, chunkSize=1, journal=True)
+        self.interrupt(1)
+        counts = loadDataFile(self.engine, self.path, chunkSize=1, journal=True)
+        self.assertEqual((counts['clinicalCores'], counts['coreRaces'], counts['resumed']), (2, 4, 1))
+        self.assertEqual(self.session.query(ClinicalCore).count(), 3)
+        self.assertEqual([(e.batch, e.firstLine) for e in self.journal()], [(1, 2), (2, 3), (3, 4), (4, 4)])
+
+    def testLineNumbers(self):
+        loadDataFile(self.engine, self.path, chunkSize=1, journal=True)
+        self.interrupt(2)
+        status = os.stat(self.path)
+        with open(self.path, 'r+', encoding='utf-8') as fp:  # Same size and time, so the journal still applies
+            text = fp.read()
+            fp.seek(0)
+            fp.write(text[:text.rindex('female')] + 'fimale' + text[text.rindex('female') + 6:])
+        os.utime(self.path, ns=(status.st_atime_ns, status.st_mtime_ns))
+        with self.assertRaisesRegex(ValueError, '^Line 4: '):
+            loadDataFile(self.engine, self.path, chunkSize=1, journal=True)
+
+    def testChanged(self):
+        images = self.dataFile('12_1_Imaging_20200624_0_DATA', [
+            {'participant_ID': f'ABC1_00{i}', 'some_attribute': str(i)} for i in (1, 2, 3)
+        ])
+        loadDataFile(self.engine, images, chunkSize=1, journal=True)
+        self.engine.execute(_table.delete().where(_table.c.batch > 1))  # Died after the first image
+        self.engine.execute(Imaging.__table__.delete().where(Imaging.identifier > 1))
+        _writeDataFile(images, [{'participant_ID': f'ABC1_00{i}', 'some_attribute': str(i)} for i in (7, 8)])
+        with self.engine.connect() as connection:
+            self.assertTrue(Journal(connection, images).stale)
+        with self.assertRaisesRegex(ValueError, 'has changed'):
+            loadDataFile(self.engine, images, chunkSize=1, journal=True)
+        with self.assertRaisesRegex(ValueError, 'has changed'):
+            ingestDataFile(self.session, images, batchSize=1, journal=True)
+        self.session.rollback()
+
+        counts = loadDataFile(self.engine, images, chunkSize=1, journal=True, replace=True)
+        self.assertEqual((counts['forgotten'], counts['images'], counts['resumed']), (1, 2, 0))
+        inscribed = [i.inscribed_clinicalCore_participant_ID for i in self.session.query(Imaging)]
+        self.assertEqual(sorted(inscribed), ['ABC1_007', 'ABC1_008'])
+        self.assertEqual({e.signature for e in self.journal()}, {fileSignature(images)})
+        with self.engine.connect() as connection:
+            self.assertFalse(Journal(connection, images).stale)
+
+    def testIngest(self):
+        self.assertEqual(ingestDataFile(self.session, self.path, batchSize=1, journal=True), 3)
+        self.assertEqual(ingestDataFile(self.session, self.path, batchSize=1, journal=True), 0)
+        self.assertEqual(len(self.journal()), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
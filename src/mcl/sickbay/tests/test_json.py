@@ -0,0 +1,246 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of the JSON encoders: the serializers compiled from ``PLANS`` must write exactly what the encoders'
+original chains of ``default`` methods did.
+'''
+
+from .base import DatabaseTestCase
+from mcl.sickbay.json import (
+    GENOMICS_ENCODERS,
+    ORGAN_ENCODERS,
+    SERIALIZERS,
+    BiospecimenEncoder,
+    BreastOrganEncoder,
+    ClinicalCoreEncoder,
+    GenomicsEncoder,
+    ImagingEncoder,
+    LabCASMetadataEncoder,
+    LungOrganEncoder,
+    PancreasOrganEncoder,
+    ProjectionEncoder,
+    ProstateOrganEncoder,
+    RESTORABLE_SERIALIZERS,
+    SickbayDecoder,
+    SickbayEncoder,
+    Smart3SeqGenomicsEncoder,
+    projection,
+)
+from mcl.sickbay.model import (
+    Biospecimen,
+    BreastOrgan,
+    ClinicalCore,
+    Genomics,
+    Imaging,
+    LungOrgan,
+    Organ,
+    PancreasOrgan,
+    ProstateOrgan,
+    Smart3SeqGenomics,
+)
+import json, unittest
+
+
+# Attributes each class adds to those of its superclasses, as the original encoders listed them
+_attributes = {
+    BreastOrgan: BreastOrganEncoder._breastAttributes,
+    ProstateOrgan: ProstateOrganEncoder._prostateAttributes,
+    LungOrgan: LungOrganEncoder._lungAttributes,
+    PancreasOrgan: PancreasOrganEncoder._pancreasAttributes,
+    Genomics: GenomicsEncoder._genomicsAttributes,
+    Smart3SeqGenomics: Smart3SeqGenomicsEncoder._smart3SeqGenomicsAttributes,
+    ClinicalCore: ClinicalCoreEncoder._clinicalCoreAttributes,
+    Biospecimen: BiospecimenEncoder._biospecimenAttributes,
+    Imaging: ImagingEncoder._imagingAttributes,
+}
+
+_add = SickbayEncoder().addAttributes
+
+
+def _reference(obj):
+    '''Encode ``obj`` into a dict the way the encoders did before their serializers were compiled:
+    an ``isinstance`` test and a ``getattr`` for every attribute, every time.
+    '''
+    d = {f'__{obj.__class__.__module__}.{obj.__class__.__name__}__': True, 'labcasID': obj.labcasID}
+    _add(obj, LabCASMetadataEncoder._labcasAttributes, d)
+    if isinstance(obj, Organ):
+        d['identifier'] = obj.identifier
+        d['organType'] = obj.organType
+        if obj.histopathology_precancer_types is not None and len(obj.histopathology_precancer_types) > 0:
+            d['histopathology_precancer_types'] = [i.hp_type.name for i in obj.histopathology_precancer_types]
+        _add(obj, _attributes.get(obj.__class__, ()), d)
+    elif isinstance(obj, Genomics):
+        d['specimen_ID'] = obj.specimen_ID
+        when = obj.sequencing_date
+        d['sequencing_date'] = (when.year, when.month, when.day)
+        _add(obj, _attributes[Genomics], d)
+        if isinstance(obj, Smart3SeqGenomics):
+            _add(obj, _attributes[Smart3SeqGenomics], d)
+    elif isinstance(obj, ClinicalCore):
+        d['participant_ID'] = obj.participant_ID
+        _add(obj, _attributes[ClinicalCore], d)
+        if obj.prior_lesions is not None and len(obj.prior_lesions) > 0:
+            d['prior_lesions'] = [i.lesion_type.name for i in obj.prior_lesions]
+        if obj.core_races is not None and len(obj.core_races) > 0:
+            d['core_races'] = [i.race.name for i in obj.core_races]
+        if obj.core_tobaccos is not None and len(obj.core_tobaccos) > 0:
+            d['core_tobaccos'] = [i.type_tobacco_used.name for i in obj.core_tobaccos]
+        for relationship in ('biospecimens', 'genomics', 'images', 'organs'):
+            if getattr(obj, relationship):
+                d[relationship] = [_reference(i) for i in getattr(obj, relationship)]
+    elif isinstance(obj, Biospecimen):
+        d['specimen_ID'] = obj.specimen_ID
+        _add(obj, _attributes[Biospecimen], d)
+        if obj.adjacent_specimens:
+            d['adjacent_specimens'] = [i.adjacent_specimen_ID for i in obj.adjacent_specimens]
+        for relationship in ('genomics', 'images'):
+            if getattr(obj, relationship):
+                d[relationship] = [_reference(i) for i in getattr(obj, relationship)]
+    elif isinstance(obj, Imaging):
+        d['identifier'] = obj.identifier
+        _add(obj, _attributes[Imaging], d)
+    return d
+
+
+class SerializerTest(DatabaseTestCase):
+    '''Compiled serializers against the original encoders, on the sample and test data'''
+    def assertEncodesLikeReference(self, cls, encoder):
+        objects = self.session.query(cls).all()
+        self.assertTrue(objects, f'No {cls.__name__} objects to test with')
+        for obj in objects:
+            expected = json.dumps(_reference(obj), cls=SickbayEncoder)
+            self.assertEqual(json.dumps(obj, cls=encoder), expected)
+            self.assertEqual(json.dumps(SERIALIZERS[obj.__class__](obj), cls=SickbayEncoder), expected)
+
+    def testClinicalCores(self):
+        self.assertEncodesLikeReference(ClinicalCore, ClinicalCoreEncoder)
+
+    def testBiospecimens(self):
+        self.assertEncodesLikeReference(Biospecimen, BiospecimenEncoder)
+
+    def testOrgans(self):
+        for cls, encoder in ORGAN_ENCODERS.items():
+            if cls is not Organ:
+                self.assertEncodesLikeReference(cls, encoder)
+
+    def testGenomics(self):
+        for cls, encoder in GENOMICS_ENCODERS.items():
+            if cls is not Genomics:
+                self.assertEncodesLikeReference(cls, encoder)
+
+    def testImages(self):
+        self.assertEncodesLikeReference(Imaging, ImagingEncoder)
+
+    def testLabCASMetadata(self):
+        for obj in self.session.query(Biospecimen):
+            d = json.loads(json.dumps(obj, cls=LabCASMetadataEncoder))
+            self.assertEqual(d['labcasID'], obj.labcasID)
+            self.assertNotIn('specimen_ID', d)
+
+
+class DecoderTest(DatabaseTestCase):
+    '''Decoding documents back into mapped objects'''
+    def testRoundTrip(self):
+        for obj in self.session.query(ClinicalCore):
+            text = _restorable(obj)
+            decoded = json.loads(text, cls=SickbayDecoder)
+            self.assertIsInstance(decoded, ClinicalCore)
+            self.assertIsNot(decoded, obj)
+            self.assertEqual(_restorable(decoded), text)
+            self.assertEqual(json.dumps(decoded, cls=ClinicalCoreEncoder), json.dumps(obj, cls=ClinicalCoreEncoder))
+
+    def testSharedIdentity(self):
+        for obj in self.session.query(ClinicalCore):
+            decoded = json.loads(_restorable(obj), cls=SickbayDecoder)
+            genomics = {g.specimen_ID: g for g in decoded.genomics}
+            for specimen in decoded.biospecimens:
+                for g in specimen.genomics:
+                    if g.specimen_ID in genomics:
+                        self.assertIs(g, genomics[g.specimen_ID])
+
+    def testRequired(self):
+        for obj in self.session.query(LungOrgan):
+            text = json.dumps(obj, cls=LungOrganEncoder)
+            with self.assertRaisesRegex(ValueError, '^LungOrgan document has no anchor_type'):
+                json.loads(text, cls=SickbayDecoder)
+            self.assertEqual(json.loads(_restorable(obj), cls=SickbayDecoder).anchor_type, obj.anchor_type)
+
+    def testUntagged(self):
+        self.assertEqual(json.loads('{"a": [1, {"b": 2}]}', cls=SickbayDecoder), {'a': [1, {'b': 2}]})
+
+
+def _restorable(obj):
+    '''Encode the restorable document of ``obj``'''
+    return json.dumps(RESTORABLE_SERIALIZERS[obj.__class__](obj), cls=SickbayEncoder)
+
+
+def _trimmed(document, depth):
+    '''Drop everything in ``document`` that's more than ``depth`` levels of relationships down'''
+    trimmed = {}
+    for key, value in document.items():
+        if isinstance(value, list):
+            if depth == 0:
+                continue
+            value = [_trimmed(i, depth - 1) if isinstance(i, dict) and '__' in next(iter(i)) else i for i in value]
+        trimmed[key] = value
+    return trimmed
+
+
+class RestorableTest(DatabaseTestCase):
+    '''Documents that carry everything a restore needs'''
+    def testSerializers(self):
+        for cls in SERIALIZERS:
+            for obj in self.session.query(cls) if hasattr(cls, '__mapper__') else ():
+                expected = SERIALIZERS[obj.__class__](obj)
+                if isinstance(obj, Organ) and not isinstance(obj, BreastOrgan):
+                    expected['anchor_type'] = obj.anchor_type
+                if isinstance(obj, ClinicalCore) and obj.organs:
+                    expected['organs'] = [RESTORABLE_SERIALIZERS[o.__class__](o) for o in obj.organs]
+                self.assertEqual(RESTORABLE_SERIALIZERS[obj.__class__](obj), expected)
+
+    def testNested(self):
+        participants = [p for p in self.session.query(ClinicalCore) if p.organs]
+        self.assertTrue(participants)
+        for obj in participants:
+            decoded = json.loads(_restorable(obj), cls=SickbayDecoder)
+            self.assertEqual([o.anchor_type for o in decoded.organs], [o.anchor_type for o in obj.organs])
+
+
+class ProjectionTest(DatabaseTestCase):
+    '''Serializing just some of the fields, down to some depth'''
+    def testEverything(self):
+        for obj in self.session.query(ClinicalCore):
+            self.assertEqual(projection(ClinicalCore)(obj), SERIALIZERS[ClinicalCore](obj))
+
+    def testDepth(self):
+        for obj in self.session.query(ClinicalCore):
+            document = SERIALIZERS[ClinicalCore](obj)
+            for depth in (0, 1, 2):
+                self.assertEqual(projection(ClinicalCore, depth=depth)(obj), _trimmed(document, depth))
+
+    def testFields(self):
+        obj = self.session.query(ClinicalCore).get('XYZ123_456')
+        fields = ['participant_ID', 'gender', 'biospecimens.specimen_ID', 'organs.identifier', 'organs.grade']
+        d = projection(ClinicalCore, fields)(obj)
+        tag = lambda o: f'__{o.__class__.__module__}.{o.__class__.__name__}__'
+        self.assertEqual(set(d), {tag(obj), 'participant_ID', 'gender', 'biospecimens', 'organs'})
+        self.assertEqual(d['biospecimens'], [{tag(b): True, 'specimen_ID': b.specimen_ID} for b in obj.biospecimens])
+        for organ, o in zip(obj.organs, d['organs']):
+            self.assertEqual(o['identifier'], organ.identifier)
+            self.assertEqual('grade' in o, isinstance(organ, BreastOrgan))
+        nested = projection(ClinicalCore, {'biospecimens': ['specimen_ID']})(obj)
+        self.assertEqual(nested['biospecimens'], d['biospecimens'])
+
+    def testEncoder(self):
+        obj = self.session.query(ClinicalCore).get('MCL78_001')
+        text = json.dumps(obj, cls=ProjectionEncoder, fields=['participant_ID', 'weight'], depth=0)
+        self.assertEqual(json.loads(text), {
+            '__mcl.sickbay.model.clinicalcore.ClinicalCore__': True, 'participant_ID': 'MCL78_001', 'weight': obj.weight
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
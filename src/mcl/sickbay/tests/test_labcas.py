@@ -0,0 +1,345 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of loading LabCAS DATA files. SQLite gets an ``executemany`` insert instead of ``COPY``, but it's
+the same parsing, conversion, and layout either way; the ``COPY`` path runs too if there's a PostgreSQL
+database to test with.
+'''
+
+from .base import memoryDatabase, needsPostgreSQL, postgresqlDatabase
+from mcl.sickbay import labcas
+from mcl.sickbay.connection import engineSettings, makeEngine
+from mcl.sickbay.labcas import (
+    Layout,
+    classForFile,
+    expandLists,
+    forgetFile,
+    loadDataFile,
+    loadDataFiles,
+    pruneFile,
+    upsertable,
+)
+from mcl.sickbay.model import Biospecimen, ClinicalCore, Imaging
+from sqlalchemy import func, select
+import csv, os.path, shutil, tempfile, unittest
+
+
+# The columns every clinical core needs, with values given by label, by token, and in any case
+_CORE = {
+    'participant_ID': 'ABC1_001',
+    'anchor_type': 'FIRST IMAGING DATE',
+    'gender': 'female',
+    'ethnicity': 'Hispanic or Latino',
+    'age_at_index': '49',
+    'days_to_birth': '-17885',
+    'year_of_birth': '1970',
+    'education': 'HIGH SCHOOL GRADUATE',
+    'income': 'greater_than_100000',
+    'height': '173.0',
+    'days_to_weight_recorded': '-450',
+    'weight': '90.5',
+    'prior_cancer': 'No',
+    'current_lesion_type': 'breast',
+    'days_to_diagnosis': '7',
+    'year_of_diagnosis': '2019',
+    'age_at_diagnosis': '49.0',
+    'how_detected': 'SCREENING',
+    'days_to_detection_date': '0',
+    'days_to_last_screen_date': '-180',
+    'days_to_last_neg_screen_date': '-180',
+    'mode_of_detection': 'imaging',
+    'lesion_type': 'metastatic',
+    'specimen_collected': 'yes',
+    'biomarker_tested': 'NO',
+    'relative_with_cancer_history': 'no',
+    'tobacco_smoking_status': 'never_smoker',
+    'alcohol_history': 'NO',
+    'race': 'ASIAN|white',
+    'vital_status': 'alive',
+    'favorite_color': 'teal',
+}
+
+# Another clinical core, with some values left blank
+_SECOND = dict(_CORE, participant_ID='ABC1_002', gender='Male', race='', vital_status='')
+
+
+def _writeDataFile(path, rows, delimiter='\t'):
+    '''Write the ``rows`` (dicts) into a DATA file at ``path`` with the keys of the first as its header'''
+    with open(path, 'w', encoding='utf-8', newline='') as fp:
+        writer = csv.writer(fp, delimiter=delimiter)
+        writer.writerow(rows[0].keys())
+        for row in rows:
+            writer.writerow(row.values())
+    return path
+
+
+class LoaderTestCase(unittest.TestCase):
+    '''Load DATA files written into a scratch directory into an empty database'''
+    def setUp(self):
+        super(LoaderTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.engine, self.session = memoryDatabase(populate=False)
+
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.directory)
+        super(LoaderTestCase, self).tearDown()
+
+    def dataFile(self, name, rows, delimiter='\t'):
+        return _writeDataFile(os.path.join(self.directory, name), rows, delimiter)
+
+    def cores(self, delimiter='\t'):
+        return self.dataFile('12_1_ClinicalCore_20200624_0_DATA', [_CORE, _SECOND], delimiter)
+
+    def assertUpserts(self):
+        path = self.cores()
+        self.assertEqual(loadDataFile(self.engine, path, upsert=True)['unchanged'], 0)
+        counts = loadDataFile(self.engine, path, upsert=True)
+        self.assertEqual(counts['unchanged'], 2)
+        self.assertNotIn('clinicalCores', counts)
+        third = dict(_CORE, participant_ID='ABC1_003')
+        _writeDataFile(path, [dict(_CORE, weight='91.0', race='white'), _SECOND, third])
+        counts = loadDataFile(self.engine, path, upsert=True, chunkSize=2)
+        self.assertEqual((counts['clinicalCores'], counts['unchanged']), (2, 1))
+        self.session.expire_all()
+        first = self.session.query(ClinicalCore).get('ABC1_001')
+        self.assertEqual((first.weight, [i.race.name for i in first.core_races]), (91.0, ['white']))
+        self.assertEqual(self.session.query(ClinicalCore).count(), 3)
+        self.assertEqual(loadDataFile(self.engine, path, upsert=True)['unchanged'], 3)
+
+
+class LoadDataFileTest(LoaderTestCase):
+    '''Parsing DATA files into rows of the Sickbay tables'''
+    def assertCores(self, counts):
+        self.assertEqual(counts['clinicalCores'], 2)
+        self.assertEqual(counts['coreRaces'], 2)
+        self.assertEqual(counts['ignored'], ['favorite_color'])
+        first, second = self.session.query(ClinicalCore).order_by(ClinicalCore.participant_ID)
+        self.assertEqual(first.anchor_type.name, 'first_imaging_date')
+        self.assertEqual(first.ethnicity.name, 'hispanic')
+        self.assertEqual(first.age_at_diagnosis, 49)
+        self.assertEqual(first.weight, 90.5)
+        self.assertEqual(sorted(i.race.name for i in first.core_races), ['asian', 'white'])
+        self.assertEqual(first.fileName, '12_1_ClinicalCore_20200624_0_DATA')
+        self.assertEqual((first.protocolID, first.siteID), ('12', '1'))
+        self.assertEqual(second.gender.name, 'male')
+        self.assertEqual(second.core_races, [])
+        self.assertEqual(first.vital_status.name, 'alive')
+        self.assertIsNone(second.vital_status)
+
+    def testTabs(self):
+        self.assertCores(loadDataFile(self.engine, self.cores(), chunkSize=1, consortium='MCL'))
+        self.assertEqual({c.consortium for c in self.session.query(ClinicalCore)}, {'MCL'})
+
+    def testCommas(self):
+        self.assertCores(loadDataFile(self.engine, self.cores(','), labcasID='Sickbay/Cores'))
+        self.assertEqual({c.labcasID for c in self.session.query(ClinicalCore)}, {'Sickbay/Cores'})
+
+    def testInscriptions(self):
+        path = self.dataFile('images.csv', [
+            {'participant_ID': 'ABC1_001', 'specimen_ID': 'ABC1_001_1', 'some_attribute': '1'},
+            {'participant_ID': 'ABC1_002', 'specimen_ID': '', 'some_attribute': '2'},
+        ], ',')
+        self.assertEqual(loadDataFile(self.engine, path, cls=Imaging)['images'], 2)
+        images = self.session.query(Imaging).order_by(Imaging.identifier).all()
+        self.assertEqual([i.identifier for i in images], [1, 2])
+        self.assertEqual([i.inscribed_clinicalCore_participant_ID for i in images], ['ABC1_001', 'ABC1_002'])
+        self.assertEqual([i.inscribed_biospecimen_specimen_ID for i in images], ['ABC1_001_1', None])
+        self.assertEqual([i.clinicalCore_participant_ID for i in images], [None, None])
+
+    def testBadValue(self):
+        path = self.dataFile('12_1_ClinicalCore_20200624_0_DATA', [dict(_CORE, gender='sometimes')])
+        with self.assertRaisesRegex(ValueError, 'Line 2'):
+            loadDataFile(self.engine, path)
+        self.assertEqual(self.session.query(ClinicalCore).count(), 0)
+
+    def testUnknownFile(self):
+        path = self.dataFile('cores.csv', [_CORE], ',')
+        self.assertIsNone(classForFile(path))
+        with self.assertRaises(ValueError):
+            loadDataFile(self.engine, path)
+        self.assertEqual(loadDataFile(self.engine, path, cls=ClinicalCore)['clinicalCores'], 1)
+
+
+class ExpandListsTest(LoaderTestCase):
+    '''Turning the lists of a whole batch into child rows'''
+    def testExpand(self):
+        layout = Layout(ClinicalCore, ['participant_ID', 'race', 'prior_lesion_type'], {})
+        races, lesions = layout.children
+        parents = [
+            ({'participant_ID': 'A'}, [['white', 'asian'], []]), ({'participant_ID': 'B'}, [['white'], ['bone']])
+        ]
+        with self.engine.connect() as connection:
+            expandLists(connection, layout.children, parents)
+        self.assertEqual(races.target.rows, [(1, 'A', 'white'), (2, 'A', 'asian'), (3, 'B', 'white')])
+        self.assertEqual(lesions.target.rows, [(1, 'B', 'bone')])
+
+    def testIngested(self):
+        path = self.dataFile('12_1_ClinicalCore_20200624_0_DATA', [
+            dict(_CORE, prior_lesion_type=''),
+            dict(_CORE, participant_ID='ABC1_003', race='white', prior_lesion_type='bone|breast'),
+        ])
+        counts = loadDataFile(self.engine, path, chunkSize=2)
+        self.assertEqual((counts['coreRaces'], counts['priorLesions']), (3, 2))
+        third = self.session.query(ClinicalCore).get('ABC1_003')
+        self.assertEqual(sorted(i.lesion_type.name for i in third.prior_lesions), ['bone', 'breast'])
+
+
+class UpsertTest(LoaderTestCase):
+    '''Reloading corrected files over what's already there'''
+    def testUpsert(self):
+        self.assertUpserts()
+
+    def testNoNaturalKey(self):
+        path = self.dataFile('images.csv', [{'participant_ID': 'ABC1_001'}], ',')
+        with self.assertRaises(ValueError):
+            loadDataFile(self.engine, path, cls=Imaging, upsert=True)
+
+
+class ReplaceTest(LoaderTestCase):
+    '''Loading new versions of files loaded before'''
+    def setUp(self):
+        super(ReplaceTest, self).setUp()
+        self.images = self.dataFile('12_1_Imaging_20200624_0_DATA', [
+            {'participant_ID': 'ABC1_001', 'some_attribute': '1'}, {'participant_ID': 'ABC1_002', 'some_attribute': '2'}
+        ])
+
+    def inscribed(self):
+        return sorted(i.inscribed_clinicalCore_participant_ID for i in self.session.query(Imaging))
+
+    def testUpsertable(self):
+        self.assertTrue(upsertable(ClinicalCore))
+        self.assertTrue(upsertable(Biospecimen))
+        self.assertFalse(upsertable(Imaging))
+
+    def testForgetFile(self):
+        path = self.cores()
+        loadDataFile(self.engine, path)
+        loadDataFile(self.engine, self.images)
+        with self.engine.begin() as connection:
+            self.assertEqual(forgetFile(connection, ClinicalCore, 'elsewhere'), 0)
+            self.assertEqual(forgetFile(connection, ClinicalCore, os.path.basename(path)), 2)
+        self.assertEqual(self.session.query(ClinicalCore).count(), 0)
+        races = ClinicalCore.core_races.property.mapper.local_table
+        self.assertEqual(self.engine.execute(select([func.count()]).select_from(races)).scalar(), 0)
+        self.assertEqual(len(self.inscribed()), 2)
+
+    def testReplace(self):
+        loadDataFile(self.engine, self.images)
+        _writeDataFile(self.images, [{'participant_ID': 'ABC1_003', 'some_attribute': '3'}])
+        counts = loadDataFile(self.engine, self.images, replace=True)
+        self.assertEqual((counts['forgotten'], counts['images']), (2, 1))
+        self.assertEqual(self.inscribed(), ['ABC1_003'])
+
+    def testReplaceUpserts(self):
+        path = self.cores()
+        loadDataFile(self.engine, path, upsert=True)
+        counts = loadDataFile(self.engine, path, replace=True)
+        self.assertEqual((counts['unchanged'], counts['pruned'], counts.get('forgotten')), (2, 0, None))
+        self.assertEqual(self.session.query(ClinicalCore).count(), 2)
+
+    def testPrune(self):
+        path = self.dataFile('12_1_ClinicalCore_20200624_0_DATA', [_CORE, dict(_SECOND, race='white')])
+        loadDataFile(self.engine, path)
+        loadDataFile(self.engine, self.dataFile('12_1_ClinicalCore_20200625_0_DATA', [dict(_CORE, participant_ID='C')]))
+        loadDataFile(self.engine, self.images)
+        self.engine.execute(Imaging.__table__.update().values(
+            clinicalCore_participant_ID=Imaging.inscribed_clinicalCore_participant_ID,
+            inscribed_clinicalCore_participant_ID=None
+        ))
+        _writeDataFile(path, [_CORE])
+        counts = loadDataFile(self.engine, path, replace=True)
+        self.assertEqual((counts['pruned'], counts['unchanged']), (1, 0))
+        self.assertEqual([c.participant_ID for c in self.session.query(ClinicalCore)], ['ABC1_001', 'C'])
+        races = ClinicalCore.core_races.property.mapper.local_table
+        self.assertEqual(self.engine.execute(select([races.c.clinicalCore_participant_ID]).distinct()).fetchall(), [
+            ('ABC1_001',), ('C',)
+        ])
+        images = self.session.query(Imaging).order_by(Imaging.identifier).all()
+        self.assertEqual([i.clinicalCore_participant_ID for i in images], ['ABC1_001', None])
+        self.assertEqual([i.inscribed_clinicalCore_participant_ID for i in images], [None, 'ABC1_002'])
+        with self.engine.begin() as connection:
+            self.assertEqual(pruneFile(connection, ClinicalCore, os.path.basename(path), {'ABC1_001'}), 0)
+
+    def testLoadDataFiles(self):
+        other = self.dataFile('12_1_Imaging_20200625_0_DATA', [{'participant_ID': 'ABC1_004', 'some_attribute': '4'}])
+        loadDataFiles(self.engine, [self.images, other], processes=1)
+        report = loadDataFiles(self.engine, [self.images, other], processes=1, replace=[self.images])
+        self.assertEqual(report['files'][self.images]['forgotten'], 2)
+        self.assertNotIn('forgotten', report['files'][other])
+        self.assertEqual(self.inscribed(), ['ABC1_001', 'ABC1_002', 'ABC1_004', 'ABC1_004'])
+
+
+class ParallelTest(LoaderTestCase):
+    '''Loading several files at once, into a database file the worker processes can share'''
+    def setUp(self):
+        super(ParallelTest, self).setUp()
+        self.session.close()
+        self.engine, self.session = memoryDatabase(False, 'sqlite:///' + os.path.join(self.directory, 'db.sqlite'))
+        self.paths = [
+            self.dataFile('12_1_Imaging_20200624_0_DATA', [{'participant_ID': 'ABC1_001', 'some_attribute': '1'}]),
+            self.cores(),
+            self.dataFile('12_1_ClinicalCore_20200625_0_DATA', [dict(_CORE, gender='sometimes')]),
+        ]
+
+    def testUnknownFile(self):
+        path = self.dataFile('cores.csv', [_CORE], ',')
+        report = loadDataFiles(self.engine, [path, self.paths[1]], processes=1)
+        self.assertIn('Cannot tell what kind of data', report['errors'][path])
+        self.assertEqual(list(report['files']), [self.paths[1]])
+        report = loadDataFiles(self.engine, [path], cls=ClinicalCore, processes=1, upsert=True)
+        self.assertEqual(report['totals'], {'clinicalCores': 1, 'coreRaces': 2})
+
+    def assertLoads(self, processes):
+        report = loadDataFiles(self.engine, self.paths, processes=processes, chunkSize=1)
+        self.assertEqual(set(report['files']), set(self.paths[:2]))
+        self.assertEqual(list(report['errors']), [self.paths[2]])
+        self.assertIn('Line 2', report['errors'][self.paths[2]])
+        self.assertEqual(report['totals'], {'images': 1, 'clinicalCores': 2, 'coreRaces': 2})
+        self.assertEqual(report['files'][self.paths[1]]['ignored'], ['favorite_color'])
+        self.assertEqual(self.session.query(ClinicalCore).count(), 2)
+        self.assertEqual(self.session.query(Imaging).one().inscribed_clinicalCore_participant_ID, 'ABC1_001')
+
+    def testSerial(self):
+        self.assertLoads(1)
+
+    def testUnparseable(self):
+        path = os.path.join(self.directory, '12_1_ClinicalCore_20200626_0_DATA')
+        with open(path, 'w', encoding='utf-8') as fp:
+            fp.write('participant_ID\n' + 'x' * (csv.field_size_limit() + 1) + '\n')
+        report = loadDataFiles(self.engine, [path, self.paths[1]], processes=1)
+        self.assertIn('field larger than field limit', report['errors'][path])
+        self.assertEqual(list(report['files']), [self.paths[1]])
+
+    def testWorkerEngine(self):
+        engine = makeEngine(self.engine.url, prePing=False, statementTimeout=1000)
+        labcas._startWorker(str(engine.url), engineSettings(engine))
+        self.assertEqual(engineSettings(labcas._workerEngine), engineSettings(engine))
+
+    def testProcesses(self):
+        self.assertLoads(2)
+
+
+@needsPostgreSQL
+class CopyTest(LoaderTestCase):
+    '''Sending DATA files through PostgreSQL's ``COPY``'''
+    def setUp(self):
+        super(CopyTest, self).setUp()
+        self.session.close()
+        self.engine, self.session = postgresqlDatabase(populate=False)
+
+    def testCopy(self):
+        counts = loadDataFile(self.engine, self.cores(), chunkSize=1)
+        self.assertEqual((counts['clinicalCores'], counts['coreRaces']), (2, 2))
+        first = self.session.query(ClinicalCore).get('ABC1_001')
+        self.assertEqual(sorted(i.race.name for i in first.core_races), ['asian', 'white'])
+
+    def testUpsert(self):
+        self.assertUpserts()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of loading: what ``mcl.sickbay.export`` writes as restorable newline-delimited JSON must load back
+with ``loadRows`` and ``loadObjects`` into the very same database, exporting the very same documents again.
+'''
+
+from .base import DatabaseTestCase, memoryDatabase
+from mcl.sickbay.export import EXPORTABLES, writeNDJSON
+from mcl.sickbay.load import loadObjects, loadRows
+from mcl.sickbay.model import Base, ClinicalCore, LungOrgan, Organ
+from sqlalchemy import func, select
+import io, unittest
+
+
+def _counts(engine):
+    '''Count the rows in every table of the database of ``engine``'''
+    with engine.connect() as connection:
+        return {
+            table.name: connection.execute(select([func.count()]).select_from(table)).scalar()
+            for table in Base.metadata.sorted_tables
+        }
+
+
+def _export(session, cls=ClinicalCore, rows=False, restorable=True):
+    '''Export every ``cls`` in ``session`` as newline-delimited JSON text, ``restorable`` unless told not to'''
+    fp = io.StringIO()
+    writeNDJSON(session, cls, fp, chunkSize=2, rows=rows, restorable=restorable)
+    return fp.getvalue()
+
+
+class RoundTripTest(DatabaseTestCase):
+    '''Export participant trees, load them into a fresh database, and export them again'''
+    def setUp(self):
+        super(RoundTripTest, self).setUp()
+        self.text = _export(self.session)
+
+    def assertRestored(self, engine, session):
+        self.assertEqual(_counts(engine), _counts(self.engine))
+        self.assertEqual(_export(session), self.text)
+        self.assertEqual(_export(session, rows=True), self.text)
+        for name, cls in EXPORTABLES.items():
+            self.assertEqual(_export(session, cls), _export(self.session, cls), name)
+            self.assertEqual(_export(session, cls, restorable=False), _export(self.session, cls, restorable=False))
+
+    def testLoadRows(self):
+        engine, session = memoryDatabase(populate=False)
+        try:
+            counts = loadRows(engine, io.StringIO(self.text), batchSize=2)
+            self.assertEqual(counts['clinicalCores'], self.session.query(ClinicalCore).count())
+            self.assertRestored(engine, session)
+        finally:
+            session.close()
+
+    def testLoadObjects(self):
+        engine, session = memoryDatabase(populate=False)
+        try:
+            count = loadObjects(session, io.StringIO(self.text), batchSize=2)
+            self.assertEqual(count, self.session.query(ClinicalCore).count())
+            self.assertRestored(engine, session)
+        finally:
+            session.close()
+
+    def testOrgans(self):
+        engine, session = memoryDatabase(populate=False)
+        try:
+            counts = loadRows(engine, io.StringIO(_export(self.session, Organ)))
+            self.assertEqual(counts['organs'], self.session.query(Organ).count())
+            expected = {o.identifier: o.anchor_type for o in self.session.query(Organ)}
+            self.assertEqual({o.identifier: o.anchor_type for o in session.query(Organ)}, expected)
+        finally:
+            session.close()
+
+    def testNotRestorable(self):
+        engine, session = memoryDatabase(populate=False)
+        try:
+            for text in (_export(self.session, restorable=False), _export(self.session, LungOrgan, restorable=False)):
+                with self.assertRaisesRegex(ValueError, 'has no anchor_type'):
+                    loadRows(engine, io.StringIO(text))
+                with self.assertRaisesRegex(ValueError, 'has no anchor_type'):
+                    loadObjects(session, io.StringIO(text))
+                session.rollback()
+            self.assertEqual(set(_counts(engine).values()), {0})
+        finally:
+            session.close()
+
+    def testNotSickbay(self):
+        engine, session = memoryDatabase(populate=False)
+        session.close()
+        with self.assertRaises(ValueError):
+            loadRows(engine, io.StringIO('{"participant_ID": "X"}\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of the file manifest that lets reloads skip files they've already seen.
+'''
+
+from .test_labcas import _CORE, _SECOND, LoaderTestCase, _writeDataFile
+from mcl.sickbay.labcas import dataFiles
+from mcl.sickbay.manifest import fileDigest, planDelta, recordFiles
+from mcl.sickbay.model import LabCASFile
+import os, unittest
+
+
+class ManifestTest(LoaderTestCase):
+    '''Planning which of a directory of DATA files to load'''
+    def setUp(self):
+        super(ManifestTest, self).setUp()
+        os.mkdir(os.path.join(self.directory, 'site'))
+        self.cores = self.dataFile(os.path.join('site', '12_1_ClinicalCore_20200624_0_DATA'), [_CORE])
+        self.more = self.dataFile('12_1_ClinicalCore_20200625_0_DATA', [_SECOND])
+        self.dataFile('README.txt', [{'about': 'Not a DATA file'}])
+
+    def testDataFiles(self):
+        self.assertEqual(dataFiles([self.directory]), [self.more, self.cores])
+        readme = os.path.join(self.directory, 'README.txt')
+        self.assertEqual(dataFiles([readme, os.path.join(self.directory, 'site')]), [readme, self.cores])
+
+    def testDigest(self):
+        size, digest = fileDigest(self.cores)
+        self.assertEqual(size, os.path.getsize(self.cores))
+        self.assertEqual(fileDigest(self.cores), (size, digest))
+        self.assertNotEqual(fileDigest(self.more)[1], digest)
+
+    def testPlan(self):
+        paths = [self.cores, self.more]
+        plan = planDelta(self.engine, paths)
+        self.assertEqual((plan.new, plan.changed, plan.unchanged), (paths, [], []))
+        recordFiles(self.engine, plan, paths)
+        self.assertEqual(self.session.query(LabCASFile).count(), 2)
+        self.assertEqual(planDelta(self.engine, paths).unchanged, paths)
+
+        moved = os.path.join(self.directory, 'site', os.path.basename(self.more))
+        _writeDataFile(moved, [_SECOND, dict(_CORE, participant_ID='ABC1_003')])
+        plan = planDelta(self.engine, [self.cores, moved])
+        self.assertEqual((plan.new, plan.changed, plan.unchanged), ([], [moved], [self.cores]))
+        self.assertEqual(plan.scheduled, [moved])
+        recordFiles(self.engine, plan, plan.scheduled)
+        self.session.expire_all()
+        entry = self.session.query(LabCASFile).get(os.path.basename(moved))
+        self.assertEqual((entry.path, entry.size), (os.path.abspath(moved), os.path.getsize(moved)))
+        self.assertEqual(planDelta(self.engine, [self.cores, moved]).unchanged, [self.cores, moved])
+
+
+if __name__ == '__main__':
+    unittest.main()
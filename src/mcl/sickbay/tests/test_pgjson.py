@@ -0,0 +1,58 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of documents built inside PostgreSQL.
+'''
+
+from .base import needsPostgreSQL, postgresqlDatabase
+from mcl.sickbay.export import EXPORTABLES, iterObjects
+from mcl.sickbay.json import SERIALIZERS, SickbayEncoder
+from mcl.sickbay.pgjson import documentQueries, iterDocuments
+from sqlalchemy.dialects import postgresql
+import json, unittest
+
+
+def _normalized(value):
+    '''Make ``value`` comparable with a ``jsonb`` document, which loses key order and whole-number floats'''
+    if isinstance(value, dict):
+        return {k: _normalized(v) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [_normalized(v) for v in value]
+    elif isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+class QueryTest(unittest.TestCase):
+    '''Building the statements, which needs no database'''
+    def testCompiles(self):
+        for cls in EXPORTABLES.values():
+            first, following = documentQueries(cls, 10)
+            self.assertIn('jsonb_build_object', str(first.compile(dialect=postgresql.dialect())))
+            self.assertIn('after', following.compile(dialect=postgresql.dialect()).params)
+
+
+@needsPostgreSQL
+class DocumentTest(unittest.TestCase):
+    '''PostgreSQL-built documents against the compiled serializers'''
+    def setUp(self):
+        self.engine, self.session = postgresqlDatabase()
+
+    def tearDown(self):
+        self.session.close()
+
+    def testDocuments(self):
+        encode = SickbayEncoder().encode
+        for name, cls in EXPORTABLES.items():
+            expected = [
+                _normalized(json.loads(encode(SERIALIZERS[o.__class__](o)))) for o in iterObjects(self.session, cls)
+            ]
+            for chunkSize in (2, 500):
+                self.assertEqual([_normalized(d) for d in iterDocuments(self.engine, cls, chunkSize)], expected, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
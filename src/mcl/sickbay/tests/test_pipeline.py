@@ -0,0 +1,38 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of the ORM ingestion pipeline.
+'''
+
+from .test_labcas import _CORE, LoaderTestCase
+from mcl.sickbay.model import ClinicalCore
+from mcl.sickbay.pipeline import batched, ingestDataFile
+import unittest
+
+
+class IngestTest(LoaderTestCase):
+    '''Ingesting DATA files a batch at a time'''
+    def testIngest(self):
+        self.assertEqual(ingestDataFile(self.session, self.cores(), batchSize=1, consortium='MCL'), 2)
+        self.assertEqual(len(self.session.identity_map), 0)
+        first, second = self.session.query(ClinicalCore).order_by(ClinicalCore.participant_ID)
+        self.assertEqual(first.ethnicity.name, 'hispanic')
+        self.assertEqual(sorted(i.race.name for i in first.core_races), ['asian', 'white'])
+        self.assertEqual((second.gender.name, second.core_races, second.consortium), ('male', [], 'MCL'))
+
+    def testMissing(self):
+        path = self.dataFile('12_1_ClinicalCore_20200624_0_DATA', [_CORE, dict(_CORE, participant_ID='B', weight='')])
+        with self.assertRaisesRegex(ValueError, 'Line 3: weight: a value is required'):
+            ingestDataFile(self.session, path, batchSize=1)
+        self.assertEqual([c.participant_ID for c in self.session.query(ClinicalCore)], ['ABC1_001'])
+
+    def testBatched(self):
+        self.assertEqual(list(batched(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(batched([], 2)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of resolving detached records by their inscribed IDs.
+'''
+
+from .base import DatabaseTestCase
+from mcl.sickbay.model import Imaging
+from mcl.sickbay.resolve import associations, orphans, resolve
+import unittest
+
+
+class ResolveTest(DatabaseTestCase):
+    '''Attaching images that arrived before their participants and specimens'''
+    def setUp(self):
+        super(ResolveTest, self).setUp()
+        self.before = orphans(self.engine)  # The test data have a few orphans of their own
+        rows = [
+            (101, 'MCL78_001', None), (102, 'NOBODY', None), (103, None, 'MCL111_404_10002'), (104, None, 'NOTHING')
+        ]
+        self.engine.execute(Imaging.__table__.insert(), [
+            {'labcasID': 'x', 'identifier': i, 'inscribed_clinicalCore_participant_ID': participant,
+             'inscribed_biospecimen_specimen_ID': specimen}
+            for i, participant, specimen in rows
+        ])
+
+    def image(self, identifier):
+        self.session.expire_all()
+        return self.session.query(Imaging).get(identifier)
+
+    def testAssociations(self):
+        names = {f'{table.name}.{reference.key}' for table, inscribed, reference, parent in associations()}
+        self.assertIn('images.clinicalCore_participant_ID', names)
+        self.assertIn('images.biospecimen_specimen_ID', names)
+        self.assertIn('organs.clinicalCore_participant_ID', names)
+
+    def testResolve(self):
+        counts = resolve(self.engine)
+        self.assertEqual(counts['images.clinicalCore_participant_ID'], 1)
+        self.assertEqual(counts['images.biospecimen_specimen_ID'], 1)
+        self.assertEqual(self.image(101).clinicalCore.participant_ID, 'MCL78_001')
+        self.assertEqual(self.image(103).biospecimen.specimen_ID, 'MCL111_404_10002')
+        self.assertIsNone(self.image(102).clinicalCore_participant_ID)
+        self.assertEqual(resolve(self.engine)['images.clinicalCore_participant_ID'], 0)
+
+    def testTables(self):
+        self.assertEqual(resolve(self.engine, {'organs'}), {'organs.clinicalCore_participant_ID': 0})
+        self.assertIsNone(self.image(101).clinicalCore_participant_ID)
+
+    def testOrphans(self):
+        expected = dict(self.before)
+        for name, missing in (('clinicalCore_participant_ID', 'NOBODY'), ('biospecimen_specimen_ID', 'NOTHING')):
+            name = f'images.{name}'
+            expected[name] = sorted(self.before.get(name, []) + [missing])
+        self.assertEqual(orphans(self.engine), expected)
+        resolve(self.engine)
+        self.assertEqual(orphans(self.engine), expected)
+        self.assertEqual(orphans(self.engine, {'organs'}), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
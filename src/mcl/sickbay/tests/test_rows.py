@@ -0,0 +1,53 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of row-level serialization: documents built from result rows must be the same as those built
+from ORM objects.
+'''
+
+from .base import DatabaseTestCase
+from mcl.sickbay.export import EXPORTABLES, iterObjects, writeNDJSON
+from mcl.sickbay.json import RESTORABLE_SERIALIZERS, SERIALIZERS, SickbayEncoder
+from mcl.sickbay.rows import iterDocuments
+import io, unittest
+
+
+class RowsTest(DatabaseTestCase):
+    '''Row-level documents against the compiled serializers'''
+    def expected(self, cls, serializers=SERIALIZERS):
+        encode = SickbayEncoder().encode
+        return [encode(serializers[o.__class__](o)) for o in iterObjects(self.session, cls)]
+
+    def testDocuments(self):
+        encode = SickbayEncoder().encode
+        for name, cls in EXPORTABLES.items():
+            expected = self.expected(cls)
+            for chunkSize in (1, 2, 500):
+                documents = [encode(d) for d in iterDocuments(self.engine, cls, chunkSize)]
+                self.assertEqual(documents, expected, f'{name} in chunks of {chunkSize}')
+
+    def testRestorable(self):
+        encode = SickbayEncoder().encode
+        for name, cls in EXPORTABLES.items():
+            documents = [encode(d) for d in iterDocuments(self.engine, cls, 2, restorable=True)]
+            self.assertEqual(documents, self.expected(cls, RESTORABLE_SERIALIZERS), name)
+
+    def testConnections(self):
+        expected = [d for d in iterDocuments(self.engine)]
+        self.assertEqual(list(iterDocuments(self.session)), expected)
+        with self.engine.connect() as connection:
+            self.assertEqual(list(iterDocuments(connection)), expected)
+
+    def testWriteNDJSON(self):
+        for name, cls in EXPORTABLES.items():
+            objects, rows = io.StringIO(), io.StringIO()
+            writeNDJSON(self.session, cls, objects, 3)
+            writeNDJSON(self.session, cls, rows, 3, rows=True)
+            self.assertEqual(rows.getvalue(), objects.getvalue(), name)
+
+
+if __name__ == '__main__':
+    unittest.main()
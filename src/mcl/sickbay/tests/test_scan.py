@@ -0,0 +1,65 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of walking mapped classes at constant memory.
+'''
+
+from .base import DatabaseTestCase, needsPostgreSQL, postgresqlDatabase
+from mcl.sickbay.model import Biospecimen, ClinicalCore, Organ
+from mcl.sickbay.scan import SCAN_MODES, iterObjects, scanObjects, streamObjects
+from mcl.sickbay.trees import treeOptions
+from sqlalchemy.orm import selectinload
+import unittest
+
+
+class ScanTest(DatabaseTestCase):
+    '''Scanning the sample and test data every way'''
+    def expected(self, cls, *filters):
+        key = cls.__mapper__.primary_key[0]
+        return self.session.query(cls).filter(*filters).order_by(key).all()
+
+    def testModes(self):
+        for cls in (ClinicalCore, Biospecimen, Organ):
+            for mode in SCAN_MODES:
+                self.assertEqual(list(scanObjects(self.session, cls, mode, chunkSize=2)), self.expected(cls), mode)
+
+    def testFilters(self):
+        filters = (Biospecimen.clinicalCore_participant_ID == 'MCL78_001',)
+        expected = self.expected(Biospecimen, *filters)
+        self.assertEqual(len(expected), 3)
+        for mode in SCAN_MODES:
+            self.assertEqual(list(scanObjects(self.session, Biospecimen, mode, 2, filters=filters)), expected)
+
+    def testRange(self):
+        objects = list(iterObjects(self.session, ClinicalCore, 2, after='MCL111_404', through='MCL78_003'))
+        self.assertEqual([p.participant_ID for p in objects], ['MCL78_001', 'MCL78_003'])
+
+    def testOptions(self):
+        options = (selectinload(ClinicalCore.biospecimens),)
+        for mode in SCAN_MODES:
+            for participant in scanObjects(self.session, ClinicalCore, mode, 2, options=options):
+                self.assertIn('biospecimens', participant.__dict__)
+
+    def testUnknown(self):
+        with self.assertRaises(ValueError):
+            scanObjects(self.session, ClinicalCore, 'sideways')
+
+
+@needsPostgreSQL
+class ServerSideTest(ScanTest):
+    '''Scanning through a named cursor on PostgreSQL'''
+    def setUp(self):
+        super(ServerSideTest, self).setUp()
+        self.session.close()
+        self.engine, self.session = postgresqlDatabase()
+
+    def testTrees(self):
+        streamed = list(streamObjects(self.session, ClinicalCore, 2, options=treeOptions()))
+        self.assertEqual(streamed, self.expected(ClinicalCore))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of loading whole participant trees in a fixed number of queries.
+'''
+
+from .base import DatabaseTestCase
+from mcl.sickbay.json import ClinicalCoreEncoder
+from mcl.sickbay.model import ClinicalCore, Genomics, Organ
+from mcl.sickbay.trees import POLYMORPHIC_LOADING, loadParticipants, queryPolymorphic, subclassesOf
+from sqlalchemy import event
+import json, unittest
+
+
+def _document(obj):
+    return obj.__class__, json.dumps(obj, cls=ClinicalCoreEncoder)
+
+
+class TreeTest(DatabaseTestCase):
+    '''Eagerly loading and encoding participants'''
+    def setUp(self):
+        super(TreeTest, self).setUp()
+        self.participantIDs = [p.participant_ID for p in self.session.query(ClinicalCore)]
+        self.expected = {
+            p.participant_ID: json.dumps(p, cls=ClinicalCoreEncoder) for p in self.session.query(ClinicalCore)
+        }
+        self.session.expunge_all()
+        self.statements = 0
+        event.listen(self.engine, 'before_cursor_execute', self.count)
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self.count)
+        super(TreeTest, self).tearDown()
+
+    def count(self, *args):
+        self.statements += 1
+
+    def encode(self, participantIDs, polymorphic='joined'):
+        '''Load and encode the participants with ``participantIDs``, loading organ and genomics subclasses
+        according to ``polymorphic``, and return their documents and how many queries it took.
+        '''
+        self.session.expunge_all()
+        self.statements = 0
+        participants = loadParticipants(self.session, participantIDs, polymorphic)
+        return [json.dumps(p, cls=ClinicalCoreEncoder) for p in participants], self.statements
+
+    def testSameDocuments(self):
+        for polymorphic in POLYMORPHIC_LOADING:
+            documents, statements = self.encode(self.participantIDs, polymorphic)
+            self.assertEqual(documents, [self.expected[i] for i in self.participantIDs], polymorphic)
+
+    def testFixedQueries(self):
+        one, few = self.encode(self.participantIDs[:1])[1], self.encode(self.participantIDs)[1]
+        self.assertEqual(one, few)
+        self.assertLess(few, 20)
+        # Selectin loading adds a couple of queries per subclass at most (its columns and what hangs off them,
+        # for each place the subclass turns up), however many objects there are
+        selectin = self.encode(self.participantIDs, 'selectin')[1]
+        self.assertLessEqual(selectin, few + 2 * (len(subclassesOf(Organ)) + len(subclassesOf(Genomics))))
+        self.assertGreater(self.encode(self.participantIDs, 'lazy')[1], selectin)
+
+    def testQueryPolymorphic(self):
+        for base in (Organ, Genomics):
+            expected = [_document(obj) for obj in self.session.query(base)]
+            for polymorphic in POLYMORPHIC_LOADING:
+                self.session.expunge_all()
+                objects = queryPolymorphic(self.session, base, polymorphic).all()
+                self.assertEqual([_document(obj) for obj in objects], expected, polymorphic)
+
+    def testUnknown(self):
+        with self.assertRaises(ValueError):
+            loadParticipants(self.session, self.participantIDs, 'eager')
+
+    def testOrder(self):
+        participantIDs = list(reversed(self.participantIDs)) + ['NOBODY']
+        participants = loadParticipants(self.session, participantIDs)
+        self.assertEqual([p.participant_ID for p in participants], participantIDs[:-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Tests of validating batches of attribute values against the model's column definitions.
+'''
+
+from .test_labcas import _CORE, LoaderTestCase
+from mcl.sickbay.labcas import loadDataFile
+from mcl.sickbay.model import BreastOrgan, ClinicalCore, Imaging, Smart3SeqGenomics
+from mcl.sickbay.model.enums import Gender
+from mcl.sickbay.validation import validateBatch, validatorFor
+import datetime, unittest
+
+
+class BatchValidatorTest(unittest.TestCase):
+    '''Checking rows one attribute at a time'''
+    def testGood(self):
+        validator = validatorFor(Imaging)
+        self.assertIs(validator, validatorFor(Imaging))
+        self.assertEqual(validator.check([{'labcasID': 'x', 'identifier': 1}, {'labcasID': 'y'}]), [])
+
+    def testRequired(self):
+        self.assertIn('labcasID', validatorFor(Imaging).required)
+        self.assertNotIn('identifier', validatorFor(Imaging).required)
+        self.assertNotIn('organType', validatorFor(BreastOrgan).required)
+        self.assertEqual(validatorFor(Imaging).check([{}], start=5), [(5, 'labcasID', 'a value is required')])
+
+    def testTypes(self):
+        row = {
+            'participant_ID': 'x' * 51, 'gender': 'sometimes', 'age_at_index': 4.5, 'weight': 'heavy',
+            'anchor_type': None
+        }
+        errors = {key for index, key, complaint in validatorFor(ClinicalCore).check([row])}
+        self.assertTrue({'participant_ID', 'gender', 'age_at_index', 'weight', 'anchor_type'} <= errors)
+
+    def testEnumerations(self):
+        check = validatorFor(ClinicalCore).checks['gender']
+        self.assertIsNone(check(Gender.female))
+        self.assertIsNone(check('female'))
+        self.assertIsNotNone(check('Female'))
+
+    def testDates(self):
+        check = validatorFor(Smart3SeqGenomics).checks['sequencing_date']
+        self.assertIsNone(check(datetime.date(2020, 6, 24)))
+        self.assertIsNotNone(check('2020-06-24'))
+
+
+class ValidateBatchTest(unittest.TestCase):
+    '''Reporting every problem in a batch at once'''
+    def testEverything(self):
+        rows = [{'labcasID': 'x'}, {}, {'labcasID': 'y', 'identifier': 'one'}]
+        with self.assertRaises(ValueError) as context:
+            validateBatch(Imaging, rows, [10, 11, 12])
+        lines = str(context.exception).split('\n')
+        self.assertEqual(lines, [
+            'Line 11: labcasID: a value is required', 'Line 12: identifier: \'one\' is not a whole number'
+        ])
+
+    def testChildren(self):
+        rows = [{'labcasID': 'x'}, {'labcasID': 'y'}]
+        with self.assertRaisesRegex(ValueError, r'^Row 1: race: "martian" is not'):
+            races = ClinicalCore.core_races.property.mapper.class_
+            validateBatch(Imaging, rows, children=[(races, 'race', [['white'], ['white', 'martian']])])
+
+
+class LoaderValidationTest(LoaderTestCase):
+    '''The loader turns away a bad batch before anything goes to the database'''
+    def testBadLines(self):
+        path = self.dataFile('12_1_ClinicalCore_20200624_0_DATA', [
+            _CORE, dict(_CORE, participant_ID='x' * 51), dict(_CORE, participant_ID='B', weight='')
+        ])
+        with self.assertRaises(ValueError) as context:
+            loadDataFile(self.engine, path)
+        self.assertEqual(str(context.exception).split('\n'), [
+            f'Line 3: participant_ID: "{"x" * 51}" is longer than 50 characters',
+            'Line 4: weight: a value is required',
+        ])
+        self.assertEqual(self.session.query(ClinicalCore).count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
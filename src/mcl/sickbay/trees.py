@@ -0,0 +1,124 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Participant trees. Encoding a ``ClinicalCore`` walks its whole tree—biospecimens (and their genomics,
+images, and adjacent specimens), genomics, images, organs (and their histopathology precancer types), and
+the prior lesion, race, and tobacco lists—and with lazy loading every step of that walk is another query
+for every participant, biospecimen, and organ. ``loadParticipants`` instead fetches whole trees for a
+batch of participants with ``selectinload``, one query per relationship for the entire batch.
+
+The columns of the organ and genomics subclasses live in tables of their own, and how they're loaded is
+up to you (see ``POLYMORPHIC_LOADING``): joined into the base rows' query by default, in a query per
+subclass, or lazily, one query per object. ``queryPolymorphic`` offers the same choice for queries of
+``Organ`` or ``Genomics`` themselves, and ``mcl.sickbay.bench`` compares them.
+'''
+
+from .model import Biospecimen, ClinicalCore, Genomics, Organ
+from sqlalchemy.orm import selectin_polymorphic, selectinload, with_polymorphic
+from sqlalchemy.orm.interfaces import MapperOption
+
+
+# Ways to load the columns of the subclasses of ``Organ`` and ``Genomics``, which are in tables of their own:
+#
+# • ``joined`` outer-joins every subclass table into the query of the base table (``with_polymorphic``)
+# • ``selectin`` follows the query of the base table with one query per subclass that's present
+#   (``selectin_polymorphic``)
+# • ``lazy`` leaves them unloaded, so each object's subclass columns take a query of their own when first used
+POLYMORPHIC_LOADING = ('joined', 'selectin', 'lazy')
+
+DEFAULT_POLYMORPHIC_LOADING = 'joined'
+
+_options = {}  # Cache of loader options for whole participant trees, keyed by polymorphic loading
+
+
+class _Uncached(MapperOption):
+    '''Loader option that keeps SQLAlchemy from caching the queries of the relationship loads it reaches.
+    SQLAlchemy 1.3 leaves ``selectin_polymorphic`` out of the keys it caches those queries under, so
+    without this, a ``selectin`` load and a ``lazy`` one of the same relationship would share a query, and
+    whichever ran first would decide how both load subclasses.
+    '''
+    propagate_to_loaders = True
+
+
+def _check(polymorphic):
+    if polymorphic not in POLYMORPHIC_LOADING:
+        raise ValueError(f'Unknown polymorphic loading "{polymorphic}"; choose from {", ".join(POLYMORPHIC_LOADING)}')
+
+
+def subclassesOf(base):
+    '''Return the mapped classes that inherit from ``base``'''
+    return [mapper.class_ for mapper in base.__mapper__.self_and_descendants if mapper.class_ is not base]
+
+
+def polymorphicOptions(base, polymorphic=DEFAULT_POLYMORPHIC_LOADING):
+    '''Return loader options for a query of ``base`` (such as ``Organ``) that load its subclasses'
+    columns according to ``polymorphic``, one of ``POLYMORPHIC_LOADING``. As loader options can't join in
+    more tables, ``joined`` here means ``selectin``; use ``queryPolymorphic`` for a true ``joined`` load.
+    '''
+    _check(polymorphic)
+    return () if polymorphic == 'lazy' else (selectin_polymorphic(base, subclassesOf(base)),)
+
+
+def queryPolymorphic(session, base, polymorphic=DEFAULT_POLYMORPHIC_LOADING):
+    '''Make a query of ``base`` (such as ``Organ``) in ``session`` that loads its subclasses' columns
+    according to ``polymorphic``, one of ``POLYMORPHIC_LOADING``.
+    '''
+    if polymorphic == 'joined':
+        return session.query(base).with_polymorphic('*')
+    return session.query(base).options(*polymorphicOptions(base, polymorphic))
+
+
+def _load(parent, attribute, base, polymorphic):
+    '''Make the loader option that loads the relationship ``attribute`` to ``base`` objects with
+    ``selectinload``, chained from the ``parent`` option if any, along with their subclasses' columns
+    according to ``polymorphic``. Return the option and the entity whose attributes further loads chained
+    from it should name.
+    '''
+    entity = with_polymorphic(base, '*') if polymorphic == 'joined' else base
+    if entity is not base:
+        attribute = attribute.of_type(entity)
+    load = parent.selectinload(attribute) if parent is not None else selectinload(attribute)
+    if polymorphic == 'selectin':
+        load = load.selectin_polymorphic(subclassesOf(base))
+    return load, entity
+
+
+def treeOptions(polymorphic=DEFAULT_POLYMORPHIC_LOADING):
+    '''Return the loader options that eagerly load the whole tree of every ``ClinicalCore`` a query
+    returns, loading the organ and genomics subclasses' columns according to ``polymorphic``, one of
+    ``POLYMORPHIC_LOADING``. However many participants there are, loading their trees takes the same
+    number of queries (up to 500 participants, after which ``selectinload`` splits its ``IN`` lists),
+    unless ``polymorphic`` is ``lazy``.
+    '''
+    options = _options.get(polymorphic)
+    if options is None:
+        _check(polymorphic)
+        biospecimens = selectinload(ClinicalCore.biospecimens)
+        organs, organ = _load(None, ClinicalCore.organs, Organ, polymorphic)
+        options = _options[polymorphic] = (
+            _load(biospecimens, Biospecimen.genomics, Genomics, polymorphic)[0],
+            biospecimens.selectinload(Biospecimen.images),
+            biospecimens.selectinload(Biospecimen.adjacent_specimens),
+            _load(None, ClinicalCore.genomics, Genomics, polymorphic)[0],
+            selectinload(ClinicalCore.images),
+            organs.selectinload(organ.histopathology_precancer_types),
+            selectinload(ClinicalCore.prior_lesions),
+            selectinload(ClinicalCore.core_races),
+            selectinload(ClinicalCore.core_tobaccos),
+        ) + ((_Uncached(),) if polymorphic == 'selectin' else ())
+    return options
+
+
+def loadParticipants(session, participantIDs, polymorphic=DEFAULT_POLYMORPHIC_LOADING):
+    '''Load the participants with the given ``participantIDs`` from ``session`` along with their whole
+    trees, ready to encode without any further queries (unless ``polymorphic`` is ``lazy``; see
+    ``treeOptions``). Return them in the order of ``participantIDs``, leaving out any that aren't in the
+    database.
+    '''
+    participantIDs = list(participantIDs)
+    query = session.query(ClinicalCore).options(*treeOptions(polymorphic))
+    found = {p.participant_ID: p for p in query.filter(ClinicalCore.participant_ID.in_(participantIDs))}
+    return [found[participantID] for participantID in participantIDs if participantID in found]
@@ -0,0 +1,152 @@
+# encoding: utf-8
+
+'''
+🤢 Sickbay: Clinical data model for the Consortium for Molecular and Cellular
+Characterization of Screen-Detected Lesions.
+
+Validation. A null in a ``nullable=False`` column, a string too long for its ``String(50)``, or a bad
+enumerated value otherwise shows up only when the database rejects a flush or a ``COPY``, which throws
+away the whole transaction and says nothing about any other bad rows. ``BatchValidator`` checks whole
+batches of attribute values in memory against the definitions of the mapped class's columns and
+reports every problem it finds in one pass, so bad rows never cost a round-trip to the database.
+'''
+
+from sqlalchemy import Boolean, Date, Float, Integer, Sequence, String
+import datetime
+
+
+_validators = {}  # Cache of validators, keyed by mapped class
+
+
+def _enumCheck(enumClass):
+    tokens = frozenset(member.name for member in enumClass)
+    def check(value):
+        if value.__class__ is not enumClass and value not in tokens:
+            return f'"{value}" is not one of the permissible values of {enumClass.__name__}'
+    return check
+
+
+def _stringCheck(length):
+    def check(value):
+        if not isinstance(value, str):
+            return f'{value!r} is not text'
+        elif length is not None and len(value) > length:
+            return f'"{value}" is longer than {length} characters'
+    return check
+
+
+def _integerCheck(value):
+    if not isinstance(value, int) or isinstance(value, bool):
+        return f'{value!r} is not a whole number'
+
+
+def _floatCheck(value):
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        return f'{value!r} is not a number'
+
+
+def _booleanCheck(value):
+    if not isinstance(value, bool):
+        return f'{value!r} is not true or false'
+
+
+def _dateCheck(value):
+    if not isinstance(value, datetime.date):
+        return f'{value!r} is not a date'
+
+
+def _check(column):
+    '''Make the function that checks a non-null value bound for ``column``, returning a complaint about it
+    or ``None`` if it's fine. Return ``None`` for columns of types we don't check.
+    '''
+    columnType = column.type
+    enumClass = getattr(columnType, 'enum_class', None)
+    if enumClass is not None:
+        return _enumCheck(enumClass)
+    elif isinstance(columnType, String):
+        return _stringCheck(columnType.length)
+    elif isinstance(columnType, Boolean):
+        return _booleanCheck
+    elif isinstance(columnType, Integer):
+        return _integerCheck
+    elif isinstance(columnType, Float):
+        return _floatCheck
+    elif isinstance(columnType, Date):
+        return _dateCheck
+    return None
+
+
+def _required(mapper, column):
+    '''Tell if ``column`` of ``mapper`` needs a value that nothing else (a sequence, a default, the
+    polymorphic identity) will supply.
+    '''
+    return not (
+        column.nullable
+        or isinstance(column.default, Sequence)
+        or column.default is not None
+        or column.server_default is not None
+        or column is mapper.polymorphic_on
+    )
+
+
+class BatchValidator(object):
+    '''Checks dicts of attribute values for the mapped class ``cls`` against the definitions of its
+    columns (from every table it's mapped to): that required attributes aren't ``None``, that text fits
+    its ``String`` length, that enumerated values are members or tokens of the right enumeration, and that
+    numbers, booleans, and dates are what they should be. Values may be enumeration members (for ORM
+    objects) or their tokens (for Core rows).
+    '''
+    def __init__(self, cls):
+        mapper = cls.__mapper__
+        self.cls, self.checks, self.required = cls, {}, []
+        for prop in mapper.column_attrs:
+            column = prop.columns[0]
+            check = _check(column)
+            if check is not None:
+                self.checks[prop.key] = check
+            if all(_required(mapper, c) for c in prop.columns):  # Joined subclasses' keys come from the base's
+                self.required.append(prop.key)
+
+    def check(self, rows, start=0):
+        '''Check every dict of attribute values in ``rows`` and return a list of (index, attribute,
+        complaint) triples for each problem found, in order. Indexes count from ``start``.
+        '''
+        checks, required, errors = self.checks, self.required, []
+        for index, row in enumerate(rows, start):
+            for key in required:
+                if row.get(key) is None:
+                    errors.append((index, key, 'a value is required'))
+            for key, value in row.items():
+                if value is not None:
+                    check = checks.get(key)
+                    if check is not None:
+                        complaint = check(value)
+                        if complaint is not None:
+                            errors.append((index, key, complaint))
+        return errors
+
+
+def validatorFor(cls):
+    '''Return the ``BatchValidator`` for the mapped class ``cls``, making it the first time'''
+    validator = _validators.get(cls)
+    if validator is None:
+        validator = _validators[cls] = BatchValidator(cls)
+    return validator
+
+
+def validateBatch(cls, rows, lineNumbers=None, children=()):
+    '''Check the dicts of attribute values in ``rows`` for the mapped class ``cls``, plus the items of any
+    ``|``-separated lists in ``children``, a sequence of (child class, attribute, items) where the items
+    are a list for each row. Raise one ``ValueError`` listing every problem, each with the line number from
+    ``lineNumbers`` of its row (or its position in ``rows``), if there are any.
+    '''
+    errors = validatorFor(cls).check(rows)
+    for childClass, attribute, items in children:
+        owners = [index for index, rowItems in enumerate(items) for item in rowItems]
+        childRows = [{attribute: item} for rowItems in items for item in rowItems]
+        childErrors = validatorFor(childClass).check(childRows)
+        errors.extend((owners[index], key, complaint) for index, key, complaint in childErrors)
+    if errors:
+        errors.sort(key=lambda error: error[0])
+        where = (lambda index: f'Line {lineNumbers[index]}') if lineNumbers else (lambda index: f'Row {index}')
+        raise ValueError('\n'.join(f'{where(index)}: {key}: {complaint}' for index, key, complaint in errors))